@@ -0,0 +1,318 @@
+#
+# backends.py
+# Rendering and input backends
+#
+
+import array
+import textwrap
+import libtcodpy as libt
+
+
+class LibtcodBackend(object):
+    """
+    Default backend that draws to a libtcod window. Every method is
+    the libtcodpy function itself, so going through the backend adds
+    no call overhead. Methods taking character codes go straight to the
+    C functions through libtcodpy's fast aliases, and must be rebound
+    with bind_fast() whenever those are.
+    """
+    # Window and program setup
+    init_root = staticmethod(libt.console_init_root)
+    set_custom_font = staticmethod(libt.console_set_custom_font)
+    set_keyboard_repeat = staticmethod(libt.console_set_keyboard_repeat)
+    set_fps = staticmethod(libt.sys_set_fps)
+    credits = staticmethod(libt.console_credits)
+    is_window_closed = staticmethod(libt.console_is_window_closed)
+    is_fullscreen = staticmethod(libt.console_is_fullscreen)
+    set_fullscreen = staticmethod(libt.console_set_fullscreen)
+
+    # Consoles
+    console_new = staticmethod(libt.console_new)
+    set_default_foreground = staticmethod(libt.console_set_default_foreground)
+    set_default_background = staticmethod(libt.console_set_default_background)
+    put_char = staticmethod(libt.console_put_char)
+    put_char_ex = staticmethod(libt.console_put_char_ex)
+    set_char_background = staticmethod(libt.console_set_char_background)
+    get_char_background = staticmethod(libt.console_get_char_background)
+    clear = staticmethod(libt.console_clear)
+    rect = staticmethod(libt.console_rect)
+    print_ex = staticmethod(libt.console_print_ex)
+    get_height_rect = staticmethod(libt.console_get_height_rect)
+    fill_foreground = staticmethod(libt.console_fill_foreground)
+    fill_background = staticmethod(libt.console_fill_background)
+    fill_char = staticmethod(libt.console_fill_char)
+    blit = staticmethod(libt.console_blit)
+    flush = staticmethod(libt.console_flush)
+
+    # Consoles, taking character codes
+    put_code_ex = staticmethod(libt.console_put_char_ex_fast)
+
+    # Images
+    image_load = staticmethod(libt.image_load)
+    image_blit_2x = staticmethod(libt.image_blit_2x)
+
+    # Input
+    check_for_event = staticmethod(libt.sys_check_for_event)
+    check_for_keypress = staticmethod(libt.console_check_for_keypress)
+
+    @classmethod
+    def bind_fast(cls):
+        """Rebinds the methods that use libtcodpy's fast aliases."""
+        cls.put_code_ex = staticmethod(libt.console_put_char_ex_fast)
+
+
+class HeadlessConsole(object):
+    """
+    In-memory console used by the headless backend. Cells are stored
+    row by row; colours are packed into single integers.
+    """
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+        self.fore = pack_colour(libt.white)
+        self.back = pack_colour(libt.black)
+        self.chars = array.array('i', [ord(" ")] * (w*h))
+        self.fores = array.array('i', [self.fore] * (w*h))
+        self.backs = array.array('i', [self.back] * (w*h))
+
+    def index(self, x, y):
+        """Returns the cell index of (x, y), or None if it is off the console."""
+        if 0 <= x < self.w and 0 <= y < self.h:
+            return y*self.w + x
+
+    def row_text(self, y):
+        """Returns the characters on row y as a string."""
+        start = y*self.w
+        return "".join(chr(c) for c in self.chars[start:start + self.w])
+
+
+class HeadlessBackend(object):
+    """
+    Backend that never opens a window. Consoles are kept in memory and
+    input comes from a script of events, so the game runs as fast as
+    possible. Once the script runs out the window counts as closed.
+
+    events: iterable of key events; each is a character, a libtcod
+    key code, or a (key code, character, left alt) tuple
+    """
+    def __init__(self, events=()):
+        self.events = iter(events)
+        self.closed = False
+        self.fullscreen = False
+        self.frames = 0
+        self.consoles = {}
+        self.root = None
+
+    # Window and program setup
+    def init_root(self, w, h, title, fullscreen=False, renderer=None):
+        self.root = HeadlessConsole(w, h)
+        self.fullscreen = fullscreen
+
+    def set_custom_font(self, *args):
+        pass
+
+    def set_keyboard_repeat(self, initial_delay, interval):
+        pass
+
+    def set_fps(self, fps):
+        pass
+
+    def credits(self):
+        pass
+
+    def is_window_closed(self):
+        return self.closed
+
+    def is_fullscreen(self):
+        return self.fullscreen
+
+    def set_fullscreen(self, fullscreen):
+        self.fullscreen = fullscreen
+
+    # Consoles
+    def console_new(self, w, h):
+        con = len(self.consoles) + 1
+        self.consoles[con] = HeadlessConsole(w, h)
+        return con
+
+    def get(self, con):
+        """Returns the console with given id; 0 is the root console."""
+        if con == 0:
+            return self.root
+        return self.consoles[con]
+
+    def set_default_foreground(self, con, col):
+        self.get(con).fore = pack_colour(col)
+
+    def set_default_background(self, con, col):
+        self.get(con).back = pack_colour(col)
+
+    def put_char(self, con, x, y, c, flag=libt.BKGND_DEFAULT):
+        console = self.get(con)
+        i = console.index(x, y)
+
+        if i is not None:
+            console.chars[i] = to_char_code(c)
+            console.fores[i] = console.fore
+            if flag != libt.BKGND_NONE:
+                console.backs[i] = console.back
+
+    def put_char_ex(self, con, x, y, c, fore, back):
+        console = self.get(con)
+        i = console.index(x, y)
+
+        if i is not None:
+            console.chars[i] = to_char_code(c)
+            console.fores[i] = pack_colour(fore)
+            console.backs[i] = pack_colour(back)
+
+    put_code_ex = put_char_ex
+
+    def set_char_background(self, con, x, y, col, flag=libt.BKGND_SET):
+        console = self.get(con)
+        i = console.index(x, y)
+
+        if i is not None and flag != libt.BKGND_NONE:
+            console.backs[i] = pack_colour(col)
+
+    def get_char_background(self, con, x, y):
+        console = self.get(con)
+        return unpack_colour(console.backs[console.index(x, y)])
+
+    def clear(self, con):
+        console = self.get(con)
+        n = console.w*console.h
+        console.chars = array.array('i', [ord(" ")] * n)
+        console.fores = array.array('i', [console.fore] * n)
+        console.backs = array.array('i', [console.back] * n)
+
+    def rect(self, con, x, y, w, h, clr, flag=libt.BKGND_DEFAULT):
+        console = self.get(con)
+
+        for j in range(max(y, 0), min(y + h, console.h)):
+            for i in range(max(x, 0), min(x + w, console.w)):
+                cell = j*console.w + i
+                if flag != libt.BKGND_NONE:
+                    console.backs[cell] = console.back
+                if clr:
+                    console.chars[cell] = ord(" ")
+
+    def print_ex(self, con, x, y, flag, alignment, fmt):
+        console = self.get(con)
+
+        if alignment == libt.CENTER:
+            x -= len(fmt)//2
+        elif alignment == libt.RIGHT:
+            x -= len(fmt) - 1
+
+        for c in fmt:
+            self.put_char(con, x, y, c, flag)
+            x += 1
+
+    def get_height_rect(self, con, x, y, w, h, fmt):
+        return min(max(len(textwrap.wrap(fmt, w)), 1), h)
+
+    def fill_foreground(self, con, r, g, b):
+        console = self.get(con)
+        console.fores = array.array('i', [(r[i] << 16) | (g[i] << 8) | b[i]
+                                          for i in range(len(r))])
+
+    def fill_background(self, con, r, g, b):
+        console = self.get(con)
+        console.backs = array.array('i', [(r[i] << 16) | (g[i] << 8) | b[i]
+                                          for i in range(len(r))])
+
+    def fill_char(self, con, arr):
+        self.get(con).chars = array.array('i', arr)
+
+    def blit(self, src, x, y, w, h, dst, xdst, ydst, ffade=1.0, bfade=1.0):
+        source = self.get(src)
+        dest = self.get(dst)
+        w = min(w, source.w - x, dest.w - xdst)
+        h = min(h, source.h - y, dest.h - ydst)
+
+        for j in range(h):
+            s = (y + j)*source.w + x
+            d = (ydst + j)*dest.w + xdst
+
+            if ffade == 1.0 and bfade == 1.0:
+                dest.chars[d:d + w] = source.chars[s:s + w]
+                dest.fores[d:d + w] = source.fores[s:s + w]
+                dest.backs[d:d + w] = source.backs[s:s + w]
+                continue
+
+            for i in range(w):
+                dest.backs[d + i] = lerp_packed(dest.backs[d + i],
+                                                source.backs[s + i], bfade)
+                if source.chars[s + i] != ord(" "):
+                    dest.chars[d + i] = source.chars[s + i]
+                    dest.fores[d + i] = lerp_packed(dest.fores[d + i],
+                                                    source.fores[s + i], ffade)
+
+    def flush(self):
+        self.frames += 1
+
+    # Images
+    def image_load(self, filename):
+        return filename
+
+    def image_blit_2x(self, image, console, dx, dy, sx=0, sy=0, w=-1, h=-1):
+        pass
+
+    # Input
+    def next_event(self, key):
+        """Fills key with the next scripted event, closing the window at the end."""
+        key.vk = libt.KEY_NONE
+        key.c = 0
+        key.lalt = False
+
+        try:
+            event = next(self.events)
+        except StopIteration:
+            self.closed = True
+            return
+
+        if isinstance(event, tuple):
+            (key.vk, c, key.lalt) = event
+            key.c = to_char_code(c)
+        elif isinstance(event, str):
+            key.vk = libt.KEY_CHAR
+            key.c = ord(event)
+        else:
+            key.vk = event
+
+    def check_for_event(self, mask, key, mouse):
+        self.next_event(key)
+
+    def check_for_keypress(self, flags=libt.KEY_RELEASED):
+        key = libt.Key()
+        self.next_event(key)
+        return key
+
+
+# Miscellaneous functions
+def to_char_code(c):
+    """Returns the character code of c, which may be a string or an integer."""
+    if isinstance(c, str):
+        return ord(c)
+    return c
+
+
+def pack_colour(colour):
+    """Packs a colour into a single integer."""
+    return (colour.r << 16) | (colour.g << 8) | colour.b
+
+
+def unpack_colour(packed):
+    """Returns the colour stored in a packed integer."""
+    return libt.Color((packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF)
+
+
+def lerp_packed(a, b, coef):
+    """Linearly interpolates between two packed colours."""
+    result = 0
+    for shift in (16, 8, 0):
+        ca = (a >> shift) & 0xFF
+        cb = (b >> shift) & 0xFF
+        result |= int(ca + (cb - ca)*coef) << shift
+    return result
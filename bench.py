@@ -0,0 +1,514 @@
+#
+# bench.py
+# Headless benchmarks and soak tests
+#
+# Usage: python bench.py <benchmark> [args...]
+#
+
+import os
+import random
+import shelve
+import shutil
+import sys
+import tempfile
+import timeit
+import libtcodpy as libt
+import libtcodfallback
+import backends
+import config
+import data
+import perf
+import saveformat
+import state
+import world
+
+# Keys pressed during a soak run
+SOAK_KEYS = [libt.KEY_UP, libt.KEY_DOWN, libt.KEY_LEFT, libt.KEY_RIGHT,
+             libt.KEY_UP, libt.KEY_DOWN, libt.KEY_LEFT, libt.KEY_RIGHT,
+             libt.KEY_ENTER, libt.KEY_ESCAPE, "g", "i", "l", "m", "d", "e", ">"]
+
+
+def random_keys(count, seed):
+    """Yields count random key presses, starting a new game first."""
+    rnd = random.Random(seed)
+    yield libt.KEY_ENTER
+
+    for i in range(count):
+        yield rnd.choice(SOAK_KEYS)
+
+
+def soak(frames="10000", seed="0"):
+    """Plays headlessly with random input and reports the frame rate."""
+    backend = backends.HeadlessBackend(random_keys(int(frames), int(seed)))
+    game = state.StateHandler(backend, int(seed))
+
+    start = timeit.default_timer()
+    game.init_program()
+    elapsed = timeit.default_timer() - start
+
+    print("soak: {} frames in {:.2f}s ({:.0f} frames/s)".format(
+        backend.frames, elapsed, backend.frames / max(elapsed, 1e-9)))
+
+
+def headless_game(messages=0):
+    """Returns a StateHandler with a freshly generated game and no window."""
+    game = state.StateHandler(backends.HeadlessBackend())
+    game.init_program()
+    game.new_game()
+
+    for i in range(messages):
+        game.message_box.add_msg("Message number {} of the benchmark.".format(i))
+
+    return game
+
+
+def save_data_of(game):
+    """Returns the save data dictionary SaveMenu would collect for game."""
+    return {
+        'world': game.world,
+        'map_objects': game.map_objects,
+        'player_index': game.map_objects['characters'].index(game.player),
+        'messages': list(game.message_box.history.entries()),
+        'game_state': game.game_state,
+        'player_action': game.player_action,
+        'turn': game.turn
+    }
+
+
+def save(rounds="20", messages="500"):
+    """Compares save and load times and file sizes of the save formats."""
+    game = headless_game(int(messages))
+    save_data = save_data_of(game)
+    rounds = int(rounds)
+    tmp = tempfile.mkdtemp()
+
+    def write_shelve():
+        savefile = shelve.open(os.path.join(tmp, "legacy"), "n")
+        for (key, val) in save_data.items():
+            savefile[key] = val
+        savefile.close()
+
+    def read_shelve():
+        savefile = shelve.open(os.path.join(tmp, "legacy"), "r")
+        dict(savefile.items())
+        savefile.close()
+
+    def write_binary(compression):
+        with open(os.path.join(tmp, "binary"), "wb") as savefile:
+            savefile.write(saveformat.encode(save_data, compression))
+
+    def read_binary():
+        with open(os.path.join(tmp, "binary"), "rb") as savefile:
+            saveformat.decode(savefile.read())
+
+    def size():
+        return sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+
+    print("{:<10}{:>10}{:>10}{:>10}".format("format", "save ms", "load ms", "bytes"))
+
+    try:
+        formats = [("shelve", write_shelve, read_shelve)]
+        for compression in (None, "zlib", "lzma"):
+            formats.append((str(compression).lower(),
+                            lambda c=compression: write_binary(c), read_binary))
+
+        for (name, write, read) in formats:
+            for filename in os.listdir(tmp):
+                os.remove(os.path.join(tmp, filename))
+
+            save_time = timeit.timeit(write, number=rounds) / rounds
+            load_time = timeit.timeit(read, number=rounds) / rounds
+            print("{:<10}{:>10.2f}{:>10.2f}{:>10}".format(
+                name, save_time*1000, load_time*1000, size()))
+    finally:
+        shutil.rmtree(tmp)
+
+
+def delta(rounds="50", messages="500"):
+    """Compares full, delta and background saves after a few turns of changes."""
+    game = headless_game(int(messages))
+    config.SAVE_DIR = tempfile.mkdtemp()
+    rounds = int(rounds)
+    handler = game.save_handler
+    rnd = random.Random(0)
+
+    def play_turn():
+        game.world.mark_seen(rnd.randrange(config.MAP_WIDTH), rnd.randrange(config.MAP_HEIGHT))
+        game.player.hp -= 1
+        game.message_box.add_msg("Another turn passes.")
+
+    try:
+        for (name, max_deltas) in (("full", 0), ("delta", config.SAVE_MAX_DELTAS)):
+            config.SAVE_MAX_DELTAS = max_deltas
+            handler.save_game(game, 0)
+            elapsed = 0
+
+            for i in range(rounds):
+                play_turn()
+                start = timeit.default_timer()
+                handler.save_game(game, 0)
+                elapsed += timeit.default_timer() - start
+
+            print("{:<10}{:>10.2f} ms per save".format(name, elapsed*1000 / rounds))
+
+        # Only the snapshot blocks the game when saving in the background
+        config.SAVE_MAX_DELTAS = 0
+        elapsed = 0
+
+        for i in range(rounds):
+            play_turn()
+            handler.wait()
+            start = timeit.default_timer()
+            handler.save_game_async(game, 0)
+            elapsed += timeit.default_timer() - start
+
+        handler.wait()
+        print("{:<10}{:>10.2f} ms per save on the main thread".format(
+            "async", elapsed*1000 / rounds))
+    finally:
+        handler.close()
+        shutil.rmtree(config.SAVE_DIR)
+
+
+def load(rounds="10", messages="5000"):
+    """Measures the time to the first frame and to a complete load."""
+    game = headless_game(int(messages))
+    config.SAVE_DIR = tempfile.mkdtemp()
+    rounds = int(rounds)
+
+    game.world.seen[:] = bytearray(b"\x01" * (game.world.width*game.world.height))
+
+    try:
+        game.save_handler.save_game(game, 0)
+        first_frame = 0
+        complete = 0
+
+        for i in range(rounds):
+            start = timeit.default_timer()
+            game.load_game(game.save_handler.get_data(0))
+            game.compute_fov()
+            game.render_terrain()
+            game.draw_entities()
+            game.draw_gui()
+            game.blit_consoles()
+            first_frame += timeit.default_timer() - start
+
+            game.finish_load()
+            complete += timeit.default_timer() - start
+
+        print("first frame {:>8.2f} ms".format(first_frame*1000 / rounds))
+        print("complete    {:>8.2f} ms".format(complete*1000 / rounds))
+    finally:
+        game.save_handler.close()
+        shutil.rmtree(config.SAVE_DIR)
+
+
+def planes(rounds="5", size="2048"):
+    """
+    Measures loading a large map saved with bitsets and with mapped
+    planes, up to reading the tiles around the player.
+    """
+    game = headless_game()
+    config.SAVE_DIR = tempfile.mkdtemp()
+    rounds = int(rounds)
+    size = int(size)
+    planes_min = config.SAVE_PLANES_MIN_TILES
+
+    game.world = world.Map(size, size)
+    for x in range(size):
+        game.world.make_h_tunnel(0, size - 1, x)
+
+    try:
+        for (name, min_tiles) in (("bitsets", size*size + 1), ("planes", size*size)):
+            config.SAVE_PLANES_MIN_TILES = min_tiles
+            game.save_handler.save_game(game, 0)
+            elapsed = 0
+
+            for i in range(rounds):
+                start = timeit.default_timer()
+                save_data = game.save_handler.get_data(0)
+                save_data.restore_seen()
+                loaded = save_data['world']
+
+                for x in range(40):
+                    for y in range(40):
+                        loaded.fog[x*size + y]
+                elapsed += timeit.default_timer() - start
+
+            print("{:<10}{:>10.2f} ms per load{:>12} bytes".format(
+                name, elapsed*1000 / rounds, os.path.getsize(config.get_save_path(0))))
+    finally:
+        config.SAVE_PLANES_MIN_TILES = planes_min
+        shutil.rmtree(config.SAVE_DIR)
+
+
+def verify(floors="50", seed="0"):
+    """
+    Generates floors, changes them at random, and checks that saving them
+    as a seed and the changes gives back the same floors. Compares the
+    size of that layout with storing every tile and entity.
+    """
+    rnd = random.Random(int(seed))
+    sizes = {'seed': 0, 'full': 0}
+    failed = 0
+
+    for i in range(int(floors)):
+        (game_world, map_objects) = world.generate_floor(rnd.getrandbits(32), rnd.randrange(1, 10))
+        ok = saveformat.verify_floor(game_world)
+
+        # Explore a corner, take some items and kill a mob
+        for j in range(rnd.randrange(200)):
+            game_world.mark_seen(rnd.randrange(20), rnd.randrange(20))
+        del map_objects['items'][:rnd.randrange(len(map_objects['items']) + 1)]
+        for mob in map_objects['mobs'][:1]:
+            (mob.hp, mob.state, mob.char) = (0, data.DEAD, "X")
+
+        buf = saveformat.encode_floor(game_world, map_objects)
+        (loaded, loaded_objects) = saveformat.decode_floor(buf)
+        ok = ok and (saveformat.plane_bytes(loaded.seen) == saveformat.plane_bytes(game_world.seen) and
+                     saveformat.entity_records(loaded_objects) == saveformat.entity_records(map_objects))
+
+        sizes['seed'] += len(buf)
+        (seed, game_world.seed) = (game_world.seed, None)
+        sizes['full'] += len(saveformat.encode_floor(game_world, map_objects))
+        game_world.seed = seed
+
+        if not ok:
+            failed += 1
+            print("floor {} (seed {}, depth {}) does not match".format(i, seed, game_world.depth))
+
+    print("{} floors, {} mismatched".format(floors, failed))
+    print("{:<10}{:>10} bytes per floor".format("seed", sizes['seed'] // int(floors)))
+    print("{:<10}{:>10} bytes per floor".format("full", sizes['full'] // int(floors)))
+
+
+def calls(count="200000"):
+    """
+    Measures the time per call of hot libtcodpy functions through their
+    wrappers, through the fast aliases, and through the fast aliases with
+    declared argument types. Without the native library only the map and
+    random cases run, against the Python stand-in.
+    """
+    count = int(count)
+    fov_map = libt.map_new(config.MAP_WIDTH, config.MAP_HEIGHT)
+    (fore, back) = (data.COLOURS['lit_ground'], data.COLOURS['bg'])
+    code = ord(".")
+    con = None
+
+    cases = [
+        ("is_in_fov", lambda: libt.map_is_in_fov(fov_map, 1, 2),
+         lambda: libt.map_is_in_fov_fast(fov_map, 1, 2)),
+        ("random_int", lambda: libt.random_get_int(0, 0, 100),
+         lambda: libt.random_get_int_fast(0, 0, 100))
+    ]
+
+    if libt.FALLBACK:
+        print("libtcod is not loaded; skipping the console cases")
+    else:
+        con = libt.console_new(config.MAP_WIDTH, config.MAP_HEIGHT)
+        cases[:0] = [
+            ("put_char_ex", lambda: libt.console_put_char_ex(con, 1, 2, ".", fore, back),
+             lambda: libt.console_put_char_ex_fast(con, 1, 2, code, fore, back)),
+            ("put_char", lambda: libt.console_put_char(con, 1, 2, ".", libt.BKGND_NONE),
+             lambda: libt.console_put_char_fast(con, 1, 2, code, libt.BKGND_NONE))
+        ]
+
+    def per_call(func):
+        return timeit.timeit(func, number=count) * 1e9 / count
+
+    # The cost of the lambdas themselves is subtracted from every case
+    base = per_call(lambda: None)
+    print("{:<12}{:>10}{:>10}{:>10}".format("ns per call", "wrapper", "fast", "checked"))
+
+    try:
+        for (name, wrapper, fast) in cases:
+            timings = [per_call(wrapper), per_call(fast)]
+            libt.check_arguments(True)
+            timings.append(per_call(fast))
+            libt.check_arguments(False)
+
+            print("{:<12}{:>10.0f}{:>10.0f}{:>10.0f}".format(name, *[t - base for t in timings]))
+    finally:
+        libt.map_delete(fov_map)
+        if con is not None:
+            libt.console_delete(con)
+
+
+def pathing(rounds="50", seed="0"):
+    """
+    Times FOV, A* paths and Dijkstra maps on a generated floor with the
+    Python stand-in for libtcod and, when it is loaded, the native library.
+    """
+    rnd = random.Random(int(seed))
+    rounds = int(rounds)
+    (game_world, map_objects) = world.generate_floor(rnd.getrandbits(32), 1)
+    transparent = game_world.rows(game_world.fog).translate(world.INVERTED)
+    walkable = game_world.rows(game_world.passable)
+    floors = [(x, y) for x in range(game_world.width) for y in range(game_world.height)
+              if game_world.passable[x*game_world.height + y]]
+    points = [(rnd.choice(floors), rnd.choice(floors)) for i in range(rounds)]
+
+    libraries = [("python", libtcodfallback.Library())]
+    if not libt.FALLBACK:
+        libraries.insert(0, ("native", libt._lib))
+    native = libt._lib
+
+    print("{:<10}{:>10}{:>10}{:>10}".format("ms", "fov", "a*", "dijkstra"))
+
+    try:
+        for (name, lib) in libraries:
+            libt._lib = lib
+            libt.bind_fast()
+            fov_map = libt.map_new(game_world.width, game_world.height)
+            libt.map_set_flags(fov_map, libt.MAP_TRANSPARENT, transparent)
+            libt.map_set_flags(fov_map, libt.MAP_WALKABLE, walkable)
+            path = libt.path_new_using_map(fov_map)
+            dijkstra = libt.dijkstra_new(fov_map)
+
+            def fov():
+                for ((x, y), dest) in points:
+                    libt.map_compute_fov(fov_map, x, y, config.LIGHT_RANGE,
+                                         config.FOV_LIT_WALLS, config.FOV)
+
+            def a_star():
+                for ((x, y), (dx, dy)) in points:
+                    libt.path_compute(path, x, y, dx, dy)
+
+            def dijkstra_maps():
+                for ((x, y), dest) in points:
+                    libt.dijkstra_compute(dijkstra, x, y)
+
+            timings = [timeit.timeit(func, number=1) * 1000 / rounds
+                       for func in (fov, a_star, dijkstra_maps)]
+            print("{:<10}{:>10.3f}{:>10.3f}{:>10.3f}".format(name, *timings))
+
+            libt.dijkstra_delete(dijkstra)
+            libt.path_delete(path)
+            libt.map_delete(fov_map)
+    finally:
+        libt._lib = native
+        libt.bind_fast()
+
+
+def sight(pairs="500", seed="0"):
+    """
+    Compares checking line of sight between random pairs of floor tiles
+    one line at a time with line_iter() and all at once with line_of_sight().
+    """
+    rnd = random.Random(int(seed))
+    (game_world, map_objects) = world.generate_floor(rnd.getrandbits(32), 1)
+    (w, h) = (game_world.width, game_world.height)
+    opaque = game_world.rows(game_world.fog)
+    floors = [(x, y) for x in range(w) for y in range(h) if game_world.passable[x*h + y]]
+    pairs = [rnd.choice(floors) + rnd.choice(floors) for i in range(int(pairs))]
+    columns = [list(column) for column in zip(*pairs)]
+
+    def one_by_one():
+        return [not any(opaque[y*w + x] for (x, y) in list(libt.line_iter(*pair))[1:-1])
+                for pair in pairs]
+
+    def batch():
+        return libt.line_of_sight(columns[0], columns[1], columns[2], columns[3], opaque, w)
+
+    assert [bool(clear) for clear in batch()] == one_by_one()
+
+    for (name, func) in (("line_iter", one_by_one), ("batch", batch)):
+        elapsed = timeit.timeit(func, number=5) / 5
+        print("{:<10}{:>10.2f} ms for {} pairs".format(name, elapsed*1000, len(pairs)))
+
+
+def startup():
+    """
+    Starts the game headlessly up to the main menu, reporting the time
+    spent in each phase and whether NumPy had to be imported.
+    """
+    profile = perf.StartupProfile()
+    game = state.StateHandler(backends.HeadlessBackend())
+    game.init_program(profile)
+    print("numpy imported: {}".format("numpy" in sys.modules))
+
+
+def trace(frames="3000", seed="0", path=None):
+    """
+    Plays headlessly like soak with every libtcod call traced, then
+    prints the call table and writes it as CSV to path if given.
+    """
+    backend = backends.HeadlessBackend(random_keys(int(frames), int(seed)))
+    game = state.StateHandler(backend, int(seed))
+    tracer = perf.CallTracer(libt._lib)
+    flush = backend.flush
+
+    # The headless backend never calls console_flush, so frames end here
+    def traced_flush():
+        tracer.end_frame()
+        flush()
+
+    backend.flush = traced_flush
+    tracer.install()
+    try:
+        game.init_program()
+    finally:
+        tracer.uninstall()
+
+    print("\n".join(tracer.report()))
+    if path:
+        tracer.write_csv(path)
+
+
+def terrain(rounds="20", seed="0"):
+    """
+    Compares turning a heightmap into map tiles with a heightmap_get_value()
+    call per tile and with heightmap_threshold() and Map.set_floors().
+    """
+    rnd = random.Random(int(seed))
+    (w, h) = (config.MAP_WIDTH, config.MAP_HEIGHT)
+    hm = libt.heightmap_new(w, h)
+    for x in range(w):
+        for y in range(h):
+            libt.heightmap_set_value(hm, x, y, rnd.random())
+    game_world = world.Map(w, h)
+
+    def per_tile():
+        for x in range(w):
+            for y in range(h):
+                floor = 0.4 <= libt.heightmap_get_value(hm, x, y) <= 1.0
+                game_world.passable[x*h + y] = floor
+                game_world.fog[x*h + y] = not floor
+
+    def bulk():
+        game_world.set_floors(libt.heightmap_threshold(hm, 0.4, 1.0))
+
+    per_tile()
+    expected = bytearray(game_world.passable)
+    bulk()
+    assert game_world.passable == expected
+
+    try:
+        for (name, func) in (("per tile", per_tile), ("threshold", bulk)):
+            elapsed = timeit.timeit(func, number=int(rounds)) / int(rounds)
+            print("{:<10}{:>10.3f} ms for {}x{} tiles".format(name, elapsed*1000, w, h))
+    finally:
+        libt.heightmap_delete(hm)
+
+
+BENCHMARKS = {
+    'calls': calls,
+    'delta': delta,
+    'load': load,
+    'pathing': pathing,
+    'planes': planes,
+    'save': save,
+    'sight': sight,
+    'soak': soak,
+    'startup': startup,
+    'terrain': terrain,
+    'trace': trace,
+    'verify': verify
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: python bench.py <{}> [args...]".format("|".join(sorted(BENCHMARKS))))
+        sys.exit(1)
+
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
@@ -26,8 +26,37 @@ def get_save_path(index):
     """
     return os.path.join(SAVE_DIR, "save_" + str(index))
 
+
+def get_save_index_path():
+    """Returns the path of the index holding metadata for every save."""
+    return os.path.join(SAVE_DIR, "index.json")
+
+
+def get_journal_path():
+    """Returns the path of the turn journal."""
+    return os.path.join(SAVE_DIR, "journal")
+
 # Save data
-MAX_SAVES = 5
+MAX_SAVES = 200
+SAVE_MENU_WIDTH = 64
+SAVE_MENU_ROWS = 20
+SAVE_COMPRESSION = "zlib"  # None, "zlib" or "lzma"
+SAVE_MAX_DELTAS = 16  # Deltas appended to a save before it is rewritten in full
+SAVE_PLANES_MIN_TILES = 1 << 20  # Maps this large keep their tiles uncompressed for mapping
+SAVE_VERIFY = False  # Regenerate floors when saving and store them in full if they differ
+AUTOSAVE = False  # Save in the background whenever a new level starts
+AUTOSAVE_SLOT = MAX_SAVES - 1
+RECOVERY_SLOT = -1  # Hidden slot holding the snapshot the journal starts from
+
+# Dungeon floors
+FLOOR_CACHE = 4  # Floors left most recently that stay in memory; older ones go to disk
+
+# Turn journal
+JOURNAL_BATCH = 16  # Commands buffered before the journal is synced
+JOURNAL_SYNC_INTERVAL = 2.0  # Longest time in seconds a command stays buffered
+
+# Startup
+SHOW_CREDITS = True  # Play the libtcod credits before the main menu; a key press skips them
 
 # Console dimensions
 SCREEN_WIDTH = 150
@@ -45,6 +74,17 @@ BAR_HEIGHT = BAR_UNADJUSTED if BAR_UNADJUSTED % 2 == 1 else BAR_UNADJUSTED + 1
 MSG_WIDTH = GUI_WIDTH / 2
 MSG_HEIGHT = GUI_HEIGHT - BORDER_WIDTH
 ITEMS_PER_PAGE = 15
+LOG_WIDTH = 90
+LOG_HEIGHT = 40
+
+# Performance HUD
+PERF_WINDOW = 120
+PERF_REFRESH = 10
+
+# Message log
+MSG_HISTORY_LIVE = 1000
+MSG_HISTORY_SPILL = False
+MSG_WRAP_CACHE = 512
 
 # Room data
 ROOM_MAX_SIZE = 25
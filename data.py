@@ -21,6 +21,9 @@ COLOURS = {
     'bar_hp_unfilled': libt.darker_red,
     'text': libt.lightest_grey,
     'selection_text': libt.yellow,
+    'perf_text': libt.light_green,
+    'look_cursor': libt.sky,
+    'save_text': libt.light_sky,
     'mob_behaviour_text': libt.amber,
     'mob_atk_text': libt.flame,
     'player_atk_text': libt.grey,
@@ -41,6 +44,13 @@ REBUILD = "rebuild"
 CONFIRM_YES = "confirm_yes"
 CONFIRM_NO = "confirm_no"
 
+# Player commands, as recorded in the turn journal
+CMD_MOVE = 0
+CMD_TAKE = 1
+CMD_STAIRS = 2
+CMD_DROP = 3
+CMD_USE = 4
+
 # Entity states
 HOLD = 0
 CHASE = 1
@@ -6,7 +6,6 @@
 import collections
 import copy
 import math
-import random
 import libtcodpy as libt
 import data
 
@@ -23,6 +22,12 @@ class Entity(object):
     solid: true if player can't walk through entity
     visible_in_fog: true if player can see entity in fog of war
     """
+    # Fields kept in save files as (attribute, kind) pairs, where a kind
+    # is a struct format code, "str", "char", "state" or "inv". Each
+    # class lists only the fields it adds; anything else is set up by
+    # the constructor.
+    persist = (('x', 'h'), ('y', 'h'), ('name', 'str'), ('char', 'char'), ('solid', '?'))
+
     def __init__(self, x, y, name, char, colour, solid=False, visible_in_fog=False):
         self.x = x
         self.y = y
@@ -40,17 +45,17 @@ class Entity(object):
 
     def draw(self):
         """Draws entity on console."""
-        if (libt.map_is_in_fov(self.handler.fov_map, self.x, self.y) or 
-            self.handler.world.map[self.x][self.y].seen and self.visible_in_fog):
-            libt.console_set_default_foreground(self.handler.game_map, self.colour)
-            libt.console_put_char(self.handler.game_map, self.x, self.y, 
-                                  self.char, libt.BKGND_NONE)
+        if (self.handler.in_fov(self.x, self.y) or 
+            self.handler.world.is_seen(self.x, self.y) and self.visible_in_fog):
+            self.handler.backend.set_default_foreground(self.handler.game_map, self.colour)
+            self.handler.backend.put_char(self.handler.game_map, self.x, self.y, 
+                                          self.char, libt.BKGND_NONE)
 
     def clear(self):
         """Clears entity from console."""
-        if libt.map_is_in_fov(self.handler.fov_map, self.x, self.y):
-            libt.console_put_char(self.handler.game_map, self.x, self.y, 
-                                  " ", libt.BKGND_NONE)
+        if self.handler.in_fov(self.x, self.y):
+            self.handler.backend.put_char(self.handler.game_map, self.x, self.y, 
+                                          " ", libt.BKGND_NONE)
 
     def send_to_back(self, lst_of_entities):
         """Moves entity to first index in respective list."""
@@ -60,6 +65,8 @@ class Entity(object):
 
 class LivingEntity(Entity):
     """Class for entities that are alive."""
+    persist = (('inv', 'inv'),)
+
     def __init__(self, x, y, name, char, colour):
         Entity.__init__(self, x, y, name, char, colour, True)
         self.inv = collections.OrderedDict()
@@ -93,6 +100,7 @@ class LivingEntity(Entity):
         for item in reversed(self.handler.map_objects['items']):
             if item.x == self.x and item.y == self.y:
                 self.handler.map_objects['items'].remove(item)
+                self.handler.world.invalidate_index()
                 self.add_to_inv(item)
                 return item.name
 
@@ -127,6 +135,8 @@ class CombatEntity(LivingEntity):
     hp: hitpoints for entity
     atk: attack strength of entity
     """
+    persist = (('hp', 'i'), ('max_hp', 'i'), ('atk', 'i'))
+
     def __init__(self, x, y, name, char, colour, hp, atk):
         LivingEntity.__init__(self, x, y, name, char, colour)
         self.hp = hp
@@ -151,7 +161,7 @@ class CombatEntity(LivingEntity):
     def deal_damage(self, target):
         """Deals damage to target entity."""
         if hasattr(target, "hp"):
-            dmg = random.randrange(self.atk + 1)
+            dmg = self.handler.rng.combat.randrange(self.atk + 1)
             target.take_damage(dmg)
             return dmg
 
@@ -163,7 +173,7 @@ class CombatEntity(LivingEntity):
 
 class Player(CombatEntity):
     """Player class."""
-    def __init__(self, x, y, name):
+    def __init__(self, x, y, name=""):
         CombatEntity.__init__(self, x, y, name, "@", 
                               data.COLOURS['player'], 300, 30)
 
@@ -221,14 +231,13 @@ class Mob(CombatEntity):
     morale: probability for entity to stand its ground in combat
     state: defines AI behaviour of entity
     """
+    persist = (('state', 'state'), ('morale', 'i'))
+
     def __init__(self, x, y, name, char, hp, atk, morale, state=data.HOLD):
         CombatEntity.__init__(self, x, y, name, char, 
                               data.COLOURS['mob'], hp, atk)
         self.morale = morale
         self.state = state
-        self.state_chart = [[None, self.in_sight_and_healthy, self.in_sight_and_not_healthy],
-                            [self.not_in_sight, None, self.in_sight_and_not_healthy],
-                            [self.not_in_sight, self.in_sight_and_healthy, None]]
 
     def die(self):
         self.char = "X"
@@ -238,7 +247,7 @@ class Mob(CombatEntity):
 
     # Behavioural checks to switch between states
     def in_sight(self):
-        return libt.map_is_in_fov(self.handler.fov_map, self.x, self.y)
+        return self.handler.in_fov(self.x, self.y)
 
     def not_in_sight(self):
         return not self.in_sight()
@@ -250,7 +259,7 @@ class Mob(CombatEntity):
         return self.in_sight() and self.healthy()
 
     def in_sight_and_not_healthy(self):
-        if random.randrange(101) > self.morale:
+        if self.handler.rng.ai.randrange(101) > self.morale:
             return self.in_sight() and not self.healthy()
 
         return False
@@ -324,7 +333,7 @@ class Mob(CombatEntity):
             if not check:
                 x += 1
                 continue
-            elif check():
+            elif check(self):
                 self.state = x
 
                 # Some messages when state changes
@@ -344,16 +353,17 @@ class Mob(CombatEntity):
         elif self.state == data.RUN:
             self.run(self.handler.player)
 
-    # Methods to facilitate pickling
-    def __getstate__(self):
-        self.state_chart = None
-        return self.__dict__
+    # Checks that move a mob from the state given by the row to the
+    # state given by the column
+    state_chart = [[None, in_sight_and_healthy, in_sight_and_not_healthy],
+                   [not_in_sight, None, in_sight_and_not_healthy],
+                   [not_in_sight, in_sight_and_healthy, None]]
 
+    # Methods to facilitate pickling
     def __setstate__(self, state):
-        self.__dict__ = state
-        self.state_chart = [[None, self.in_sight_and_healthy, self.in_sight_and_not_healthy],
-                            [self.not_in_sight, None, self.in_sight_and_not_healthy],
-                            [self.not_in_sight, self.in_sight_and_healthy, None]]
+        # Mobs pickled by older versions carry their own state chart
+        self.__dict__.update((key, val) for (key, val) in state.items()
+                             if key != 'state_chart')
 
 
 class Spider(Mob):
@@ -462,6 +472,22 @@ class HealthPotion(Potion):
 
 
 class Stairs(Entity):
+    """
+    Stairs up to the next floor.
+
+    direction: change in depth when the stairs are taken
+    """
+    direction = 1
+
     def __init__(self, x, y):
         Entity.__init__(self, x, y, "Stairs", "<", 
                         data.COLOURS['stairs'], False, True)
+
+
+class DownStairs(Stairs):
+    """Stairs back down to the previous floor."""
+    direction = -1
+
+    def __init__(self, x, y):
+        Entity.__init__(self, x, y, "Stairs down", ">", 
+                        data.COLOURS['stairs'], False, True)
@@ -0,0 +1,101 @@
+#
+# floors.py
+# Keeps the floors of the dungeon the player is not on
+#
+
+import collections
+import os
+import shutil
+import tempfile
+import config
+import saveformat
+
+
+class FloorCache(object):
+    """
+    Floors the player has left, keyed by floor id, which is the depth
+    of the floor. The floors left most recently are kept in memory as
+    they were, so returning to them is instant. Older floors are encoded
+    and written to a temporary directory, and decoded again on return,
+    so memory use does not grow with the depth of the dungeon.
+
+    Changes are counted in generation, which restore() and clear() reset,
+    so that saves can tell whether the floors they hold are still current.
+
+    size: number of floors kept in memory
+    """
+    def __init__(self, size=config.FLOOR_CACHE):
+        self.size = size
+        self.live = collections.OrderedDict()
+        self.stored = {}
+        self.directory = None
+        self.generation = 0
+
+    def __contains__(self, floor_id):
+        return floor_id in self.live or floor_id in self.stored
+
+    def store(self, floor_id, game_world, map_objects):
+        """Keeps the floor the player has just left, evicting the oldest if needed."""
+        self.live[floor_id] = (game_world, map_objects)
+        self.generation += 1
+
+        while len(self.live) > self.size:
+            (old_id, (old_world, old_objects)) = self.live.popitem(False)
+            self.write(old_id, saveformat.encode_floor(old_world, old_objects))
+
+    def take(self, floor_id):
+        """
+        Returns the (world, map objects) of the floor with given id and
+        forgets it, as the player is about to enter it.
+        Requires that the floor is in the cache.
+        """
+        self.generation += 1
+
+        if floor_id in self.live:
+            return self.live.pop(floor_id)
+
+        path = self.stored.pop(floor_id)
+        with open(path, "rb") as floorfile:
+            buf = saveformat.map_file(floorfile)
+
+        os.remove(path)
+        return saveformat.decode_floor(buf)
+
+    def write(self, floor_id, buf):
+        """Writes an encoded floor to the cache directory."""
+        if not self.directory:
+            self.directory = tempfile.mkdtemp(prefix="bogey-floors-")
+
+        path = os.path.join(self.directory, "floor_" + str(floor_id))
+        with open(path, "wb") as floorfile:
+            floorfile.write(buf)
+
+        self.stored[floor_id] = path
+
+    def encoded(self):
+        """Returns a sorted list of (floor id, encoded floor) pairs of every floor."""
+        floors = [(floor_id, saveformat.encode_floor(*self.live[floor_id]))
+                  for floor_id in self.live]
+
+        for (floor_id, path) in self.stored.items():
+            with open(path, "rb") as floorfile:
+                floors.append((floor_id, floorfile.read()))
+
+        return sorted(floors)
+
+    def restore(self, floors):
+        """Replaces the cache with (floor id, encoded floor) pairs from a save."""
+        self.clear()
+
+        for (floor_id, buf) in floors:
+            self.write(floor_id, buf)
+
+    def clear(self):
+        """Forgets every floor and removes the cache directory."""
+        self.live.clear()
+        self.stored.clear()
+        self.generation = 0
+
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
@@ -3,11 +3,12 @@
 # Classes for each element of the GUI
 #
 
-import textwrap
+import collections
+import time
 import libtcodpy as libt
 import config
 import data
-import save
+import messages
 
 
 class GUIElement(object):
@@ -23,65 +24,88 @@ class Border(GUIElement):
     """Border that surrounds the GUI."""
     def __init__(self):
         GUIElement.__init__(self)
+        self.hover_key = None
+        self.hover_text = ""
 
     def objects_under_mouse(self):
-        """Returns list of entities that mouse is hovering over."""
-        x = self.handler.mouse.cx
-        y = self.handler.mouse.cy
+        """
+        Returns names of the entities under the mouse, or under the look
+        cursor if it is active. The result is cached until the cursor 
+        moves, a turn passes or the FOV changes.
+        """
+        if self.handler.look_cursor:
+            (x, y) = self.handler.look_cursor
+        else:
+            x = self.handler.mouse.cx
+            y = self.handler.mouse.cy
+
+        key = (x, y, self.handler.turn, self.handler.fov_generation, 
+               self.handler.world.index_version)
+
+        if key != self.hover_key:
+            self.hover_key = key
+            self.hover_text = self.describe_tile(x, y)
+
+        return self.hover_text
+
+    def describe_tile(self, x, y):
+        """Returns names of the visible entities on tile (x, y)."""
+        tile = self.handler.world.entities_at(x, y)
         names = []
 
-        for stairs in self.handler.map_objects['stairs']:
-            if (stairs.x == x and stairs.y == y and 
-                self.handler.world.map[x][y].seen):
+        if not tile:
+            return ""
+
+        visible = self.handler.in_fov(x, y)
+
+        for (lst, stairs) in tile:
+            if lst == 'stairs' and self.handler.world.is_seen(x, y):
                 names.append(stairs.name)
 
         # Names of mobs
-        for entity in self.handler.map_objects['mobs']:
-            if (entity.x == x and entity.y == y and 
-                libt.map_is_in_fov(self.handler.fov_map, entity.x, entity.y)):
+        for (lst, entity) in tile:
+            if lst == 'mobs' and visible:
                 if entity.state == data.DEAD:
                     names.append(entity.name)
                 else:
                     names.append("{} [{}/{}]".format(entity.name, entity.hp, entity.max_hp))
 
         # Names of items
-        for item in self.handler.map_objects['items']:
-            if (item.x == x and item.y == y and
-                libt.map_is_in_fov(self.handler.fov_map, item.x, item.y)):
+        for (lst, item) in tile:
+            if lst == 'items' and visible:
                 names.append(item.name)
 
-        names = ", ".join(names)
-        return names
+        return ", ".join(names)
 
     def draw(self):
         """Draws borders around the info panel."""
-        libt.console_set_default_background(self.handler.gui, data.COLOURS['gui_bg'])
-        libt.console_clear(self.handler.gui)
+        self.handler.backend.set_default_background(self.handler.gui, data.COLOURS['gui_bg'])
+        self.handler.backend.clear(self.handler.gui)
 
         upper_height = config.BORDER_WIDTH / 2
         left_height = config.GUI_HEIGHT - upper_height*2
 
-        libt.console_set_default_background(self.handler.gui, data.COLOURS['gui_border'])
+        self.handler.backend.set_default_background(self.handler.gui, data.COLOURS['gui_border'])
         # Upper border
-        libt.console_rect(self.handler.gui, 0, 0, config.GUI_WIDTH, upper_height, 
-                          False, libt.BKGND_SCREEN)
+        self.handler.backend.rect(self.handler.gui, 0, 0, config.GUI_WIDTH, upper_height, 
+                                  False, libt.BKGND_SCREEN)
         # Lower border
-        libt.console_rect(self.handler.gui, 0, config.GUI_HEIGHT - config.BORDER_WIDTH/2,  
-                          config.GUI_WIDTH, upper_height, False, libt.BKGND_SCREEN)
+        self.handler.backend.rect(self.handler.gui, 0, config.GUI_HEIGHT - config.BORDER_WIDTH/2,  
+                                  config.GUI_WIDTH, upper_height, False, libt.BKGND_SCREEN)
         # Left border
-        libt.console_rect(self.handler.gui, 0, upper_height, config.BORDER_WIDTH / 2, 
-                          left_height, False, libt.BKGND_SCREEN)
+        self.handler.backend.rect(self.handler.gui, 0, upper_height, config.BORDER_WIDTH / 2, 
+                                  left_height, False, libt.BKGND_SCREEN)
         # Right border
-        libt.console_rect(self.handler.gui, config.GUI_WIDTH - config.BORDER_WIDTH/2, upper_height, 
-                          config.BORDER_WIDTH / 2, left_height, False, libt.BKGND_SCREEN)
+        self.handler.backend.rect(self.handler.gui, config.GUI_WIDTH - config.BORDER_WIDTH/2, upper_height, 
+                                  config.BORDER_WIDTH / 2, left_height, False, libt.BKGND_SCREEN)
         # Middle border
-        libt.console_rect(self.handler.gui, (config.GUI_WIDTH - 1)/2 - config.BORDER_WIDTH/2, upper_height, 
-                          config.BORDER_WIDTH, left_height, False, libt.BKGND_SCREEN)
+        self.handler.backend.rect(self.handler.gui, (config.GUI_WIDTH - 1)/2 - config.BORDER_WIDTH/2, upper_height, 
+                                  config.BORDER_WIDTH, left_height, False, libt.BKGND_SCREEN)
 
         # Hover details
-        libt.console_set_default_foreground(self.handler.gui, data.COLOURS['text'])
-        libt.console_print_ex(self.handler.gui, (config.GUI_WIDTH - 1)/2, 0,
-                              libt.BKGND_NONE, libt.CENTER, self.objects_under_mouse())
+        self.handler.backend.set_default_foreground(self.handler.gui, data.COLOURS['text'])
+        self.handler.backend.print_ex(self.handler.gui, (config.GUI_WIDTH - 1)/2, 0,
+                                      libt.BKGND_NONE, libt.CENTER, self.objects_under_mouse())
 
 
 class StatusBar(GUIElement):
@@ -113,23 +137,23 @@ class StatusBar(GUIElement):
         """
         filled_width = int(float(self.val) / self.max_val * config.BAR_WIDTH)
 
-        libt.console_set_default_background(self.handler.gui, self.back_colour)
-        libt.console_rect(self.handler.gui, self.x, self.y, config.BAR_WIDTH, config.BAR_HEIGHT, 
-                          False, libt.BKGND_SCREEN)
+        self.handler.backend.set_default_background(self.handler.gui, self.back_colour)
+        self.handler.backend.rect(self.handler.gui, self.x, self.y, config.BAR_WIDTH, config.BAR_HEIGHT, 
+                                  False, libt.BKGND_SCREEN)
 
-        libt.console_set_default_background(self.handler.gui, self.bar_colour)
+        self.handler.backend.set_default_background(self.handler.gui, self.bar_colour)
         if filled_width > 0:
-            libt.console_rect(self.handler.gui, self.x, self.y, filled_width, config.BAR_HEIGHT, 
-                              False, libt.BKGND_SCREEN)
+            self.handler.backend.rect(self.handler.gui, self.x, self.y, filled_width, config.BAR_HEIGHT, 
+                                      False, libt.BKGND_SCREEN)
 
         bar_midpoint = (int(config.BAR_WIDTH/2 + self.x), int(config.BAR_HEIGHT/2 + self.y))
 
-        libt.console_set_default_foreground(self.handler.gui, data.COLOURS['text'])
-        libt.console_print_ex(self.handler.gui, bar_midpoint[0], bar_midpoint[1], 
-                              libt.BKGND_NONE, libt.CENTER,
-                              "{}: {}/{}".format(self.name, self.val, self.max_val))
+        self.handler.backend.set_default_foreground(self.handler.gui, data.COLOURS['text'])
+        self.handler.backend.print_ex(self.handler.gui, bar_midpoint[0], bar_midpoint[1], 
+                                      libt.BKGND_NONE, libt.CENTER,
+                                      "{}: {}/{}".format(self.name, self.val, self.max_val))
 
-        libt.console_set_default_foreground(self.handler.gui, data.COLOURS['text'])
+        self.handler.backend.set_default_foreground(self.handler.gui, data.COLOURS['text'])
 
 
 class HealthBar(StatusBar):
@@ -144,25 +168,55 @@ class MessageBox(GUIElement):
     """Messages are displayed here."""
     def __init__(self):
         GUIElement.__init__(self)
-        self.messages = []
+        self.history = messages.MessageHistory()
         self.max_messages = config.MSG_HEIGHT - config.BORDER_WIDTH
+        self.wrap_width = config.MSG_WIDTH - config.BORDER_WIDTH*2
+        self.messages = collections.deque(maxlen=self.max_messages)
 
     def add_msg(self, msg, colour=data.COLOURS['text']):
         """Adds a message to the message box."""
-        wrapped = textwrap.wrap(msg, config.MSG_WIDTH - config.BORDER_WIDTH*2)
+        index = self.history.append(msg, colour)
+        self.messages.extend(self.history.wrapped(index, self.wrap_width))
 
-        for line in wrapped:
-            if len(self.messages) == self.max_messages:
-                del self.messages[0]
-            self.messages.append((line, colour))
+    def restore(self, entries):
+        """Replaces the message history with the given (message, colour) pairs."""
+        self.history.close()
+        self.history = messages.MessageHistory()
+        self.messages.clear()
+
+        for (msg, colour) in entries:
+            self.history.append(msg, colour)
+
+        # Every message takes at least one line, so only the last
+        # max_messages of them can be on screen
+        for index in range(max(len(self.history) - self.max_messages, 0), len(self.history)):
+            self.messages.extend(self.history.wrapped(index, self.wrap_width))
 
     def draw(self):
         """Draws messages in the message box."""
         y = config.BORDER_WIDTH
         for (msg, colour) in self.messages:
-            libt.console_set_default_foreground(self.handler.gui, colour)
-            libt.console_print_ex(self.handler.gui, config.MSG_WIDTH - 1 + config.BORDER_WIDTH, y, 
-                                  libt.BKGND_NONE, libt.LEFT, msg)
+            self.handler.backend.set_default_foreground(self.handler.gui, colour)
+            self.handler.backend.print_ex(self.handler.gui, config.MSG_WIDTH - 1 + config.BORDER_WIDTH, y, 
+                                          libt.BKGND_NONE, libt.LEFT, msg)
+            y += 1
+
+
+class PerfHUD(GUIElement):
+    """Frame timing breakdown drawn below the health bar."""
+    def __init__(self):
+        GUIElement.__init__(self)
+        self.x = config.BORDER_WIDTH
+        self.y = config.BORDER_WIDTH*2 + config.BAR_HEIGHT
+
+    def draw(self):
+        """Draws the profiler's report in the left panel."""
+        self.handler.backend.set_default_foreground(self.handler.gui, data.COLOURS['perf_text'])
+
+        y = self.y
+        for line in self.handler.profiler.report():
+            self.handler.backend.print_ex(self.handler.gui, self.x, y, 
+                                          libt.BKGND_NONE, libt.LEFT, line)
             y += 1
 
 
@@ -191,14 +245,14 @@ class Overlay(GUIElement):
         self.ingame = ingame
         self.pad = pad
 
-        self.header_height = libt.console_get_height_rect(self.handler.game_map, 0, 0, 
-                                                          config.SCREEN_WIDTH, 
-                                                          config.SCREEN_HEIGHT, 
-                                                          self.header)
+        self.header_height = self.handler.backend.get_height_rect(self.handler.game_map, 0, 0, 
+                                                                  config.SCREEN_WIDTH, 
+                                                                  config.SCREEN_HEIGHT, 
+                                                                  self.header)
         assert self.header_height == 1
 
         # Initialize overlay and define some parameters
-        self.overlay = libt.console_new(self.width, self.height)
+        self.overlay = self.handler.backend.console_new(self.width, self.height)
         self.header_pad = 1
 
     def background(self):
@@ -220,11 +274,11 @@ class Overlay(GUIElement):
             self.header_x = self.width - 1 - self.pad
             self.libt_align = libt.RIGHT
 
-        libt.console_set_default_foreground(self.overlay, data.COLOURS['text'])
-        libt.console_print_ex(self.overlay, self.header_x, self.header_pad, 
-                              libt.BKGND_NONE, self.libt_align, self.header)
-        libt.console_blit(self.overlay, 0, 0, self.width, self.height, 
-                          0, self.x, self.y, 1.0, 0.7)
+        self.handler.backend.set_default_foreground(self.overlay, data.COLOURS['text'])
+        self.handler.backend.print_ex(self.overlay, self.header_x, self.header_pad, 
+                                      libt.BKGND_NONE, self.libt_align, self.header)
+        self.handler.backend.blit(self.overlay, 0, 0, self.width, self.height, 
+                                  0, self.x, self.y, 1.0, 0.7)
 
 
 class SelectMenu(Overlay):
@@ -269,7 +323,7 @@ class SelectMenu(Overlay):
         then draws the background and header.
         """
         self.background()
-        libt.console_clear(self.overlay)
+        self.handler.backend.clear(self.overlay)
 
         if self.options:
             def print_options():
@@ -285,15 +339,15 @@ class SelectMenu(Overlay):
                     self.libt_align = libt.RIGHT
 
                 if y - self.header_height - self.header_pad == self.selection_index - self.slice_head:
-                    libt.console_set_default_foreground(self.overlay, 
-                                                        data.COLOURS['selection_text'])
-                    libt.console_print_ex(self.overlay, self.option_x, y + self.pad,
-                                          libt.BKGND_NONE, self.libt_align, text)
+                    self.handler.backend.set_default_foreground(self.overlay, 
+                                                                data.COLOURS['selection_text'])
+                    self.handler.backend.print_ex(self.overlay, self.option_x, y + self.pad,
+                                                  libt.BKGND_NONE, self.libt_align, text)
                 else:
-                    libt.console_set_default_foreground(self.overlay, 
-                                                        data.COLOURS['text'])
-                    libt.console_print_ex(self.overlay, self.option_x, y + self.pad, 
-                                          libt.BKGND_NONE, self.libt_align, text)
+                    self.handler.backend.set_default_foreground(self.overlay, 
+                                                                data.COLOURS['text'])
+                    self.handler.backend.print_ex(self.overlay, self.option_x, y + self.pad, 
+                                                  libt.BKGND_NONE, self.libt_align, text)
 
             y = self.header_height + self.header_pad
 
@@ -310,17 +364,17 @@ class SelectMenu(Overlay):
                     print_options()
                     y += 1
         else:
-            libt.console_set_default_foreground(self.overlay, data.COLOURS['text'])
-            libt.console_print_ex(self.overlay, self.pad, self.header_height + self.header_pad + self.pad, 
-                                  libt.BKGND_NONE, libt.LEFT, self.empty_options)
+            self.handler.backend.set_default_foreground(self.overlay, data.COLOURS['text'])
+            self.handler.backend.print_ex(self.overlay, self.pad, self.header_height + self.header_pad + self.pad, 
+                                          libt.BKGND_NONE, libt.LEFT, self.empty_options)
 
         Overlay.draw(self)
-        libt.console_flush()
+        self.handler.backend.flush()
 
     def select(self):
         """Handles selection of options in the menu."""
-        while self.active:
-            choice = libt.console_check_for_keypress(True)
+        while self.active and not self.handler.backend.is_window_closed():
+            choice = self.handler.backend.check_for_keypress(True)
 
             if self.escape:
                 for key in self.escape:
@@ -341,8 +395,12 @@ class SelectMenu(Overlay):
                     self.selection_index += 1
                     self.slice_head += 1
                     self.slice_tail += 1
+            elif choice.vk == libt.KEY_PAGEUP:
+                self.scroll(-self.max_options)
+            elif choice.vk == libt.KEY_PAGEDOWN:
+                self.scroll(self.max_options)
             elif choice.vk == libt.KEY_ENTER and choice.lalt:
-                libt.console_set_fullscreen(not libt.console_is_fullscreen())
+                self.handler.backend.set_fullscreen(not self.handler.backend.is_fullscreen())
             elif choice.vk == libt.KEY_ENTER and self.options:
                 if self.selection_index in self.bindings:
                     status = self.bindings[self.selection_index]()
@@ -365,6 +423,17 @@ class SelectMenu(Overlay):
 
         return self.status
 
+    def scroll(self, amount):
+        """Moves the selection and the visible options by amount."""
+        if not self.options:
+            return
+
+        last_head = max(self.max_selection + 1 - self.max_options, 0)
+        self.slice_head = max(0, min(last_head, self.slice_head + amount))
+        self.slice_tail = min(self.slice_head + self.max_options, self.max_selection + 1)
+        self.selection_index = max(self.slice_head, min(self.slice_tail - 1, 
+                                                        self.selection_index + amount))
+
 
 class StandardMenu(SelectMenu):
     """
@@ -405,7 +474,7 @@ class InGameMenu(StandardMenu):
                               "", [], 4, bindings, [libt.KEY_ESCAPE])
 
     def background(self):
-        self.handler.render_all()
+        self.handler.draw_frame()
 
     def bind_resume(self):
         """Dismisses menu."""
@@ -436,7 +505,7 @@ class InventoryMenu(StandardMenu):
             'd': self.bind_drop,
             'e': self.bind_use_item
         }
-        self.item_use_bindings = []
+        self.items = []
 
         item_names = []
         item_qty = []
@@ -446,19 +515,11 @@ class InventoryMenu(StandardMenu):
                 for i in range(self.handler.player.inv[item]):
                     item_names.append(item.name)
                     item_qty.append("")
-                    
-                    if item.usable:
-                        self.item_use_bindings.append(item.use)
-                    else:
-                        self.item_use_bindings.append(lambda: None)
+                    self.items.append(item)
             else:
                 item_names.append(item.name)
                 item_qty.append("Qty: {}".format(self.handler.player.inv[item]))
-
-                if item.usable:
-                    self.item_use_bindings.append(item.use)
-                else:
-                    self.item_use_bindings.append(lambda: None)
+                self.items.append(item)
 
         StandardMenu.__init__(self, data.LEFT, "Inventory", data.CENTER, 40,
                               True, item_names, "Your inventory is empty.", 
@@ -466,22 +527,20 @@ class InventoryMenu(StandardMenu):
                               bindings, [libt.KEY_ESCAPE, "i"])
 
     def background(self):
-        self.handler.render_all()
+        self.handler.draw_frame()
 
     def remove_option(self, item):
         """
         Takes an item in player's inventory and decreases its count in
-        the list of options, removing it and its item use binding, if 
-        applicable, altogether when the count reaches zero.
+        the list of options, removing it altogether when the count 
+        reaches zero.
         """
         item_count = self.handler.player.inv[item]
 
         if item_count == 1 or not item.stackable:
             del self.options[self.selection_index]
             del self.tail_txt[self.selection_index]
-            
-            if item.usable:
-                self.item_use_bindings.pop(self.selection_index)
+            del self.items[self.selection_index]
 
             if self.selection_index == self.max_selection and self.slice_head > 0:
                 self.slice_head -= 1
@@ -498,45 +557,50 @@ class InventoryMenu(StandardMenu):
     def bind_drop(self):
         """Binding for dropping an item."""
         if self.options:
-            for item in self.handler.player.inv:
-                if item.name == self.options[self.selection_index]:
-                    self.remove_option(item)
-                    self.handler.player.player_drop(item)
-                    break
+            item = self.items[self.selection_index]
+            inv_index = list(self.handler.player.inv).index(item)
+
+            self.remove_option(item)
+            self.handler.perform(data.CMD_DROP, inv_index)
+            self.handler.capture_frame()
 
     def bind_use_item(self):
-        """Wrapper for inventory items' use() method."""
-        if self.selection_index < len(self.item_use_bindings):
-            used = self.item_use_bindings[self.selection_index]()
+        """Uses the selected item, if it is usable."""
+        if self.options and self.items[self.selection_index].usable:
+            item = self.items[self.selection_index]
+            inv_index = list(self.handler.player.inv).index(item)
 
-            if used.consumable:
-                self.remove_option(used)
-                self.handler.player.remove_from_inv(used)
+            if item.consumable:
+                self.remove_option(item)
+
+            self.handler.perform(data.CMD_USE, inv_index)
+            self.handler.capture_frame()
 
 
 class MainMenu(StandardMenu):
     """The main menu."""
     def __init__(self):
-        options = ["New Game", "Load Game", "Quit"]
+        options = ["New Game", "Load Game", "Recover Game", "Quit"]
         bindings = {
             0: self.bind_new_game,
             1: self.bind_load_menu,
-            2: self.bind_quit
+            2: self.bind_recover,
+            3: self.bind_quit
         }
 
         y = config.SCREEN_HEIGHT/2 + len(options)
 
         StandardMenu.__init__(self, data.LEFT, "BOGEY", data.CENTER, 
                               longest_str(options), False, options, 
-                              "", [], 3, bindings, [], None, y)
+                              "", [], 4, bindings, [], None, y)
 
     def background(self):
-        backdrop = libt.image_load(config.get_img_path('title'))
-        libt.image_blit_2x(backdrop, 0, 0, 0)
+        self.handler.draw_title()
 
     def bind_new_game(self):
         """Starts a new game."""
         self.handler.new_game()
+        self.handler.start_journal()
         self.handler.play()
 
     def bind_load_menu(self):
@@ -545,6 +609,11 @@ class MainMenu(StandardMenu):
         load_menu.draw()
         return load_menu.select()
 
+    def bind_recover(self):
+        """Continues the last game from where it was when the program stopped."""
+        if self.handler.recover():
+            return data.REBUILD
+
     def bind_quit(self):
         """Exits program."""
         self.active = False
@@ -553,32 +622,27 @@ class MainMenu(StandardMenu):
 class SaveLoadMenu(StandardMenu):
     """Menu that displays saved games and empty save slots."""
     def __init__(self, header, ingame):
-        self.save_handler = save.SaveHandler()
+        self.save_handler = self.handler.save_handler
+        slots = self.save_handler.slots()
         options = []
         occupied = []
         bindings = {
             'd': self.bind_delete_save
         }
-        count = 0
-
-        for save_file in self.save_handler.save_status():
-            options.append("Slot {}".format(count + 1))
-
-            if save_file:
-                occupied.append("FILLED")
-            else:
-                occupied.append("EMPTY")
 
-            count += 1
+        for i in range(config.MAX_SAVES):
+            options.append("Slot {}".format(i + 1))
+            occupied.append(describe_slot(slots.get(i)))
 
-        StandardMenu.__init__(self, data.LEFT, header, data.CENTER, 30,
-                              ingame, options, "", occupied, 5, bindings, 
+        StandardMenu.__init__(self, data.LEFT, header, data.CENTER, 
+                              config.SAVE_MENU_WIDTH, ingame, options, "", 
+                              occupied, config.SAVE_MENU_ROWS, bindings, 
                               [libt.KEY_ESCAPE])
 
     def bind_delete_save(self):
         """Deletes selected save file."""
-        if self.tail_txt[self.selection_index] == "FILLED":
-            self.tail_txt[self.selection_index] = "EMPTY"
+        if self.save_handler.is_save(self.selection_index):
+            self.tail_txt[self.selection_index] = describe_slot(None)
             self.save_handler.delete_save(self.selection_index)
 
 
@@ -591,13 +655,11 @@ class SaveMenu(SaveLoadMenu):
             self.bindings[i] = self.bind_save_game
 
     def background(self):
-        self.handler.render_all()
+        self.handler.draw_frame()
 
     def bind_save_game(self):
         """Saves game at player's current selection index."""
-        if not self.save_handler.is_save(self.selection_index):
-            self.tail_txt[self.selection_index] = "FILLED"
-        else:
+        if self.save_handler.is_save(self.selection_index):
             confirm = ConfirmMenu("You will overwrite an existing save. OK?")
             confirm.draw()
             reply = confirm.select()
@@ -605,16 +667,9 @@ class SaveMenu(SaveLoadMenu):
             if reply != data.CONFIRM_YES:
                 return
 
-        save_data = {
-            'world': self.handler.world,
-            'map_objects': self.handler.map_objects,
-            'player_index': self.handler.map_objects['characters'].index(self.handler.player),
-            'messages': self.handler.message_box.messages,
-            'game_state': self.handler.game_state,
-            'player_action': self.handler.player_action
-        }
-
-        self.save_handler.add_data(save_data, self.selection_index)
+        self.handler.save_game(self.selection_index)
+        self.tail_txt[self.selection_index] = describe_slot(
+            self.save_handler.slots().get(self.selection_index))
 
 
 class LoadMenu(SaveLoadMenu):
@@ -629,29 +684,14 @@ class LoadMenu(SaveLoadMenu):
 
     def background(self):
         if self.ingame:
-            self.handler.render_all()
+            self.handler.draw_frame()
         else:
-            backdrop = libt.image_load(config.get_img_path('title'))
-            libt.image_blit_2x(backdrop, 0, 0, 0)
+            self.handler.draw_title()
 
     def bind_load_game(self):
         """Loads game at player's current selection index, if possible."""
         if self.save_handler.is_save(self.selection_index):
-            if not self.ingame:
-                self.handler.new_game()
-            else:
-                libt.console_clear(self.handler.game_map)
-
-            save_data = self.save_handler.get_data(self.selection_index)
-
-            self.handler.world = save_data['world']
-            self.handler.map_objects = save_data['map_objects']
-            self.handler.player = self.handler.map_objects['characters'][save_data['player_index']]
-            self.handler.game_state = save_data['game_state']
-            self.handler.player_action = save_data['player_action']
-            self.handler.message_box.messages = save_data['messages']
-            self.handler.init_fov()
-
+            self.handler.load_game(self.save_handler.get_data(self.selection_index))
             return data.REBUILD
 
 
@@ -669,7 +709,7 @@ class ConfirmMenu(StandardMenu):
                               [libt.KEY_ESCAPE])
 
     def background(self):
-        self.handler.render_all()
+        self.handler.draw_frame()
 
     def confirm_yes(self):
         """Indicates user confirmation of action."""
@@ -682,6 +722,123 @@ class ConfirmMenu(StandardMenu):
         return data.CONFIRM_NO
 
 
+class MessageLog(Overlay):
+    """
+    Scrollable view of the whole message history. Messages are 
+    wrapped only as they scroll into view.
+    """
+    def __init__(self):
+        Overlay.__init__(self, (config.SCREEN_WIDTH - config.LOG_WIDTH)/2, 
+                         (config.SCREEN_HEIGHT - config.LOG_HEIGHT)/2, 
+                         "Message Log", data.CENTER, config.LOG_WIDTH, 
+                         config.LOG_HEIGHT, True, 1)
+        self.history = self.handler.message_box.history
+        self.line_width = self.width - 2*self.pad
+        self.text_y = self.header_height + self.header_pad + self.pad
+        self.max_lines = self.height - self.text_y - self.pad
+
+        # Lines are addressed by (message index, line index)
+        self.bottom_line = None
+        self.top_line = self.line_before((len(self.history), 0))
+        self.scroll(-(self.max_lines - 1))
+
+    def background(self):
+        self.handler.draw_frame()
+
+    def line_count(self, index):
+        """Returns the number of wrapped lines in the message with given index."""
+        return len(self.history.wrapped(index, self.line_width))
+
+    def line_before(self, pos):
+        """Returns the line above pos, or None if pos is the first line."""
+        (index, line) = pos
+
+        while line == 0:
+            index -= 1
+            if index < 0:
+                return None
+            line = self.line_count(index)
+
+        return (index, line - 1)
+
+    def line_after(self, pos):
+        """Returns the line below pos, or None if pos is the last line."""
+        (index, line) = (pos[0], pos[1] + 1)
+
+        while line >= self.line_count(index):
+            index += 1
+            if index >= len(self.history):
+                return None
+            line = 0
+
+        return (index, line)
+
+    def scroll(self, lines):
+        """Scrolls the log up (negative) or down (positive) by given lines."""
+        if not self.top_line:
+            return
+
+        for i in range(abs(lines)):
+            if lines < 0:
+                pos = self.line_before(self.top_line)
+            elif self.bottom_line and self.line_after(self.bottom_line):
+                pos = self.line_after(self.top_line)
+                self.bottom_line = self.line_after(self.bottom_line)
+            else:
+                pos = None
+
+            if not pos:
+                break
+            self.top_line = pos
+
+    def draw(self):
+        """Draws the lines currently in view."""
+        self.background()
+        self.handler.backend.clear(self.overlay)
+
+        pos = self.top_line
+        y = self.text_y
+
+        if not pos:
+            self.handler.backend.set_default_foreground(self.overlay, data.COLOURS['text'])
+            self.handler.backend.print_ex(self.overlay, self.pad, y, libt.BKGND_NONE, 
+                                          libt.LEFT, "There are no messages.")
+
+        while pos and y < self.text_y + self.max_lines:
+            (line, colour) = self.history.wrapped(pos[0], self.line_width)[pos[1]]
+            self.handler.backend.set_default_foreground(self.overlay, colour)
+            self.handler.backend.print_ex(self.overlay, self.pad, y, libt.BKGND_NONE, 
+                                          libt.LEFT, line)
+            self.bottom_line = pos
+            pos = self.line_after(pos)
+            y += 1
+
+        Overlay.draw(self)
+        self.handler.backend.flush()
+
+    def select(self):
+        """Handles scrolling until the log is dismissed."""
+        while not self.handler.backend.is_window_closed():
+            choice = self.handler.backend.check_for_keypress(True)
+
+            if choice.vk == libt.KEY_ESCAPE or chr(choice.c) == "m":
+                return
+            elif choice.vk == libt.KEY_UP:
+                self.scroll(-1)
+            elif choice.vk == libt.KEY_DOWN:
+                self.scroll(1)
+            elif choice.vk == libt.KEY_PAGEUP:
+                self.scroll(-self.max_lines)
+            elif choice.vk == libt.KEY_PAGEDOWN:
+                self.scroll(self.max_lines)
+            elif choice.vk == libt.KEY_ENTER and choice.lalt:
+                self.handler.backend.set_fullscreen(not self.handler.backend.is_fullscreen())
+            else:
+                continue
+
+            self.draw()
+
+
 # Miscellaneous functions
 def longest_str(lst_of_str):
     """Returns the length of the longest string in a list of strings."""
@@ -692,3 +849,22 @@ def longest_str(lst_of_str):
             longest = string
 
     return len(longest)
+
+
+def describe_slot(meta):
+    """
+    Returns the text shown beside a save slot, given its metadata
+    or None if the slot is empty.
+    """
+    if meta is None:
+        return "EMPTY"
+    elif not meta:
+        return "FILLED"
+
+    (minutes, seconds) = divmod(meta['play_time'], 60)
+    (hours, minutes) = divmod(minutes, 60)
+    saved_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(meta['saved_at']))
+
+    return "Depth {}  HP {}/{}  Turn {}  {}:{:02}:{:02}  {}".format(
+        meta['depth'], meta['hp'], meta['max_hp'], meta['turn'], 
+        hours, minutes, seconds, saved_at)
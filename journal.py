@@ -0,0 +1,119 @@
+#
+# journal.py
+# Turn journal for recovering games after a crash
+#
+# The journal holds every command the player gave since the recovery
+# snapshot, along with the seed the random streams were started from
+# before it ran. Loading the snapshot and replaying the commands under
+# the same seeds rebuilds the game exactly.
+#
+#   header:     magic, format version, turn and depth of the snapshot
+#   records:    seed, command, two arguments; one per command
+#
+
+import os
+import struct
+import timeit
+import config
+
+MAGIC = b"BGYJ"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHIH")
+RECORD = struct.Struct("<IBhh")
+
+
+class JournalError(Exception):
+    """Raised when a journal cannot be read."""
+    pass
+
+
+class Journal(object):
+    """
+    Appends command records to the journal file. Records are buffered
+    and written with a single fsync once JOURNAL_BATCH of them have
+    built up or JOURNAL_SYNC_INTERVAL seconds have passed.
+
+    path: location of the journal file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.buf = bytearray()
+        self.pending = 0
+        self.last_sync = timeit.default_timer()
+
+    def start(self, turn, depth):
+        """Empties the journal and starts it from the snapshot at turn and depth."""
+        self.close()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.file = open(self.path, "wb")
+        self.buf.extend(HEADER.pack(MAGIC, VERSION, turn, depth))
+        self.sync()
+
+    def record(self, seed, command, arg1=0, arg2=0):
+        """Adds a command to the journal."""
+        if not self.file:
+            return
+
+        self.buf.extend(RECORD.pack(seed, command, arg1, arg2))
+        self.pending += 1
+
+        if (self.pending >= config.JOURNAL_BATCH or
+                timeit.default_timer() - self.last_sync >= config.JOURNAL_SYNC_INTERVAL):
+            self.sync()
+
+    def tick(self):
+        """
+        Syncs buffered records once JOURNAL_SYNC_INTERVAL seconds have
+        passed, so they are not held back while no commands arrive.
+        Cheap enough to call every frame.
+        """
+        if (self.pending and
+                timeit.default_timer() - self.last_sync >= config.JOURNAL_SYNC_INTERVAL):
+            self.sync()
+
+    def sync(self):
+        """Writes buffered records and flushes them to disk."""
+        if self.file and self.buf:
+            self.file.write(self.buf)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+        del self.buf[:]
+        self.pending = 0
+        self.last_sync = timeit.default_timer()
+
+    def close(self):
+        """Writes buffered records and closes the journal file."""
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def read(path):
+    """
+    Returns the turn and depth the journal at path starts from and
+    its list of (seed, command, arg1, arg2) records. A record cut
+    short by a crash is left out.
+    """
+    with open(path, "rb") as journalfile:
+        buf = journalfile.read()
+
+    if len(buf) < HEADER.size:
+        raise JournalError("journal header is truncated")
+
+    (magic, version, turn, depth) = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise JournalError("not a journal")
+    if version > VERSION:
+        raise JournalError("unsupported journal version {}".format(version))
+
+    count = (len(buf) - HEADER.size) // RECORD.size
+    records = [RECORD.unpack_from(buf, HEADER.size + i*RECORD.size) for i in range(count)]
+    return turn, depth, records
@@ -0,0 +1,626 @@
+#
+# libtcodfallback.py
+# Stand-in for the native libtcod library when it cannot be loaded
+#
+
+import ctypes
+import heapq
+import random
+
+# Flags of a map cell, as libtcod lays them out
+TRANSPARENT = 1
+WALKABLE = 2
+FOV = 4
+
+# Quadrants of the FOV as (x per column, x per row, y per column, y per row)
+QUADRANTS = [(1, 0, 0, -1), (1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0)]
+
+# Translates cell bytes to the same flags without the FOV flag
+CLEAR_FOV = bytes(bytearray(i & ~FOV for i in range(256)))
+
+# Translates cell bytes to their walkable flag
+WALKABLE_ONLY = bytes(bytearray(i & WALKABLE for i in range(256)))
+
+# Steps to the eight neighbours of a tile, the diagonal ones last
+NEIGHBOURS = [(0, -1), (-1, 0), (1, 0), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1)]
+
+
+class Function(object):
+    """
+    Stands in for a function of the native library. Like a ctypes function
+    it takes a restype and argtypes, which are ignored. Functions without
+    a Python implementation raise NotImplementedError when called.
+
+    name: name of the C function
+    impl: Python implementation, or None
+    """
+    def __init__(self, name, impl=None):
+        self.name = name
+        self.impl = impl
+        self.restype = None
+        self.argtypes = None
+
+    def __call__(self, *args):
+        if self.impl is None:
+            raise NotImplementedError("{} needs the native libtcod library".format(self.name))
+        return self.impl(*args)
+
+
+class MapStruct(ctypes.Structure):
+    """libtcod's map_t: the size of a map and its cells, one byte each, row by row."""
+    _fields_ = [('width', ctypes.c_int),
+                ('height', ctypes.c_int),
+                ('nbcells', ctypes.c_int),
+                ('cells', ctypes.POINTER(ctypes.c_uint8))]
+
+
+class HeightMapStruct(ctypes.Structure):
+    """libtcod's TCOD_heightmap_t: the size of a heightmap and its values, row by row."""
+    _fields_ = [('w', ctypes.c_int),
+                ('h', ctypes.c_int),
+                ('values', ctypes.POINTER(ctypes.c_float))]
+
+
+class Library(object):
+    """
+    Stands in for the native libtcod library, for headless runs on machines
+    without it. Maps, FOV, A* paths, Dijkstra paths, lines, colour
+    arithmetic, random numbers and basic heightmaps are implemented in
+    Python; everything else, such as consoles, raises NotImplementedError
+    when called.
+
+    Maps and heightmaps are real libtcod structures in memory allocated
+    by ctypes, so bulk access through libtcodpy works on them as on native
+    ones. The FOV is computed with symmetric shadowcasting whatever
+    algorithm is asked for.
+
+    The method for C function TCOD_name is called name.
+    """
+    def __init__(self):
+        # Maps, paths, Dijkstra maps and generators by handle
+        self.objects = {}
+        self.next_handle = 1
+
+        # Generator used when no generator is given
+        self.default_random = random.Random()
+
+        # State of the line walked by line_init() and line_step()
+        self.line_data = (ctypes.c_int * 9)()
+
+    def __getattr__(self, name):
+        impl_name = name[len("TCOD_"):]
+        impl = None
+        if name.startswith("TCOD_") and hasattr(type(self), impl_name):
+            impl = getattr(self, impl_name)
+
+        func = Function(name, impl)
+        setattr(self, name, func)
+        return func
+
+    def add(self, obj):
+        """Returns a new handle for a path or Dijkstra map."""
+        handle = self.next_handle
+        self.next_handle += 1
+        self.objects[handle] = obj
+        return handle
+
+    def get(self, handle):
+        """Returns the object with given handle, which may be wrapped in a ctypes value."""
+        return self.objects[value_of(handle)]
+
+    def delete(self, handle):
+        """Forgets the object with given handle."""
+        self.objects.pop(value_of(handle), None)
+
+    # Colours
+    def color_equals(self, c1, c2):
+        return (c1.r, c1.g, c1.b) == (c2.r, c2.g, c2.b)
+
+    def color_add(self, c1, c2):
+        return colour(min(a + b, 255) for (a, b) in zip(c1, c2))
+
+    def color_subtract(self, c1, c2):
+        return colour(max(a - b, 0) for (a, b) in zip(c1, c2))
+
+    def color_multiply(self, c1, c2):
+        return colour(a * b // 255 for (a, b) in zip(c1, c2))
+
+    def color_multiply_scalar(self, c1, value):
+        return colour(max(0, min(int(a * value_of(value)), 255)) for a in c1)
+
+    def color_lerp(self, c1, c2, coef):
+        coef = value_of(coef)
+        return colour(int(a + (b - a) * coef) for (a, b) in zip(c1, c2))
+
+    # Lines, walked with the state kept in a ctypes array of 9 ints
+    def line_init_mt(self, xo, yo, xd, yd, data):
+        (dx, dy) = (xd - xo, yd - yo)
+        (sx, sy) = (sign(dx), sign(dy))
+        e = sx*dx if sx*dx > sy*dy else sy*dy
+        data[:] = [sx, sy, e, 2*dx, 2*dy, xo, yo, xd, yd]
+
+    def line_step_mt(self, x, y, data):
+        (sx, sy, e, dx, dy, xo, yo, xd, yd) = data
+        if sx*dx > sy*dy:
+            if xo == xd:
+                return True
+            xo += sx
+            e -= sy*dy
+            if e < 0:
+                yo += sy
+                e += sx*dx
+        else:
+            if yo == yd:
+                return True
+            yo += sy
+            e -= sx*dx
+            if e < 0:
+                xo += sx
+                e += sy*dy
+
+        data[2] = e
+        (data[5], data[6]) = (xo, yo)
+        set_out(x, y, xo, yo)
+        return False
+
+    def line_init(self, xo, yo, xd, yd):
+        self.line_init_mt(xo, yo, xd, yd, self.line_data)
+
+    def line_step(self, x, y):
+        return self.line_step_mt(x, y, self.line_data)
+
+    def line(self, xo, yo, xd, yd, listener):
+        data = (ctypes.c_int * 9)()
+        (x, y) = (ctypes.c_int(xo), ctypes.c_int(yo))
+        self.line_init_mt(xo, yo, xd, yd, data)
+
+        while listener(x.value, y.value):
+            if self.line_step_mt(ctypes.byref(x), ctypes.byref(y), data):
+                return True
+        return False
+
+    # Random numbers, drawn from Python's generator whatever algorithm is asked for
+    def random_new(self, algo):
+        return self.add(random.Random())
+
+    def random_new_from_seed(self, algo, seed):
+        return self.add(random.Random(value_of(seed)))
+
+    def random_delete(self, rnd):
+        self.delete(rnd)
+
+    def random_get_int(self, rnd, mi, ma):
+        return self.generator(rnd).randint(min(mi, ma), max(mi, ma))
+
+    def random_get_float(self, rnd, mi, ma):
+        return self.generator(rnd).uniform(value_of(mi), value_of(ma))
+
+    def generator(self, rnd):
+        """Returns the generator with given handle, or the default one for 0 or None."""
+        return self.get(rnd) if value_of(rnd) else self.default_random
+
+    # Maps
+    def map_new(self, width, height):
+        cells = (ctypes.c_uint8 * (width*height))()
+        cmap = MapStruct(width, height, width*height, ctypes.cast(cells, ctypes.POINTER(ctypes.c_uint8)))
+        handle = ctypes.addressof(cmap)
+        self.objects[handle] = (cmap, cells)
+        return handle
+
+    def map_delete(self, m):
+        self.delete(m)
+
+    def map_get_width(self, m):
+        return self.get(m)[0].width
+
+    def map_get_height(self, m):
+        return self.get(m)[0].height
+
+    def map_get_nb_cells(self, m):
+        return self.get(m)[0].nbcells
+
+    def map_copy(self, source, dest):
+        (src_cells, dest_cells) = (self.get(source)[1], self.get(dest)[1])
+        ctypes.memmove(dest_cells, src_cells, min(len(src_cells), len(dest_cells)))
+
+    def map_clear(self, m, transparent, walkable):
+        flags = ((TRANSPARENT if value_of(transparent) else 0) |
+                 (WALKABLE if value_of(walkable) else 0))
+        cells = self.get(m)[1]
+        ctypes.memset(cells, flags, len(cells))
+
+    def map_set_properties(self, m, x, y, transparent, walkable):
+        (cmap, cells) = self.get(m)
+        i = y*cmap.width + x
+        cells[i] = ((cells[i] & FOV) |
+                    (TRANSPARENT if value_of(transparent) else 0) |
+                    (WALKABLE if value_of(walkable) else 0))
+
+    def map_is_in_fov(self, m, x, y):
+        (cmap, cells) = self.get(m)
+        return bool(cells[y*cmap.width + x] & FOV)
+
+    def map_is_transparent(self, m, x, y):
+        (cmap, cells) = self.get(m)
+        return bool(cells[y*cmap.width + x] & TRANSPARENT)
+
+    def map_is_walkable(self, m, x, y):
+        (cmap, cells) = self.get(m)
+        return bool(cells[y*cmap.width + x] & WALKABLE)
+
+    def map_compute_fov(self, m, x, y, radius, light_walls, algo):
+        (cmap, cells) = self.get(m)
+        flags = bytearray(ctypes.string_at(cells, len(cells)).translate(CLEAR_FOV))
+        shadowcast(flags, cmap.width, cmap.height, x, y, value_of(radius), value_of(light_walls))
+        ctypes.memmove(cells, bytes(flags), len(flags))
+
+    # Heightmaps
+    def heightmap_new(self, width, height):
+        values = (ctypes.c_float * (width*height))()
+        hm = HeightMapStruct(width, height, ctypes.cast(values, ctypes.POINTER(ctypes.c_float)))
+        self.objects[ctypes.addressof(hm)] = (hm, values)
+        return ctypes.pointer(hm)
+
+    def heightmap_delete(self, hm):
+        self.delete(ctypes.addressof(hm.contents))
+
+    def heightmap_values(self, hm):
+        """Returns the ctypes array of values of a heightmap pointer."""
+        return self.get(ctypes.addressof(hm.contents))[1]
+
+    def heightmap_get_value(self, hm, x, y):
+        return self.heightmap_values(hm)[y*hm.contents.w + x]
+
+    def heightmap_set_value(self, hm, x, y, value):
+        self.heightmap_values(hm)[y*hm.contents.w + x] = value_of(value)
+
+    def heightmap_clear(self, hm):
+        values = self.heightmap_values(hm)
+        ctypes.memset(values, 0, ctypes.sizeof(values))
+
+    def heightmap_add(self, hm, value):
+        values = self.heightmap_values(hm)
+        value = value_of(value)
+        for i in range(len(values)):
+            values[i] += value
+
+    # A* paths
+    def path_new_using_map(self, m, dcost):
+        (cmap, cells) = self.get(m)
+        return self.add(Path(cmap.width, cmap.height, value_of(dcost), cells))
+
+    def path_new_using_function(self, width, height, func, userdata, dcost):
+        return self.add(Path(width, height, value_of(dcost), func=func, userdata=userdata))
+
+    def path_compute(self, p, ox, oy, dx, dy):
+        return self.get(p).compute(value_of(ox), value_of(oy), value_of(dx), value_of(dy))
+
+    def path_walk(self, p, x, y, recompute):
+        return self.get(p).walk(x, y, value_of(recompute))
+
+    def path_get_origin(self, p, x, y):
+        set_out(x, y, *self.get(p).origin)
+
+    def path_get_destination(self, p, x, y):
+        set_out(x, y, *self.get(p).destination)
+
+    def path_size(self, p):
+        return len(self.get(p).steps)
+
+    def path_get(self, p, index, x, y):
+        steps = self.get(p).steps
+        set_out(x, y, *steps[len(steps) - 1 - value_of(index)])
+
+    def path_is_empty(self, p):
+        return not self.get(p).steps
+
+    def path_reverse(self, p):
+        self.get(p).reverse()
+
+    def path_delete(self, p):
+        self.delete(p)
+
+    # Dijkstra maps
+    def dijkstra_new(self, m, dcost):
+        (cmap, cells) = self.get(m)
+        return self.add(Dijkstra(cmap.width, cmap.height, value_of(dcost), cells))
+
+    def dijkstra_new_using_function(self, width, height, func, userdata, dcost):
+        return self.add(Dijkstra(width, height, value_of(dcost), func=func, userdata=userdata))
+
+    def dijkstra_compute(self, d, x, y):
+        self.get(d).compute(value_of(x), value_of(y))
+
+    def dijkstra_get_distance(self, d, x, y):
+        return self.get(d).distance(value_of(x), value_of(y))
+
+    def dijkstra_path_set(self, d, x, y):
+        return self.get(d).path_set(value_of(x), value_of(y))
+
+    def dijkstra_path_walk(self, d, x, y):
+        return self.get(d).walk(x, y, False)
+
+    def dijkstra_size(self, d):
+        return len(self.get(d).steps)
+
+    def dijkstra_get(self, d, index, x, y):
+        steps = self.get(d).steps
+        set_out(x, y, *steps[len(steps) - 1 - value_of(index)])
+
+    def dijkstra_is_empty(self, d):
+        return not self.get(d).steps
+
+    def dijkstra_reverse(self, d):
+        self.get(d).reverse()
+
+    def dijkstra_delete(self, d):
+        self.delete(d)
+
+
+class Path(object):
+    """
+    A* path over a grid. The steps after the origin, up to and including
+    the destination, are kept last step first so walking pops them.
+
+    Steps onto a tile cost 1, or dcost if they are diagonal. A path over
+    a map may only step onto walkable cells; a path with a callback has
+    the step costs multiplied by what it returns, and may not take a step
+    for which it returns 0.
+
+    width, height: size of the grid
+    dcost: cost factor of diagonal steps; 0 forbids them
+    cells: ctypes array of the cells of a map, or None
+    func, userdata: if cells is None, libtcod path callback taking
+    (x from, y from, x to, y to, userdata), and its userdata
+    """
+    def __init__(self, width, height, dcost, cells=None, func=None, userdata=None):
+        self.width = width
+        self.height = height
+        self.dcost = dcost
+        self.cells = cells
+        self.func = func
+        self.userdata = userdata
+        self.walkable = None
+        self.origin = (0, 0)
+        self.destination = (0, 0)
+        self.steps = []
+
+        # Moves as (x step, index step, cost factor)
+        self.moves = [(sx, sy*width + sx, dcost if sx and sy else 1.0)
+                      for (sx, sy) in NEIGHBOURS if dcost or not (sx and sy)]
+
+    def snapshot(self):
+        """Copies the walkable flags of the map, which searches then read."""
+        if self.cells is not None:
+            self.walkable = ctypes.string_at(self.cells, len(self.cells)).translate(WALKABLE_ONLY)
+            self.walkable = bytearray(self.walkable)
+
+    def step_cost(self, x0, y0, x1, y1):
+        """Returns the cost of a step from (x0, y0) to (x1, y1), or 0 if it is not allowed."""
+        if self.cells is not None:
+            return 1.0 if self.cells[y1*self.width + x1] & WALKABLE else 0.0
+        return self.func(x0, y0, x1, y1, self.userdata)
+
+    def neighbours(self, i):
+        """Yields (index, cost) of every tile one allowed step away from tile i."""
+        w = self.width
+        size = w*self.height
+        x = i % w
+        walkable = self.walkable
+
+        for (sx, offset, factor) in self.moves:
+            nx = x + sx
+            ni = i + offset
+            if 0 <= nx < w and 0 <= ni < size:
+                if walkable is not None:
+                    if walkable[ni]:
+                        yield (ni, factor)
+                else:
+                    step = self.func(x, i // w, nx, ni // w, self.userdata)
+                    if step > 0:
+                        yield (ni, step*factor)
+
+    def compute(self, ox, oy, dx, dy):
+        """Finds the shortest path from (ox, oy) to (dx, dy), returning true if there is one."""
+        self.origin = (ox, oy)
+        self.destination = (dx, dy)
+        self.steps = []
+
+        if (ox, oy) == (dx, dy):
+            return True
+
+        diagonal = min(self.dcost, 2.0)
+        w = self.width
+
+        def estimate(i):
+            (ax, ay) = (abs(dx - i % w), abs(dy - i // w))
+            if not diagonal:
+                return ax + ay
+            return abs(ax - ay) + diagonal*min(ax, ay)
+
+        self.snapshot()
+        start = oy*w + ox
+        goal = dy*w + dx
+        best = {start: 0.0}
+        came_from = {}
+        frontier = [(estimate(start), start)]
+
+        while frontier:
+            (priority, i) = heapq.heappop(frontier)
+            if i == goal:
+                break
+            dist = best[i]
+            if priority - estimate(i) > dist:
+                continue
+
+            for (ni, step) in self.neighbours(i):
+                new_dist = dist + step
+                if new_dist < best.get(ni, new_dist + 1):
+                    best[ni] = new_dist
+                    came_from[ni] = i
+                    heapq.heappush(frontier, (new_dist + estimate(ni), ni))
+
+        if goal not in came_from:
+            return False
+
+        i = goal
+        while i != start:
+            self.steps.append((i % w, i // w))
+            i = came_from[i]
+        return True
+
+    def walk(self, x, y, recompute):
+        """
+        Moves the origin to the next step, writing it to the ctypes
+        references x and y. If the step has become blocked, the path is
+        computed again when recompute is true. Returns false if there is
+        no next step to take.
+        """
+        if not self.steps:
+            return False
+
+        (nx, ny) = self.steps[-1]
+        if self.step_cost(self.origin[0], self.origin[1], nx, ny) <= 0:
+            if not (recompute and self.compute(self.origin[0], self.origin[1], *self.destination)):
+                return False
+            if not self.steps:
+                return False
+            (nx, ny) = self.steps[-1]
+
+        self.steps.pop()
+        self.origin = (nx, ny)
+        set_out(x, y, nx, ny)
+        return True
+
+    def reverse(self):
+        """Swaps the origin and the destination, keeping the tiles of the path."""
+        forward = [self.origin] + self.steps[::-1]
+        (self.origin, self.destination) = (self.destination, self.origin)
+        self.steps = forward[:-1]
+
+
+class Dijkstra(Path):
+    """
+    Distances from a root tile to every reachable tile of a grid, and
+    paths from the root to any of them. Steps cost as on A* paths, and
+    the path is kept like an A* path, with the root as its origin.
+    """
+    def __init__(self, width, height, dcost, cells=None, func=None, userdata=None):
+        Path.__init__(self, width, height, dcost, cells, func, userdata)
+        self.distances = {}
+        self.previous = {}
+
+    def compute(self, x, y):
+        """Computes the distance of every tile from the root (x, y)."""
+        w = self.width
+        root = y*w + x
+        self.origin = (x, y)
+        self.steps = []
+        self.distances = {root: 0.0}
+        self.previous = {}
+        self.snapshot()
+        frontier = [(0.0, root)]
+
+        while frontier:
+            (dist, i) = heapq.heappop(frontier)
+            if dist > self.distances[i]:
+                continue
+
+            for (ni, step) in self.neighbours(i):
+                new_dist = dist + step
+                if new_dist < self.distances.get(ni, new_dist + 1):
+                    self.distances[ni] = new_dist
+                    self.previous[ni] = i
+                    heapq.heappush(frontier, (new_dist, ni))
+
+    def distance(self, x, y):
+        """Returns the distance of (x, y) from the root, or -1 if it cannot be reached."""
+        return self.distances.get(y*self.width + x, -1.0)
+
+    def path_set(self, x, y):
+        """Sets the path from the root to (x, y), returning false if there is none."""
+        w = self.width
+        i = y*w + x
+        if i not in self.distances:
+            return False
+
+        self.destination = (x, y)
+        self.steps = []
+        while i in self.previous:
+            self.steps.append((i % w, i // w))
+            i = self.previous[i]
+        return True
+
+
+# Miscellaneous functions
+def colour(components):
+    """Returns a libtcodpy Color with the given red, green and blue."""
+    # libtcodpy loads this module while it is being imported itself
+    import libtcodpy
+    return libtcodpy.Color(*components)
+
+
+def sign(n):
+    """Returns -1, 0 or 1 as n is negative, zero or positive."""
+    return (n > 0) - (n < 0)
+
+
+def value_of(arg):
+    """Returns the Python value of arg, which may be wrapped in a ctypes type."""
+    return getattr(arg, 'value', arg)
+
+
+def set_out(x, y, vx, vy):
+    """Writes vx and vy through x and y, references made by ctypes.byref()."""
+    x._obj.value = vx
+    y._obj.value = vy
+
+
+def shadowcast(flags, width, height, ox, oy, radius=0, light_walls=True):
+    """
+    Adds the FOV flag to every cell visible from (ox, oy), found with
+    symmetric shadowcasting. flags is a bytearray of map flags, one byte
+    per cell, row by row, without FOV flags set. radius limits the view
+    to a circle if positive. Walls are visible only if light_walls is true.
+
+    Slopes are kept as (numerator, denominator) so no floats are needed.
+    """
+    flags[oy*width + ox] |= FOV
+    radius_sq = radius*radius
+    max_depth = radius if radius > 0 else max(width, height)
+
+    for (col_x, row_x, col_y, row_y) in QUADRANTS:
+        # Rows still to scan as (depth, start slope, end slope)
+        rows = [(1, -1, 1, 1, 1)]
+
+        while rows:
+            (depth, start_n, start_d, end_n, end_d) = rows.pop()
+            if depth > max_depth:
+                continue
+
+            # Round depth*start up and depth*end down, ties towards the centre
+            min_col = (2*depth*start_n + start_d) // (2*start_d)
+            max_col = -((end_d - 2*depth*end_n) // (2*end_d))
+            prev_wall = None
+
+            for col in range(min_col, max_col + 1):
+                x = ox + col*col_x + depth*row_x
+                y = oy + col*col_y + depth*row_y
+                inside = 0 <= x < width and 0 <= y < height
+                wall = not inside or not flags[y*width + x] & TRANSPARENT
+
+                if inside and (radius <= 0 or col*col + depth*depth <= radius_sq):
+                    if wall:
+                        if light_walls:
+                            flags[y*width + x] |= FOV
+                    elif col*start_d >= depth*start_n and col*end_d <= depth*end_n:
+                        flags[y*width + x] |= FOV
+
+                if prev_wall and not wall:
+                    (start_n, start_d) = (2*col - 1, 2*depth)
+                elif prev_wall is False and wall:
+                    rows.append((depth + 1, start_n, start_d, 2*col - 1, 2*depth))
+                prev_wall = wall
+
+            if prev_wall is False:
+                rows.append((depth + 1, start_n, start_d, end_n, end_d))
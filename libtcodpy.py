@@ -26,54 +26,85 @@
 #
 
 import sys
+import array
 import ctypes
-import struct
 from ctypes import *
 
 if not hasattr(ctypes, "c_bool"):   # for Python < 2.6
     c_bool = c_uint8
 
-try:  #import NumPy if available
-    import numpy
-    numpy_available = True
-except ImportError:
-    numpy_available = False
+# NumPy is imported the first time it is used rather than here, since
+# importing it takes longer than loading the rest of the game
+def module_available(name):
+    try:
+        import importlib.util
+    except ImportError:   # for Python 2
+        import imp
+        try:
+            imp.find_module(name)
+            return True
+        except ImportError:
+            return False
+    return importlib.util.find_spec(name) is not None
+
+class LazyModule(object):
+    # stands in for the module called name, importing it when one of its
+    # attributes is first looked up
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = __import__(self._name)
+        return getattr(self._module, attr)
+
+numpy_available = module_available("numpy")
+numpy = LazyModule("numpy") if numpy_available else None
 
 LINUX=False
 MAC=False
 MINGW=False
 MSVC=False
-if sys.platform.find('linux') != -1:
-    _lib = ctypes.cdll['./libtcod.so']
-    LINUX=True
-elif sys.platform.find('darwin') != -1:
-    _lib = ctypes.cdll['./libtcod.dylib']
-    MAC = True
-elif sys.platform.find('haiku') != -1:
-    _lib = ctypes.cdll['./libtcod.so']
-    HAIKU = True
-else:
-    try:
-        _lib = ctypes.cdll['./libtcod-mingw.dll']
-        MINGW=True
-    except WindowsError:
-        _lib = ctypes.cdll['./libtcod-VS.dll']
-        MSVC=True
-    # On Windows, ctypes doesn't work well with function returning structs,
-    # so we have to user the _wrapper functions instead
-    _lib.TCOD_color_multiply = _lib.TCOD_color_multiply_wrapper
-    _lib.TCOD_color_add = _lib.TCOD_color_add_wrapper
-    _lib.TCOD_color_multiply_scalar = _lib.TCOD_color_multiply_scalar_wrapper
-    _lib.TCOD_color_subtract = _lib.TCOD_color_subtract_wrapper
-    _lib.TCOD_color_lerp = _lib.TCOD_color_lerp_wrapper
-    _lib.TCOD_console_get_default_background = _lib.TCOD_console_get_default_background_wrapper
-    _lib.TCOD_console_get_default_foreground = _lib.TCOD_console_get_default_foreground_wrapper
-    _lib.TCOD_console_get_char_background = _lib.TCOD_console_get_char_background_wrapper
-    _lib.TCOD_console_get_char_foreground = _lib.TCOD_console_get_char_foreground_wrapper
-    _lib.TCOD_console_get_fading_color = _lib.TCOD_console_get_fading_color_wrapper
-    _lib.TCOD_image_get_pixel = _lib.TCOD_image_get_pixel_wrapper
-    _lib.TCOD_image_get_mipmap_pixel = _lib.TCOD_image_get_mipmap_pixel_wrapper
-    _lib.TCOD_parser_get_color_property = _lib.TCOD_parser_get_color_property_wrapper
+FALLBACK=False
+try:
+    if sys.platform.find('linux') != -1:
+        _lib = ctypes.cdll['./libtcod.so']
+        LINUX=True
+    elif sys.platform.find('darwin') != -1:
+        _lib = ctypes.cdll['./libtcod.dylib']
+        MAC = True
+    elif sys.platform.find('haiku') != -1:
+        _lib = ctypes.cdll['./libtcod.so']
+        HAIKU = True
+    else:
+        try:
+            _lib = ctypes.cdll['./libtcod-mingw.dll']
+            MINGW=True
+        except WindowsError:
+            _lib = ctypes.cdll['./libtcod-VS.dll']
+            MSVC=True
+        # On Windows, ctypes doesn't work well with function returning structs,
+        # so we have to user the _wrapper functions instead
+        _lib.TCOD_color_multiply = _lib.TCOD_color_multiply_wrapper
+        _lib.TCOD_color_add = _lib.TCOD_color_add_wrapper
+        _lib.TCOD_color_multiply_scalar = _lib.TCOD_color_multiply_scalar_wrapper
+        _lib.TCOD_color_subtract = _lib.TCOD_color_subtract_wrapper
+        _lib.TCOD_color_lerp = _lib.TCOD_color_lerp_wrapper
+        _lib.TCOD_console_get_default_background = _lib.TCOD_console_get_default_background_wrapper
+        _lib.TCOD_console_get_default_foreground = _lib.TCOD_console_get_default_foreground_wrapper
+        _lib.TCOD_console_get_char_background = _lib.TCOD_console_get_char_background_wrapper
+        _lib.TCOD_console_get_char_foreground = _lib.TCOD_console_get_char_foreground_wrapper
+        _lib.TCOD_console_get_fading_color = _lib.TCOD_console_get_fading_color_wrapper
+        _lib.TCOD_image_get_pixel = _lib.TCOD_image_get_pixel_wrapper
+        _lib.TCOD_image_get_mipmap_pixel = _lib.TCOD_image_get_mipmap_pixel_wrapper
+        _lib.TCOD_parser_get_color_property = _lib.TCOD_parser_get_color_property_wrapper
+except OSError:
+    # without the native library, maps, FOV and pathfinding still work
+    # through a Python stand-in, which is enough to run headless
+    import libtcodfallback
+    _lib = libtcodfallback.Library()
+    FALLBACK=True
 
 HEXVERSION = 0x010501
 STRVERSION = "1.5.1"
@@ -464,8 +495,6 @@ class ConsoleBuffer:
             console_get_height(dest) != self.height):
             raise ValueError('ConsoleBuffer.blit: Destination console has an incorrect size.')
 
-        s = struct.Struct('%di' % len(self.back_r))
-
         if fill_back:
             _lib.TCOD_console_fill_background(dest, (c_int * len(self.back_r))(*self.back_r), (c_int * len(self.back_g))(*self.back_g), (c_int * len(self.back_b))(*self.back_b))
 
@@ -473,6 +502,104 @@ class ConsoleBuffer:
             _lib.TCOD_console_fill_foreground(dest, (c_int * len(self.fore_r))(*self.fore_r), (c_int * len(self.fore_g))(*self.fore_g), (c_int * len(self.fore_b))(*self.fore_b))
             _lib.TCOD_console_fill_char(dest, (c_int * len(self.char))(*self.char))
 
+class ArrayConsoleBuffer(ConsoleBuffer):
+    # ConsoleBuffer whose cells are kept in contiguous C int buffers: numpy
+    # arrays when numpy is available, array('i') otherwise. cells are stored
+    # row by row. fill() and fill_mask() write whole regions at once, and
+    # blit() hands the buffers to the fill functions without converting
+    # them, so a full console can be composed in Python and pushed in a few
+    # calls.
+    FIELDS = ('back_r', 'back_g', 'back_b', 'fore_r', 'fore_g', 'fore_b', 'char')
+
+    def clear(self, back_r=0, back_g=0, back_b=0, fore_r=0, fore_g=0, fore_b=0, char=' '):
+        # clears the console. values to fill it with are optional, defaults
+        # to black with no characters.
+        n = self.width * self.height
+        values = (back_r, back_g, back_b, fore_r, fore_g, fore_b, ord(char))
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, _int_buffer(n, value))
+
+    def copy(self):
+        # returns a copy of this ArrayConsoleBuffer.
+        other = ArrayConsoleBuffer(0, 0)
+        other.width = self.width
+        other.height = self.height
+        for name in self.FIELDS:
+            buf = getattr(self, name)
+            setattr(other, name, buf.copy() if numpy_available else array.array('i', buf))
+        return other
+
+    def fill(self, x, y, w, h, back=None, fore=None, char=None):
+        # sets the background color, foreground color and/or character of
+        # every cell in the w*h rectangle at (x, y), clipped to the buffer.
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.width), min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        for name, value in self._values(back, fore, char):
+            buf = getattr(self, name)
+            if numpy_available:
+                buf.reshape(self.height, self.width)[y0:y1, x0:x1] = value
+            else:
+                row = array.array('i', [value]) * (x1 - x0)
+                for j in range(y0, y1):
+                    buf[j * self.width + x0:j * self.width + x1] = row
+
+    def fill_mask(self, mask, back=None, fore=None, char=None):
+        # sets the background color, foreground color and/or character of
+        # every cell where mask is true. mask holds one value per cell, row
+        # by row; with numpy it may also be a height*width array.
+        if numpy_available:
+            mask = numpy.asarray(mask, dtype=bool).reshape(-1)
+            for name, value in self._values(back, fore, char):
+                getattr(self, name)[mask] = value
+            return
+
+        cells = [i for i in range(self.width * self.height) if mask[i]]
+        for name, value in self._values(back, fore, char):
+            buf = getattr(self, name)
+            for i in cells:
+                buf[i] = value
+
+    def _values(self, back, fore, char):
+        # returns (field, value) pairs for the colors and character given.
+        values = []
+        if back is not None:
+            values.extend(zip(('back_r', 'back_g', 'back_b'), back))
+        if fore is not None:
+            values.extend(zip(('fore_r', 'fore_g', 'fore_b'), fore))
+        if char is not None:
+            values.append(('char', ord(char) if isinstance(char, str) else char))
+        return values
+
+    def blit(self, dest, fill_fore=True, fill_back=True):
+        # use libtcod's "fill" functions to write the buffer to a console.
+        if (console_get_width(dest) != self.width or
+            console_get_height(dest) != self.height):
+            raise ValueError('ArrayConsoleBuffer.blit: Destination console has an incorrect size.')
+
+        if fill_back:
+            _lib.TCOD_console_fill_background(dest, _int_pointer(self.back_r), _int_pointer(self.back_g), _int_pointer(self.back_b))
+
+        if fill_fore:
+            _lib.TCOD_console_fill_foreground(dest, _int_pointer(self.fore_r), _int_pointer(self.fore_g), _int_pointer(self.fore_b))
+            _lib.TCOD_console_fill_char(dest, _int_pointer(self.char))
+
+def _int_buffer(n, value):
+    # returns a contiguous buffer of n C ints set to value.
+    if numpy_available:
+        buf = numpy.empty(n, dtype=numpy.intc)
+        buf.fill(value)
+        return buf
+    return array.array('i', [value]) * n
+
+def _int_pointer(buf):
+    # returns a ctypes view of a buffer made by _int_buffer(), sharing its memory.
+    if numpy_available:
+        return buf.ctypes.data_as(POINTER(c_int))
+    return (c_int * len(buf)).from_buffer(buf)
+
 _lib.TCOD_console_credits_render.restype = c_bool
 _lib.TCOD_console_is_fullscreen.restype = c_bool
 _lib.TCOD_console_is_window_closed.restype = c_bool
@@ -907,59 +1034,65 @@ def console_delete(con):
     _lib.TCOD_console_delete(con)
 
 # fast color filling
+# the fill functions take one C int per cell, row by row. numpy arrays of
+# a matching int type, array('i') and other writable buffers of C ints are
+# passed to libtcod without copying; numpy arrays may also have the shape
+# (height, width) of the console. other sequences are converted.
 def console_fill_foreground(con,r,g,b) :
-    if len(r) != len(g) or len(r) != len(b):
-        raise TypeError('R, G and B must all have the same size.')
-
-    if (numpy_available and isinstance(r, numpy.ndarray) and
-        isinstance(g, numpy.ndarray) and isinstance(b, numpy.ndarray)):
-        #numpy arrays, use numpy's ctypes functions
-        r = numpy.ascontiguousarray(r, dtype=numpy.int_)
-        g = numpy.ascontiguousarray(g, dtype=numpy.int_)
-        b = numpy.ascontiguousarray(b, dtype=numpy.int_)
-        cr = r.ctypes.data_as(POINTER(c_int))
-        cg = g.ctypes.data_as(POINTER(c_int))
-        cb = b.ctypes.data_as(POINTER(c_int))
-    else:
-        # otherwise convert using ctypes arrays
-        cr = (c_int * len(r))(*r)
-        cg = (c_int * len(g))(*g)
-        cb = (c_int * len(b))(*b)
-
-    _lib.TCOD_console_fill_foreground(con, cr, cg, cb)
+    n = console_get_width(con) * console_get_height(con)
+    _lib.TCOD_console_fill_foreground(con, _cell_array(con, r, n), _cell_array(con, g, n), _cell_array(con, b, n))
 
 def console_fill_background(con,r,g,b) :
-    if len(r) != len(g) or len(r) != len(b):
-        raise TypeError('R, G and B must all have the same size.')
-
-    if (numpy_available and isinstance(r, numpy.ndarray) and
-        isinstance(g, numpy.ndarray) and isinstance(b, numpy.ndarray)):
-        #numpy arrays, use numpy's ctypes functions
-        r = numpy.ascontiguousarray(r, dtype=numpy.int_)
-        g = numpy.ascontiguousarray(g, dtype=numpy.int_)
-        b = numpy.ascontiguousarray(b, dtype=numpy.int_)
-        cr = r.ctypes.data_as(POINTER(c_int))
-        cg = g.ctypes.data_as(POINTER(c_int))
-        cb = b.ctypes.data_as(POINTER(c_int))
-    else:
-        # otherwise convert using ctypes arrays
-        cr = (c_int * len(r))(*r)
-        cg = (c_int * len(g))(*g)
-        cb = (c_int * len(b))(*b)
-
-    _lib.TCOD_console_fill_background(con, cr, cg, cb)
+    n = console_get_width(con) * console_get_height(con)
+    _lib.TCOD_console_fill_background(con, _cell_array(con, r, n), _cell_array(con, g, n), _cell_array(con, b, n))
 
 def console_fill_char(con,arr) :
-    if (numpy_available and isinstance(arr, numpy.ndarray) ):
-        #numpy arrays, use numpy's ctypes functions
-        arr = numpy.ascontiguousarray(arr, dtype=numpy.int_)
-        carr = arr.ctypes.data_as(POINTER(c_int))
-    else:
-        #otherwise convert using the struct module
-        carr = struct.pack('%di' % len(arr), *arr)
+    n = console_get_width(con) * console_get_height(con)
+    _lib.TCOD_console_fill_char(con, _cell_array(con, arr, n))
+
+def _cell_array(con, arr, n):
+    # returns arr as something ctypes passes as a pointer to n C ints,
+    # sharing memory with arr where its type allows it.
+    if numpy_available and isinstance(arr, numpy.ndarray):
+        if arr.dtype.kind not in 'iub':
+            raise TypeError('fill arrays must hold integers, not %s' % arr.dtype)
+        if arr.ndim == 2 and arr.shape != (console_get_height(con), console_get_width(con)):
+            raise ValueError('fill array has shape %s, console is %dx%d' % (arr.shape, console_get_width(con), console_get_height(con)))
+        if arr.size != n:
+            raise ValueError('fill array has %d cells, console has %d' % (arr.size, n))
+        # only copies if the array is not already contiguous C ints
+        return numpy.ascontiguousarray(arr, dtype=numpy.intc).ctypes.data_as(POINTER(c_int))
+
+    if isinstance(arr, array.array):
+        if arr.itemsize != sizeof(c_int) or arr.typecode not in 'il':
+            raise TypeError("fill arrays must hold C ints, not array('%s')" % arr.typecode)
+        if len(arr) != n:
+            raise ValueError('fill array has %d cells, console has %d' % (len(arr), n))
+        return (c_int * n).from_buffer(arr)
+
+    try:
+        view = memoryview(arr)
+    except TypeError:
+        view = None
+
+    if view is not None and not isinstance(arr, (bytes, bytearray)):
+        if view.itemsize != sizeof(c_int) or view.format.lstrip('@=<') not in ('i', 'l'):
+            raise TypeError("fill buffers must hold C ints, not format '%s'" % view.format)
+        cells = 1
+        for size in view.shape:
+            cells *= size
+        if cells != n:
+            raise ValueError('fill buffer has %d cells, console has %d' % (cells, n))
+        if not getattr(view, 'c_contiguous', True):
+            raise ValueError('fill buffers must be contiguous')
+        if view.readonly:
+            return (c_int * n).from_buffer_copy(view)
+        return (c_int * n).from_buffer(view)
+
+    if len(arr) != n:
+        raise ValueError('fill sequence has %d cells, console has %d' % (len(arr), n))
+    return (c_int * n)(*arr)
 
-    _lib.TCOD_console_fill_char(con, carr)
-        
 def console_load_asc(con, filename) :
     _lib.TCOD_console_load_asc(con,filename)
 def console_save_asc(con, filename) :
@@ -1079,6 +1212,55 @@ def line_iter(xo, yo, xd, yd):
         yield x.value, y.value
         done = _lib.TCOD_line_step_mt(byref(x), byref(y), data)
 
+def line_of_sight(xo, yo, xd, yd, opaque, width):
+    # batch line of sight for many pairs of cells at once. returns, for
+    # each i, whether no cell strictly between (xo[i], yo[i]) and
+    # (xd[i], yd[i]) on the line that line_iter walks is opaque. opaque
+    # holds one byte or number per cell, row by row, width cells a row,
+    # nonzero for cells that block sight. the coordinates may be numpy
+    # arrays or sequences. returns a numpy bool array, or a list of bools
+    # when numpy is not available.
+    if not numpy_available:
+        if isinstance(opaque, bytes):
+            opaque = bytearray(opaque)
+        return [_line_clear(*pair, opaque=opaque, width=width) for pair in zip(xo, yo, xd, yd)]
+    xo, yo, xd, yd = [numpy.asarray(a, dtype=numpy.intc).reshape(-1) for a in (xo, yo, xd, yd)]
+    if isinstance(opaque, (bytes, bytearray, memoryview)):
+        opaque = numpy.frombuffer(opaque, dtype=numpy.uint8)
+    opaque = numpy.asarray(opaque).reshape(-1)
+    if not len(xo):
+        return numpy.zeros(0, dtype=bool)
+    dx, dy = xd - xo, yd - yo
+    adx, ady = numpy.abs(dx), numpy.abs(dy)
+    xmajor = (adx > ady)[:, None]
+    major = numpy.maximum(adx, ady)[:, None]
+    minor = numpy.minimum(adx, ady)[:, None]
+    # one column per step along the major axis, skipping both ends
+    k = numpy.arange(1, max(int(major.max()), 1), dtype=numpy.intc)[None, :]
+    between = k < major
+    # bresenham's minor offset after k steps, in closed form
+    m = -((major - 2*k*minor) // numpy.maximum(2*major, 1))
+    x = xo[:, None] + numpy.sign(dx)[:, None] * numpy.where(xmajor, k, m)
+    y = yo[:, None] + numpy.sign(dy)[:, None] * numpy.where(xmajor, m, k)
+    cells = numpy.where(between, y*width + x, 0)
+    return ~((opaque[cells] != 0) & between).any(axis=1)
+
+def _line_clear(xo, yo, xd, yd, opaque, width):
+    # line_of_sight for a single pair, without numpy
+    dx, dy = xd - xo, yd - yo
+    sx, sy = (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+    major, minor = max(abs(dx), abs(dy)), min(abs(dx), abs(dy))
+    xmajor = abs(dx) > abs(dy)
+    for k in range(1, major):
+        m = -((major - 2*k*minor) // (2*major))
+        if xmajor:
+            cell = (yo + sy*m)*width + xo + sx*k
+        else:
+            cell = (yo + sy*k)*width + xo + sx*m
+        if opaque[cell]:
+            return False
+    return True
+
 ############################
 # image module
 ############################
@@ -1517,7 +1699,7 @@ def map_copy(source, dest):
     return _lib.TCOD_map_copy(source, dest)
 
 def map_set_properties(m, x, y, isTrans, isWalk):
-    _lib.TCOD_map_set_properties(m, x, y, c_int(isTrans), c_int(isWalk))
+    _lib.TCOD_map_set_properties(m, x, y, c_bool(isTrans), c_bool(isWalk))
 
 def map_clear(m,walkable=False,transparent=False):
     _lib.TCOD_map_clear(m,c_int(walkable),c_int(transparent))
@@ -1543,6 +1725,78 @@ def map_get_width(map):
 def map_get_height(map):
     return _lib.TCOD_map_get_height(map)
 
+# bulk access to the flags of every cell. libtcod keeps a map as a map_t
+# whose cells are one byte each, row by row, with the flags as bit fields.
+MAP_TRANSPARENT = 1
+MAP_WALKABLE = 2
+MAP_FOV = 4
+
+class _CMap(Structure):
+    _fields_ = [('width', c_int),
+                ('height', c_int),
+                ('nbcells', c_int),
+                ('cells', POINTER(c_uint8)),
+                ]
+
+# translate tables turning a cell byte into 0 or 1 for each flag
+_MAP_FLAG_TABLES = dict((flag, bytes(bytearray(1 if i & flag else 0 for i in range(256))))
+                        for flag in (MAP_TRANSPARENT, MAP_WALKABLE, MAP_FOV))
+
+def _map_cells(m):
+    # the cells of map m as a ctypes array sharing memory with libtcod
+    cmap = cast(c_void_p(m), POINTER(_CMap)).contents
+    return cast(cmap.cells, POINTER(c_uint8 * cmap.nbcells)).contents
+
+def map_get_flags(m, flag, out=None):
+    # copies flag (MAP_TRANSPARENT, MAP_WALKABLE or MAP_FOV) of every cell
+    # to out as 0 or 1, one byte per cell, row by row. out may be a writable
+    # buffer of width*height bytes or a numpy array of that size; if it is
+    # None, a new height*width numpy array or bytearray is returned.
+    cells = _map_cells(m)
+    n = len(cells)
+    if out is None:
+        out = numpy.empty((map_get_height(m), map_get_width(m)), dtype=numpy.uint8) if numpy_available else bytearray(n)
+    if numpy_available and isinstance(out, numpy.ndarray):
+        if out.size != n:
+            raise ValueError('flag array has %d cells, map has %d' % (out.size, n))
+        out[...] = ((numpy.ctypeslib.as_array(cells) & flag) != 0).reshape(out.shape)
+        return out
+    if len(out) != n:
+        raise ValueError('flag buffer has %d cells, map has %d' % (len(out), n))
+    flags = string_at(addressof(cells), n).translate(_MAP_FLAG_TABLES[flag])
+    if numpy_available:
+        numpy.frombuffer(out, dtype=numpy.uint8)[:] = numpy.frombuffer(flags, dtype=numpy.uint8)
+    else:
+        out[:] = flags
+    return out
+
+def map_set_flags(m, flag, values):
+    # sets flag (MAP_TRANSPARENT, MAP_WALKABLE or MAP_FOV) of every cell
+    # from values, one truthy or falsy item per cell, row by row. values may
+    # be a bytearray or other buffer of bytes, a numpy array or a sequence.
+    cells = _map_cells(m)
+    n = len(cells)
+    if numpy_available:
+        if isinstance(values, (bytes, bytearray, memoryview)):
+            values = numpy.frombuffer(values, dtype=numpy.uint8)
+        values = numpy.asarray(values).reshape(-1)
+        if values.size != n:
+            raise ValueError('flag array has %d cells, map has %d' % (values.size, n))
+        raw = numpy.ctypeslib.as_array(cells)
+        raw[:] = numpy.where(values != 0, raw | flag, raw & (0xff ^ flag))
+        return
+    if not isinstance(values, bytearray):
+        values = bytearray(values)
+    if len(values) != n:
+        raise ValueError('flag buffer has %d cells, map has %d' % (len(values), n))
+    raw = bytearray(string_at(addressof(cells), n))
+    for i in range(n):
+        if values[i]:
+            raw[i] |= flag
+        else:
+            raw[i] &= 0xff ^ flag
+    memmove(cells, bytes(raw), n)
+
 ############################
 # pathfinding module
 ############################
@@ -1593,7 +1847,7 @@ def path_is_empty(p):
 def path_walk(p, recompute):
     x = c_int()
     y = c_int()
-    if _lib.TCOD_path_walk(p[0], byref(x), byref(y), c_int(recompute)):
+    if _lib.TCOD_path_walk(p[0], byref(x), byref(y), c_bool(recompute)):
         return x.value, y.value
     return None,None
 
@@ -1610,7 +1864,7 @@ def dijkstra_new(m, dcost=1.41):
 
 def dijkstra_new_using_function(w, h, func, userdata=0, dcost=1.41):
     cbk_func = PATH_CBK_FUNC(func)
-    return (_lib.TCOD_path_dijkstra_using_function(w, h, cbk_func,
+    return (_lib.TCOD_dijkstra_new_using_function(w, h, cbk_func,
             py_object(userdata), c_float(dcost)), cbk_func)
 
 def dijkstra_compute(p, ox, oy):
@@ -1928,6 +2182,27 @@ def heightmap_get_minmax(hm):
 def heightmap_delete(hm):
     _lib.TCOD_heightmap_delete(hm.p)
 
+# bulk access to the values of a heightmap, which libtcod keeps as
+# width*height floats, row by row.
+def heightmap_get_values(hm):
+    # the values of hm without copying: a height*width numpy array of
+    # float32, or a ctypes array of width*height floats without numpy.
+    # writing to it changes the heightmap.
+    chm = hm.p.contents
+    if numpy_available:
+        return numpy.ctypeslib.as_array(chm.values, shape=(chm.h, chm.w))
+    return cast(chm.values, POINTER(c_float * (chm.w * chm.h))).contents
+
+def heightmap_threshold(hm, mi, ma):
+    # returns 1 for every cell whose value is between mi and ma, both
+    # included, and 0 for the others, row by row: a height*width numpy
+    # array of uint8, or a bytearray without numpy.
+    values = heightmap_get_values(hm)
+    if numpy_available:
+        return ((values >= mi) & (values <= ma)).view(numpy.uint8)
+    values = array.array('f', string_at(values, sizeof(values)))
+    return bytearray(1 if mi <= v <= ma else 0 for v in values)
+
 
 ############################
 # name generator module
@@ -1955,3 +2230,80 @@ def namegen_destroy() :
     _lib.TCOD_namegen_destroy()
 
 
+
+############################
+# hot calls
+############################
+# signatures of the functions called every frame or for every cell, as
+# C name: (restype, argtypes). the return types are always declared. ctypes
+# converts declared arguments through their types on every call, which
+# makes calls about twice as slow as passing plain ints and Colors, so
+# argument types are only declared by check_arguments(True), to catch
+# bad arguments while debugging.
+_HOT_SIGNATURES = {
+    'TCOD_console_flush': (None, []),
+    'TCOD_console_put_char': (None, [c_void_p, c_int, c_int, c_int, c_int]),
+    'TCOD_console_put_char_ex': (None, [c_void_p, c_int, c_int, c_int, Color, Color]),
+    'TCOD_console_set_char': (None, [c_void_p, c_int, c_int, c_int]),
+    'TCOD_console_set_char_background': (None, [c_void_p, c_int, c_int, Color, c_int]),
+    'TCOD_console_set_char_foreground': (None, [c_void_p, c_int, c_int, Color]),
+    'TCOD_console_set_default_background': (None, [c_void_p, Color]),
+    'TCOD_console_set_default_foreground': (None, [c_void_p, Color]),
+    'TCOD_console_print': (None, [c_void_p, c_int, c_int, c_char_p]),
+    'TCOD_console_print_utf': (None, [c_void_p, c_int, c_int, c_wchar_p]),
+    'TCOD_console_print_ex': (None, [c_void_p, c_int, c_int, c_int, c_int, c_char_p]),
+    'TCOD_console_print_ex_utf': (None, [c_void_p, c_int, c_int, c_int, c_int, c_wchar_p]),
+    'TCOD_console_blit': (None, [c_void_p, c_int, c_int, c_int, c_int, c_void_p, c_int, c_int, c_float, c_float]),
+    'TCOD_map_is_in_fov': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_map_is_transparent': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_map_is_walkable': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_map_set_properties': (None, [c_void_p, c_int, c_int, c_bool, c_bool]),
+    'TCOD_map_compute_fov': (None, [c_void_p, c_int, c_int, c_int, c_bool, c_int]),
+    'TCOD_path_compute': (c_bool, [c_void_p, c_int, c_int, c_int, c_int]),
+    'TCOD_path_walk': (c_bool, [c_void_p, POINTER(c_int), POINTER(c_int), c_bool]),
+    'TCOD_path_size': (c_int, [c_void_p]),
+    'TCOD_path_get': (None, [c_void_p, c_int, POINTER(c_int), POINTER(c_int)]),
+    'TCOD_dijkstra_compute': (None, [c_void_p, c_int, c_int]),
+    'TCOD_dijkstra_path_set': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_dijkstra_path_walk': (c_bool, [c_void_p, POINTER(c_int), POINTER(c_int)]),
+    'TCOD_dijkstra_get_distance': (c_float, [c_void_p, c_int, c_int]),
+    'TCOD_random_get_int': (c_int, [c_void_p, c_int, c_int]),
+    'TCOD_random_get_float': (c_float, [c_void_p, c_float, c_float]),
+}
+
+# fast aliases: the C functions themselves, without the wrappers above.
+# arguments must already be what C expects: character codes instead of
+# strings, Colors, and the handles inside path and dijkstra tuples.
+# floats are left out, as they need c_float unless arguments are checked.
+# bind_fast() rebinds them, and must be called whenever _lib is replaced.
+_FAST_ALIASES = {
+    'console_flush_fast': 'TCOD_console_flush',
+    'console_put_char_fast': 'TCOD_console_put_char',
+    'console_put_char_ex_fast': 'TCOD_console_put_char_ex',
+    'console_set_char_fast': 'TCOD_console_set_char',
+    'console_set_char_background_fast': 'TCOD_console_set_char_background',
+    'console_set_char_foreground_fast': 'TCOD_console_set_char_foreground',
+    'console_set_default_background_fast': 'TCOD_console_set_default_background',
+    'console_set_default_foreground_fast': 'TCOD_console_set_default_foreground',
+    'map_is_in_fov_fast': 'TCOD_map_is_in_fov',
+    'map_is_transparent_fast': 'TCOD_map_is_transparent',
+    'map_is_walkable_fast': 'TCOD_map_is_walkable',
+    'path_compute_fast': 'TCOD_path_compute',
+    'path_walk_fast': 'TCOD_path_walk',
+    'dijkstra_path_walk_fast': 'TCOD_dijkstra_path_walk',
+    'random_get_int_fast': 'TCOD_random_get_int',
+}
+
+def bind_fast():
+    g = globals()
+    for alias, name in _FAST_ALIASES.items():
+        g[alias] = getattr(_lib, name)
+
+def check_arguments(check):
+    # declares (or forgets) the argument types of the hot calls
+    for name, (restype, argtypes) in _HOT_SIGNATURES.items():
+        getattr(_lib, name).argtypes = argtypes if check else None
+
+for _name, (_restype, _argtypes) in _HOT_SIGNATURES.items():
+    getattr(_lib, _name).restype = _restype
+bind_fast()
@@ -5,8 +5,44 @@
 # Based on Jotaf's Complete Roguelike Tutorial
 ##############################################
 
+import timeit
+LAUNCHED = timeit.default_timer()
+
+import argparse
+import libtcodpy as libt
+import config
+import perf
 import state
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BOGEY")
+    parser.add_argument("--skip-credits", action="store_true",
+                        help="go straight to the main menu")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time spent in each phase of startup")
+    parser.add_argument("--trace-calls", metavar="CSV",
+                        help="time every libtcod call and write the totals to CSV on exit")
+    args = parser.parse_args()
+
+    if args.skip_credits:
+        config.SHOW_CREDITS = False
+
+    startup = None
+    if args.profile_startup:
+        startup = perf.StartupProfile(LAUNCHED)
+        startup.lap('imports')
+
+    tracer = None
+    if args.trace_calls:
+        tracer = perf.CallTracer(libt._lib)
+        tracer.install()
+
     game = state.StateHandler()
-    game.init_program()
+    try:
+        game.init_program(startup)
+    finally:
+        # Kept even if the game stops with an error
+        if tracer:
+            tracer.uninstall()
+            tracer.write_csv(args.trace_calls)
+            print("\n".join(tracer.report()))
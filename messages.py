@@ -0,0 +1,114 @@
+#
+# messages.py
+# Storage for the message log
+#
+
+import array
+import collections
+import tempfile
+import textwrap
+import backends
+import config
+
+
+class MessageHistory(object):
+    """
+    Append-only record of every message added during a game.
+
+    The most recent entries are kept in memory. If spill is true, entries
+    older than the live limit are moved to a temporary file and read back
+    only when requested, so the full history never has to stay in memory.
+
+    spill: true if old entries should be written to disk
+    live_limit: number of entries kept in memory when spilling
+    """
+    def __init__(self, spill=config.MSG_HISTORY_SPILL,
+                 live_limit=config.MSG_HISTORY_LIVE):
+        self.spill = spill
+        self.live_limit = live_limit
+
+        # In-memory entries, the first one has index live_start
+        self.live_text = collections.deque()
+        self.live_colours = collections.deque()
+        self.live_start = 0
+
+        # Offsets of spilled entries in the spill file
+        self.spill_file = None
+        self.spill_offsets = array.array('l')
+
+        # Wrapped lines keyed by (index, width)
+        self.wrap_cache = collections.OrderedDict()
+
+    def __len__(self):
+        return self.live_start + len(self.live_text)
+
+    def append(self, msg, colour):
+        """Adds a message to the end of the history and returns its index."""
+        self.live_text.append(msg)
+        self.live_colours.append(backends.pack_colour(colour))
+
+        if self.spill and len(self.live_text) > self.live_limit:
+            self.spill_oldest()
+
+        return len(self) - 1
+
+    def spill_oldest(self):
+        """Moves the oldest in-memory entry to the spill file."""
+        if not self.spill_file:
+            self.spill_file = tempfile.TemporaryFile()
+
+        msg = self.live_text.popleft()
+        colour = self.live_colours.popleft()
+
+        self.spill_file.seek(0, 2)
+        self.spill_offsets.append(self.spill_file.tell())
+        self.spill_file.write("{}\t{}\n".format(colour, msg).encode("utf-8"))
+        self.live_start += 1
+
+    def read_spilled(self, index):
+        """Reads the entry with given index back from the spill file."""
+        self.spill_file.seek(self.spill_offsets[index])
+        line = self.spill_file.readline().decode("utf-8").rstrip("\n")
+        (colour, msg) = line.split("\t", 1)
+        return msg, int(colour)
+
+    def get(self, index):
+        """
+        Returns the (message, colour) pair with given index.
+        Requires that 0 <= index < len(self).
+        """
+        assert 0 <= index < len(self)
+
+        if index >= self.live_start:
+            i = index - self.live_start
+            return self.live_text[i], backends.unpack_colour(self.live_colours[i])
+
+        (msg, colour) = self.read_spilled(index)
+        return msg, backends.unpack_colour(colour)
+
+    def entries(self, start=0):
+        """Yields every (message, colour) pair from index start onwards."""
+        for i in range(start, len(self)):
+            yield self.get(i)
+
+    def wrapped(self, index, width):
+        """Returns the message with given index wrapped to width."""
+        key = (index, width)
+
+        if key in self.wrap_cache:
+            return self.wrap_cache[key]
+
+        (msg, colour) = self.get(index)
+        lines = [(line, colour) for line in textwrap.wrap(msg, width)]
+
+        if len(self.wrap_cache) >= config.MSG_WRAP_CACHE:
+            self.wrap_cache.popitem(False)
+        self.wrap_cache[key] = lines
+
+        return lines
+
+    def close(self):
+        """Discards the spill file, if any."""
+        if self.spill_file:
+            self.spill_file.close()
+            self.spill_file = None
@@ -0,0 +1,300 @@
+#
+# perf.py
+# Frame timing for the performance HUD, startup timing and call tracing
+#
+
+import collections
+import csv
+import sys
+import timeit
+import libtcodpy as libt
+import backends
+import config
+
+# Phases of a frame, in the order they are shown
+PHASES = ['input', 'fov', 'terrain', 'entities', 'gui', 'blit', 'ai']
+
+
+class CallCounter(object):
+    """
+    Stands in for libtcodpy's function table while installed and
+    counts every call made through it.
+
+    lib: the function table being wrapped
+    """
+    def __init__(self, lib):
+        self.lib = lib
+        self.calls = 0
+
+    def __getattr__(self, name):
+        func = getattr(self.lib, name)
+
+        if not callable(func):
+            return func
+
+        def counted(*args):
+            self.calls += 1
+            return func(*args)
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, counted)
+        return counted
+
+    def install(self):
+        """Routes libtcodpy calls through the counter."""
+        libt._lib = self
+        rebind()
+
+    def uninstall(self):
+        """Restores the original function table."""
+        libt._lib = self.lib
+        rebind()
+
+
+class CallTracer(object):
+    """
+    Stands in for libtcodpy's function table while installed and times
+    every call made through it. Calls are totalled per function, per
+    calling module and per frame, a frame ending at each console flush
+    or end_frame(). Nothing is traced while it is not installed.
+
+    lib: the function table being wrapped
+    """
+    def __init__(self, lib):
+        self.lib = lib
+        self.functions = collections.defaultdict(lambda: [0, 0.0])
+        self.callers = collections.defaultdict(lambda: [0, 0.0])
+        self.frames = []
+        self.frame_calls = 0
+        self.frame_time = 0.0
+
+    def __getattr__(self, name):
+        func = getattr(self.lib, name)
+
+        if not callable(func):
+            return func
+
+        timer = timeit.default_timer
+        function = self.functions[name]
+        flush = name == 'TCOD_console_flush'
+
+        def traced(*args):
+            start = timer()
+            try:
+                return func(*args)
+            finally:
+                elapsed = timer() - start
+                function[0] += 1
+                function[1] += elapsed
+                self.frame_calls += 1
+                self.frame_time += elapsed
+
+                caller = self.callers[(caller_module(sys._getframe(1)), name)]
+                caller[0] += 1
+                caller[1] += elapsed
+
+                if flush:
+                    self.end_frame()
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, traced)
+        return traced
+
+    def install(self):
+        """Routes libtcodpy calls through the tracer."""
+        libt._lib = self
+        rebind()
+
+    def uninstall(self):
+        """Restores the original function table."""
+        libt._lib = self.lib
+        rebind()
+
+    def end_frame(self):
+        """Stores the calls and time of the current frame and starts a new one."""
+        self.frames.append((self.frame_calls, self.frame_time))
+        self.frame_calls = 0
+        self.frame_time = 0.0
+
+    def report(self, limit=20):
+        """
+        Returns the lines of a table of the limit functions taking the
+        most time, the time spent per calling module and the calls and
+        time per frame.
+        """
+        lines = ["{:<36}{:>10}{:>12}{:>10}".format("function", "calls", "total ms", "us/call")]
+        ranked = sorted(self.functions.items(), key=lambda item: -item[1][1])
+
+        for (name, (calls, elapsed)) in ranked[:limit]:
+            if calls:
+                lines.append("{:<36}{:>10}{:>12.2f}{:>10.2f}".format(
+                    name, calls, elapsed*1000, elapsed*1e6/calls))
+
+        modules = collections.defaultdict(lambda: [0, 0.0])
+        for ((module, name), (calls, elapsed)) in self.callers.items():
+            modules[module][0] += calls
+            modules[module][1] += elapsed
+
+        lines.append("")
+        lines.append("{:<36}{:>10}{:>12}".format("caller", "calls", "total ms"))
+        for (module, (calls, elapsed)) in sorted(modules.items(), key=lambda item: -item[1][1]):
+            lines.append("{:<36}{:>10}{:>12.2f}".format(module, calls, elapsed*1000))
+
+        calls = [frame[0] for frame in self.frames]
+        times = [frame[1] for frame in self.frames]
+        lines.append("")
+        lines.append("{:<36}{:>10}{:>12}".format("per frame", "avg", "p95"))
+        lines.append("{:<36}{:>10.1f}{:>12}".format("calls", mean(calls), percentile(calls, 0.95)))
+        lines.append("{:<36}{:>10.3f}{:>12.3f}".format(
+            "ms", mean(times)*1000, percentile(times, 0.95)*1000))
+        lines.append("{:<36}{:>10}".format("frames", len(self.frames)))
+        return lines
+
+    def write_csv(self, path):
+        """
+        Writes every total to path as CSV, one row per function, per
+        calling module and function, and per frame.
+        """
+        if sys.version_info[0] < 3:
+            csvfile = open(path, "wb")
+        else:
+            csvfile = open(path, "w", newline="")
+
+        with csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["section", "frame", "module", "function", "calls", "ms"])
+
+            for (name, (calls, elapsed)) in sorted(self.functions.items()):
+                if calls:
+                    writer.writerow(["function", "", "", name, calls, elapsed*1000])
+
+            for ((module, name), (calls, elapsed)) in sorted(self.callers.items()):
+                writer.writerow(["caller", "", module, name, calls, elapsed*1000])
+
+            for (i, (calls, elapsed)) in enumerate(self.frames):
+                writer.writerow(["frame", i, "", "", calls, elapsed*1000])
+
+
+class FrameProfiler(object):
+    """
+    Keeps rolling per-phase timings over the last few frames.
+    Time is attributed to phases with lap(), which charges the time
+    since the previous lap to the given phase.
+
+    counter: CallCounter whose calls are sampled once per frame
+    window: number of frames the statistics cover
+    """
+    def __init__(self, counter, window=config.PERF_WINDOW):
+        self.counter = counter
+        self.samples = dict((phase, collections.deque(maxlen=window)) for phase in PHASES)
+        self.totals = collections.deque(maxlen=window)
+        self.calls = collections.deque(maxlen=window)
+        self.frame = dict.fromkeys(PHASES, 0.0)
+        self.last = None
+        self.start_calls = 0
+        self.lines = []
+        self.frames = 0
+
+    def begin_frame(self):
+        """Starts timing a new frame."""
+        self.frame = dict.fromkeys(PHASES, 0.0)
+        self.start_calls = self.counter.calls
+        self.last = timeit.default_timer()
+
+    def lap(self, phase):
+        """Charges the time since the last lap to phase."""
+        now = timeit.default_timer()
+        self.frame[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        """Stores the timings of the current frame."""
+        for phase in PHASES:
+            self.samples[phase].append(self.frame[phase])
+
+        self.totals.append(sum(self.frame.values()))
+        self.calls.append(self.counter.calls - self.start_calls)
+        self.frames += 1
+
+    def report(self):
+        """
+        Returns the lines shown by the HUD. They are rebuilt every
+        PERF_REFRESH frames so the HUD barely affects its own numbers.
+        """
+        if not self.lines or self.frames % config.PERF_REFRESH == 0:
+            self.lines = ["{:<10}{:>9}{:>9}".format("phase", "avg ms", "p95 ms")]
+
+            for phase in PHASES:
+                self.lines.append(format_row(phase, self.samples[phase]))
+
+            self.lines.append(format_row("frame", self.totals))
+            self.lines.append("{:<10}{:>9.1f}{:>9}".format(
+                "calls", mean(self.calls), percentile(self.calls, 0.95)))
+
+        return self.lines
+
+
+class StartupProfile(object):
+    """
+    Times the phases of starting the program, from launch to the
+    first frame of the main menu. Like FrameProfiler, time is charged
+    to phases with lap().
+
+    start: timeit.default_timer() reading taken at launch
+    """
+    def __init__(self, start=None):
+        self.start = timeit.default_timer() if start is None else start
+        self.last = self.start
+        self.phases = []
+
+    def lap(self, phase):
+        """Charges the time since the last lap to phase."""
+        now = timeit.default_timer()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        """Returns the lines of the report, one per phase and the total."""
+        lines = ["{:<10}{:>9}".format("phase", "ms")]
+
+        for (phase, elapsed) in self.phases:
+            lines.append("{:<10}{:>9.1f}".format(phase, elapsed*1000))
+
+        lines.append("{:<10}{:>9.1f}".format("to menu", (self.last - self.start)*1000))
+        return lines
+
+
+# Miscellaneous functions
+def rebind():
+    """Points the fast aliases of libtcodpy and the backend at the current function table."""
+    libt.bind_fast()
+    backends.LibtcodBackend.bind_fast()
+
+
+def caller_module(frame):
+    """Returns the name of the first module on the stack from frame on outside libtcodpy and perf."""
+    while frame and frame.f_globals.get('__name__') in ('libtcodpy', __name__):
+        frame = frame.f_back
+
+    return frame.f_globals.get('__name__', "?") if frame else "?"
+
+
+def mean(samples):
+    """Returns the mean of samples, or 0 if there are none."""
+    if not samples:
+        return 0
+    return float(sum(samples)) / len(samples)
+
+
+def percentile(samples, fraction):
+    """Returns the value below which the given fraction of samples fall."""
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def format_row(name, samples):
+    """Formats the mean and p95 of samples in seconds as milliseconds."""
+    return "{:<10}{:>9.2f}{:>9.2f}".format(name, mean(samples)*1000,
+                                           percentile(samples, 0.95)*1000)
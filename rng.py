@@ -0,0 +1,92 @@
+#
+# rng.py
+# Named random number streams seeded from one game seed
+#
+# Each subsystem draws from its own stream, so a new random call in
+# combat does not change what the map generator or the mobs do next.
+# Before every player command the streams are started afresh from a
+# seed mixed from the game seed and the number of commands so far,
+# which is all a save needs to store and all the journal needs to
+# replay a command.
+#
+
+import random
+import zlib
+
+# Names of the streams and what draws from them
+#   mapgen:     seeds of new floors
+#   combat:     damage dealt
+#   ai:         morale checks of mobs
+STREAMS = ("mapgen", "combat", "ai")
+
+MASK = (1 << 64) - 1
+
+
+class Streams(object):
+    """
+    Random streams of one game. Each name in STREAMS is an attribute
+    holding a random.Random, made the first time it is used after the
+    streams were started.
+
+    seed: seed of the game, or None for a random one; only its low
+    32 bits are kept, as that is what saves store
+    draws: number of commands the streams were started for already
+    """
+    def __init__(self, seed=None, draws=0):
+        if seed is None:
+            seed = random.getrandbits(32)
+
+        self.seed = seed & 0xffffffff
+        self.draws = draws
+        self.start(mix(self.seed))
+
+    def __getattr__(self, name):
+        if name not in STREAMS:
+            raise AttributeError(name)
+
+        stream = random.Random(mix(self.current, stream_id(name)))
+        setattr(self, name, stream)
+        return stream
+
+    def start(self, seed):
+        """Starts every stream afresh from seed."""
+        for name in STREAMS:
+            self.__dict__.pop(name, None)
+
+        self.current = seed
+
+    def advance(self, seed=None):
+        """
+        Starts the streams for the next command and returns the seed
+        they were started from. A journal passes the seed it recorded
+        for the command; otherwise it comes from the game seed.
+        """
+        if seed is None:
+            seed = mix(self.seed, self.draws) & 0xffffffff
+
+        self.draws += 1
+        self.start(seed)
+        return seed
+
+    def state(self):
+        """Returns the (seed, draws) to save, which Streams(*state) restores."""
+        return self.seed, self.draws
+
+
+# Miscellaneous functions
+def mix(*values):
+    """Returns a 64-bit hash of the integers in values, the same on every platform."""
+    z = 0
+
+    for value in values:
+        z = (z + value + 0x9E3779B97F4A7C15) & MASK
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+        z ^= z >> 31
+
+    return z
+
+
+def stream_id(name):
+    """Returns the number the stream called name is seeded with besides the command seed."""
+    return zlib.crc32(name.encode("ascii")) & 0xffffffff
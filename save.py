@@ -3,14 +3,119 @@
 # Manages saving and loading
 #
 
+import json
 import os
 import shelve
+import threading
+import time
 import config
+import saveformat
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class SlotBase(object):
+    """
+    What a save slot held after its last write, so the next save
+    can append only the changes.
+
+    world: Map that was saved
+    seen_count: length of the map's seen log at the last write
+    records: entity records at the last write
+    message_count: number of messages at the last write
+    deltas: number of delta records in the file
+    snapshot_size: size of the full snapshot in bytes
+    size: size of the whole file in bytes
+    floors: generation of the floor cache written with the snapshot
+    """
+    def __init__(self, world, seen_count, records, message_count,
+                 deltas, snapshot_size, size, floors=0):
+        self.world = world
+        self.seen_count = seen_count
+        self.records = records
+        self.message_count = message_count
+        self.deltas = deltas
+        self.snapshot_size = snapshot_size
+        self.size = size
+        self.floors = floors
+
+
+class Snapshot(object):
+    """
+    Copy of the game taken on the main thread, holding everything a save
+    needs so that it can be encoded and written while the game carries on.
+    Terrain is shared rather than copied since it never changes within
+    a level, and entities are copied as their encoded records.
+
+    game: StateHandler to take the snapshot of
+    base: SlotBase to write a delta against, or None for a full snapshot
+    """
+    def __init__(self, game, base):
+        self.base = base
+        self.world = game.world
+        self.records = saveformat.entity_records(game.map_objects)
+        self.seen_count = len(game.world.seen_log)
+        self.message_count = len(game.message_box.history)
+        self.floors = game.floors.generation
+
+        self.save_data = {
+            'world': game.world,
+            'player_index': game.map_objects['characters'].index(game.player),
+            'game_state': game.game_state,
+            'player_action': game.player_action,
+            'turn': game.turn,
+            'depth': game.depth,
+            'play_time': game.elapsed_play_time(),
+            'rng': game.rng.state()
+        }
+
+        # Shown in the save and load menus
+        self.meta = {
+            'depth': game.depth,
+            'hp': game.player.hp,
+            'max_hp': game.player.max_hp,
+            'turn': game.turn,
+            'play_time': int(self.save_data['play_time']),
+            'saved_at': int(time.time())
+        }
+
+        if base:
+            self.seen = game.world.seen_log[base.seen_count:]
+            start = base.message_count
+        else:
+            self.seen = saveformat.seen_plane(game.world)
+            self.save_data['floors'] = game.floors.encoded()
+            start = 0
+
+        self.save_data['messages'] = list(game.message_box.history.entries(start))
+
+    def encode(self):
+        """Returns the encoded snapshot or delta record."""
+        if self.base:
+            return saveformat.encode_delta(self.save_data, self.seen,
+                                           self.records, self.base.records)
+
+        return saveformat.encode(self.save_data, records=self.records, seen=self.seen)
 
 
 class SaveHandler(object):
+    """
+    Reads and writes save slots. Saves can be written in the background
+    by a worker thread; results are collected with poll().
+
+    Metadata for every filled slot is kept in an index file next to the
+    saves, so the menus never have to open the saves themselves.
+    """
     def __init__(self):
-        pass
+        self.bases = {}
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = None
+        self.meta = None
+        self.meta_lock = threading.Lock()
 
     def is_save(self, index):
         """Returns true if a save file exists in given index."""
@@ -21,33 +126,246 @@ class SaveHandler(object):
         Returns list of booleans representing whether 
         or not each save index is filled.
         """
-        return [self.is_save(i) for i in range(config.MAX_SAVES)]
+        slots = self.slots()
+        return [i in slots for i in range(config.MAX_SAVES)]
+
+    def slots(self):
+        """
+        Returns a dictionary of slot index to metadata for every filled
+        slot. The index file is read on first use only. Saves whose
+        metadata is unknown have an empty dictionary.
+        """
+        if self.meta is None:
+            self.meta = self.read_index()
+        return self.meta
+
+    def read_index(self):
+        """Reads the index file, rebuilding it if it is missing or unreadable."""
+        try:
+            with open(config.get_save_index_path()) as indexfile:
+                index = json.load(indexfile)
+            return dict((int(key), val) for (key, val) in index['slots'].items())
+        except (IOError, OSError, ValueError, KeyError):
+            return self.scan_saves()
+
+    def scan_saves(self):
+        """Returns empty metadata for every save file on disk."""
+        slots = {}
+
+        if os.path.isdir(config.SAVE_DIR):
+            for filename in os.listdir(config.SAVE_DIR):
+                (prefix, sep, index) = filename.partition("_")
+                if prefix == "save" and index.isdigit():
+                    slots[int(index)] = {}
+
+        return slots
+
+    def set_meta(self, index, meta):
+        """Sets or, if meta is None, removes the metadata of a slot."""
+        slots = self.slots()
+
+        with self.meta_lock:
+            if meta is None:
+                slots.pop(index, None)
+            else:
+                slots[index] = meta
+
+    def write_index(self):
+        """Writes the metadata of every slot to the index file."""
+        with self.meta_lock:
+            text = json.dumps({'slots': dict((str(key), val) for (key, val)
+                                             in self.slots().items())})
+
+        path = config.get_save_index_path()
+        with open(path + ".tmp", "w") as indexfile:
+            indexfile.write(text)
+
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path + ".tmp", path)
+
+    def snapshot(self, game, index):
+        """
+        Returns a Snapshot of game for the save at index. It holds only
+        the changes if the slot was last written during this level.
+        """
+        # The worker updates slot bases, so let it finish first
+        self.wait()
+
+        if self.can_append(game, index):
+            snapshot = Snapshot(game, self.bases[index])
+        else:
+            snapshot = Snapshot(game, None)
+
+        self.set_meta(index, snapshot.meta)
+        return snapshot
+
+    def save_game(self, game, index):
+        """Saves game to the slot at index and waits for the write."""
+        self.write(self.snapshot(game, index), index)
+
+    def save_game_async(self, game, index):
+        """
+        Takes a snapshot of game and leaves encoding and writing it to the
+        worker thread. Returns as soon as the snapshot has been taken.
+        """
+        snapshot = self.snapshot(game, index)
+
+        if not self.worker or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self.run_worker)
+            self.worker.daemon = True
+            self.worker.start()
 
-    def add_data(self, data, index):
+        self.jobs.put((snapshot, index))
+
+    def run_worker(self):
+        """
+        Writes queued snapshots until close() is called. Errors are
+        reported through poll() so that one bad save does not stop
+        the ones after it.
         """
-        Adds all key/value pairs in data to the save file at index.
-        Creates the file if it does not exist.
+        while True:
+            job = self.jobs.get()
+
+            if job is None:
+                self.jobs.task_done()
+                return
+
+            (snapshot, index) = job
+
+            try:
+                self.write(snapshot, index)
+                self.results.put((index, None))
+            except Exception as err:
+                self.results.put((index, err))
+            finally:
+                self.jobs.task_done()
+
+    def poll(self):
         """
+        Returns a list of (index, error) pairs for background saves that
+        finished since the last poll. error is None if the save succeeded.
+        """
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def wait(self):
+        """Blocks until every background save has been written."""
+        self.jobs.join()
+
+    def close(self):
+        """Waits for background saves and stops the worker thread."""
+        if self.worker:
+            self.jobs.put(None)
+            self.worker.join()
+            self.worker = None
+
+        self.wait()
+
+    def can_append(self, game, index):
+        """
+        Returns true if a delta for game can be appended to the save at
+        index. Floors the player is not on are only written in full, so
+        the player must not have changed floors since.
+        """
+        base = self.bases.get(index)
+        path = config.get_save_path(index)
+
+        return (base is not None and base.world is game.world and
+                base.floors == game.floors.generation and
+                base.deltas < config.SAVE_MAX_DELTAS and
+                base.size < 2*base.snapshot_size and
+                os.path.isfile(path) and os.path.getsize(path) == base.size)
+
+    def write(self, snapshot, index):
+        """Encodes snapshot and writes it to the save at index."""
         if not os.path.exists(config.SAVE_DIR):
             os.makedirs(config.SAVE_DIR)
 
-        savefile = shelve.open(config.get_save_path(index))
-        for key, val in data.iteritems():
-            savefile[key] = val
+        try:
+            if snapshot.base:
+                self.append_delta(snapshot, index)
+            else:
+                self.write_snapshot(snapshot, index)
+        except Exception:
+            # The file may not match what was last written
+            self.bases.pop(index, None)
+            if not self.is_save(index):
+                self.set_meta(index, None)
+            raise
+        finally:
+            self.write_index()
 
-        savefile.close()
+    def write_snapshot(self, snapshot, index):
+        """Replaces the save at index with a full snapshot."""
+        path = config.get_save_path(index)
+        buf = snapshot.encode()
+
+        # Write to a temporary file first so a failed save
+        # never leaves a half-written slot behind
+        with open(path + ".tmp", "wb") as savefile:
+            savefile.write(buf)
+
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path + ".tmp", path)
+
+        self.bases[index] = SlotBase(snapshot.world, snapshot.seen_count,
+                                     snapshot.records, snapshot.message_count,
+                                     0, len(buf), len(buf), snapshot.floors)
+
+    def append_delta(self, snapshot, index):
+        """Appends the changes since the last write to the save at index."""
+        base = snapshot.base
+        buf = snapshot.encode()
+
+        with open(config.get_save_path(index), "ab") as savefile:
+            savefile.write(buf)
+
+        base.seen_count = snapshot.seen_count
+        base.records = snapshot.records
+        base.message_count = snapshot.message_count
+        base.deltas += 1
+        base.size += len(buf)
 
     def get_data(self, index):
         """
-        Returns a dictionary of stored data at save with given index.
-        Requires that the file exists.
+        Returns a saveformat.LazySave of the save with given index, which
+        decodes its sections as they are looked up. The file is mapped
+        into memory rather than read where possible. Saves written with
+        shelve are converted first. Requires that the file exists.
         """
+        self.wait()
         assert self.is_save(index)
 
+        with open(config.get_save_path(index), "rb") as savefile:
+            buf = saveformat.map_file(savefile)
+
+        if not saveformat.is_save_data(buf):
+            self.bases.pop(index, None)
+            return saveformat.LazySave(saveformat.encode(self.get_legacy_data(index)))
+
+        data = saveformat.LazySave(buf)
+
+        # If a delta was cut short by an interrupted write, the sizes
+        # will not match and the next save rewrites the slot in full.
+        # Loading restores the floor cache, which starts at generation 0
+        self.bases[index] = SlotBase(data['world'], 0,
+                                     saveformat.entity_records(data['map_objects']),
+                                     data.message_count(), data['deltas'],
+                                     data.bounds[0][1], data.bounds[-1][1])
+        return data
+
+    def get_legacy_data(self, index):
+        """Returns the data stored in a save written with shelve."""
         savefile = shelve.open(config.get_save_path(index), "r")
         data = {}
 
-        for key, val in savefile.iteritems():
+        for key, val in savefile.items():
             data[key] = val
 
         savefile.close()
@@ -58,6 +376,10 @@ class SaveHandler(object):
         Deletes the save file with given index. 
         Requires that the file exists.
         """
+        self.wait()
         path = config.get_save_path(index)
         assert os.path.isfile(path)
         os.remove(path)
+        self.bases.pop(index, None)
+        self.set_meta(index, None)
+        self.write_index()
@@ -0,0 +1,1109 @@
+#
+# saveformat.py
+# Binary encoding of saved games
+#
+# A save is a full snapshot followed by any number of delta records.
+# Both are containers: a header and a section directory, followed by
+# the sections themselves. Each section may be compressed on its own.
+#
+#   header:     magic, format version, section count
+#   directory:  per section; tag, codec, offset, stored size, raw size
+#   snapshot:   STAT game state, META depth and play time, TILE tile
+#               planes as bitsets, ENTS entity records, MSGT message
+#               string table
+#               A floor made by the level generator stores SEED, the
+#               seed it was generated from, SEEB its seen tiles as a
+#               bitset and EDLT the entity records that differ from the
+#               generated ones instead of TILE and ENTS
+#               Maps of at least SAVE_PLANES_MIN_TILES tiles store PLNS
+#               instead of TILE: the planes uncompressed, one byte per
+#               tile, starting on a page boundary so that a memory-mapped
+#               save can use them in place
+#               FLRS holds the floors the player is not on, if any
+#               RNGS holds the game seed and the number of commands the
+#               random streams were started for, if any
+#   delta:      STAT game state, META depth and play time, RNGS random
+#               streams, SEEN newly seen tiles, EDLT changed entity
+#               records, MSGT messages added since the last write
+#
+# A floor the player is not on is a container of its own, holding
+# either a TILE or PLNS section and an ENTS section, or SEED, SEEB and
+# EDLT sections.
+#
+# Saves written before the string table had offsets store messages in
+# a MSGS section instead, which can only be read front to back.
+#
+# Readers skip sections they do not know and tolerate optional ones
+# (META, RNGS) being absent, so sections can be added without a new version.
+#
+
+import collections
+import mmap
+import os
+import struct
+import threading
+import zlib
+import libtcodpy as libt
+import config
+import data
+import entities
+import world
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# Imported on first use, or None if NumPy is not installed
+numpy = libt.numpy
+
+MAGIC = b"BOGY"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHH")
+DIRECTORY_ENTRY = struct.Struct("<4sBIII")
+
+# Section compression codecs
+RAW = 0
+ZLIB = 1
+LZMA = 2
+
+# Sections stored uncompressed and aligned to PAGE_SIZE
+ALIGNED = [b"PLNS"]
+PAGE_SIZE = 4096
+
+# Size of the PLNS header; the planes follow it
+PLANES_HEADER = 16
+
+# Map object lists, in draw order
+LISTS = ['stairs', 'items', 'mobs', 'characters']
+
+# Entity classes that can be saved; the index is the archetype id
+ARCHETYPES = [entities.Player, entities.Spider, entities.Skeleton,
+              entities.WoodenSword, entities.StoneSword,
+              entities.HealthPotion, entities.Stairs, entities.DownStairs]
+
+# Generated floors kept by generated(), most recently used last. Both
+# the main thread and the save worker use them, so GENERATED_LOCK is
+# held while they are looked up or changed.
+GENERATED = collections.OrderedDict()
+GENERATED_CACHE = 8
+GENERATED_LOCK = threading.Lock()
+
+# Mob states that are not small integers
+DEAD_STATE = 255
+
+# Entity field kinds that are stored as a different type, as
+# (struct format code, to stored value, from stored value)
+FIELD_KINDS = {
+    'char': ("B", ord, chr),
+    'state': ("B", lambda state: DEAD_STATE if state == data.DEAD else state,
+              lambda state: data.DEAD if state == DEAD_STATE else state)
+}
+
+
+class SaveFormatError(Exception):
+    """Raised when a save file cannot be decoded."""
+    pass
+
+
+class Writer(object):
+    """Accumulates binary data for a section."""
+    def __init__(self):
+        self.buf = bytearray()
+
+    def pack(self, fmt, *values):
+        """Appends values packed little-endian with fmt."""
+        self.buf.extend(struct.pack("<" + fmt, *values))
+
+    def string(self, value):
+        """Appends a length-prefixed utf-8 string."""
+        raw = value.encode("utf-8") if not isinstance(value, bytes) else value
+        self.pack("H", len(raw))
+        self.buf.extend(raw)
+
+
+class Reader(object):
+    """Reads binary data from a section."""
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 0
+
+    def unpack(self, fmt):
+        """Returns the next values packed little-endian with fmt."""
+        fmt = "<" + fmt
+        values = struct.unpack_from(fmt, self.buf, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def unpack_struct(self, packer):
+        """Returns the next values packed with the struct.Struct packer."""
+        values = packer.unpack_from(self.buf, self.pos)
+        self.pos += packer.size
+        return values
+
+    def string(self):
+        """Returns the next length-prefixed string."""
+        (length,) = self.unpack("H")
+        raw = self.buf[self.pos:self.pos + length]
+        self.pos += length
+        return decode_str(raw)
+
+
+# Sections
+def encode_state(save_data):
+    """Encodes the game state and player index."""
+    out = Writer()
+    out.string(save_data['game_state'])
+    out.string(save_data['player_action'] or "")
+    out.pack("II", save_data['player_index'], save_data.get('turn', 0))
+    return out.buf
+
+
+def decode_state(buf, save_data):
+    """Reads an encoded STAT section into save_data."""
+    reader = Reader(buf)
+    save_data['game_state'] = reader.string()
+    save_data['player_action'] = reader.string() or None
+    (save_data['player_index'], save_data['turn']) = reader.unpack("II")
+
+
+def encode_meta(save_data):
+    """Encodes the dungeon depth and play time."""
+    out = Writer()
+    out.pack("Hd", save_data.get('depth', 1), save_data.get('play_time', 0.0))
+    return out.buf
+
+
+def decode_meta(buf, save_data):
+    """Reads an encoded META section into save_data."""
+    (save_data['depth'], save_data['play_time']) = Reader(buf).unpack("Hd")
+
+
+def encode_rng(save_data):
+    """Encodes the game seed and position of the random streams."""
+    out = Writer()
+    out.pack("II", *save_data['rng'])
+    return out.buf
+
+
+def decode_rng(buf, save_data):
+    """Reads an encoded RNGS section into save_data."""
+    save_data['rng'] = Reader(buf).unpack("II")
+
+
+def seen_plane(game_world):
+    """Returns a copy of the seen plane of game_world."""
+    return plane_bytes(game_world.seen)
+
+
+def uses_planes(game_world):
+    """Returns true if game_world is saved as a PLNS section."""
+    return game_world.width*game_world.height >= config.SAVE_PLANES_MIN_TILES
+
+
+def encode_tiles(game_world, seen=None):
+    """
+    Encodes the passable, fog and seen planes as bitsets. A seen plane
+    taken earlier with seen_plane() can be passed in.
+    """
+    if seen is None:
+        seen = seen_plane(game_world)
+
+    out = Writer()
+    out.pack("HH", game_world.width, game_world.height)
+    out.buf.extend(pack_bits(bytearray(plane_bytes(game_world.passable))))
+    out.buf.extend(pack_bits(bytearray(plane_bytes(game_world.fog))))
+    out.buf.extend(pack_bits(bytearray(seen)))
+    return out.buf
+
+
+def decode_tiles(buf, seen=True):
+    """
+    Returns the Map stored in an encoded TILE section. If seen is
+    false, no tile is marked as seen; decode_seen_plane() can restore
+    them later.
+    """
+    reader = Reader(buf)
+    (w, h) = reader.unpack("HH")
+    size = (w*h + 7) // 8
+    start = reader.pos
+
+    passable = bytearray(unpack_bits(buf[start:start + size], w*h))
+    fog = bytearray(unpack_bits(buf[start + size:start + 2*size], w*h))
+    game_world = world.Map(w, h, (passable, fog, bytearray(w*h)))
+
+    if seen:
+        decode_seen_plane(buf, game_world)
+
+    return game_world
+
+
+def decode_seen_plane(buf, game_world):
+    """Marks the tiles seen in an encoded TILE section as seen."""
+    (w, h) = Reader(buf).unpack("HH")
+    size = (w*h + 7) // 8
+    start = struct.calcsize("<HH") + 2*size
+    plane = unpack_bits(buf[start:start + size], w*h)
+
+    for i in range(w*h):
+        if plane[i]:
+            game_world.seen[i] = 1
+
+
+def encode_planes(game_world, seen=None):
+    """
+    Encodes the passable, fog and seen planes with one byte per tile,
+    after a header holding the size of the map.
+    """
+    if seen is None:
+        seen = seen_plane(game_world)
+
+    out = Writer()
+    out.pack("HH", game_world.width, game_world.height)
+    out.buf.extend(bytearray(PLANES_HEADER - len(out.buf)))
+    out.buf.extend(plane_bytes(game_world.passable))
+    out.buf.extend(plane_bytes(game_world.fog))
+    out.buf.extend(seen)
+    return out.buf
+
+
+def decode_planes(buf, start):
+    """
+    Returns the Map whose PLNS section begins at offset start of buf.
+    The planes are views of buf where possible; see plane_view().
+    """
+    (w, h) = struct.unpack_from("<HH", buf, start)
+    start += PLANES_HEADER
+    planes = [plane_view(buf, start + k*w*h, w*h) for k in range(3)]
+    return world.Map(w, h, planes)
+
+
+def encode_tile_section(game_world, seen=None):
+    """Returns the (tag, data) section holding the tiles of game_world."""
+    if uses_planes(game_world):
+        return (b"PLNS", encode_planes(game_world, seen))
+    return (b"TILE", encode_tiles(game_world, seen))
+
+
+def encode_seen(seen):
+    """Encodes a list of newly seen (x, y) tiles."""
+    out = Writer()
+    out.pack("I", len(seen))
+    for (x, y) in seen:
+        out.pack("HH", x, y)
+    return out.buf
+
+
+def decode_seen(buf, game_world):
+    """Marks the tiles in an encoded SEEN section as seen."""
+    reader = Reader(buf)
+    (count,) = reader.unpack("I")
+    for i in range(count):
+        (x, y) = reader.unpack("HH")
+        game_world.seen[x*game_world.height + y] = 1
+
+
+def entity_schema(cls):
+    """
+    Returns the (attribute, kind) pairs saved for entities of class cls:
+    the persist fields of each class from Entity down, with inventories
+    moved last so that the fixed-size fields can be packed together.
+    """
+    fields = []
+    for klass in reversed(cls.__mro__):
+        fields.extend(klass.__dict__.get('persist', ()))
+
+    return ([field for field in fields if field[1] != 'inv'] +
+            [field for field in fields if field[1] == 'inv'])
+
+
+class EntityCodec(object):
+    """
+    Encodes and decodes the entities of one archetype, following the
+    schema of its class. Each run of fixed-size fields is packed with a
+    single struct.Struct.
+
+    archetype: archetype id written before each entity
+    cls: entity class of the archetype
+    """
+    def __init__(self, archetype, cls):
+        self.archetype = archetype
+        self.cls = cls
+
+        # Steps are (kind, attribute, struct, converters); fixed steps
+        # cover several attributes and convert to and from stored values
+        self.steps = []
+        run = []
+
+        for (attr, kind) in entity_schema(cls):
+            if kind in ('str', 'inv'):
+                self.add_fixed(run)
+                self.steps.append((kind, attr, None, None))
+                run = []
+            else:
+                run.append((attr, kind))
+
+        self.add_fixed(run)
+
+    def add_fixed(self, run):
+        """Adds a step packing the (attribute, kind) pairs in run, if any."""
+        if not run:
+            return
+
+        kinds = [FIELD_KINDS.get(kind, (kind, None, None)) for (attr, kind) in run]
+        self.steps.append(('fixed', [attr for (attr, kind) in run],
+                           struct.Struct("<" + "".join(k[0] for k in kinds)),
+                           ([k[1] for k in kinds], [k[2] for k in kinds])))
+
+    def encode(self, out, obj):
+        """Writes obj as the archetype id followed by its fields."""
+        out.pack("B", self.archetype)
+
+        for (kind, attr, packer, converters) in self.steps:
+            if kind == 'fixed':
+                values = [getattr(obj, a) for a in attr]
+                out.buf.extend(packer.pack(*[convert(val) if convert else val
+                                             for (convert, val) in zip(converters[0], values)]))
+            elif kind == 'str':
+                out.string(getattr(obj, attr))
+            else:
+                inv = getattr(obj, attr)
+                out.pack("H", len(inv))
+                for (item, count) in inv.items():
+                    out.pack("H", count)
+                    encode_entity(out, item)
+
+    def decode(self, reader):
+        """Reads the fields of one entity whose archetype id has been read."""
+        obj = self.cls(0, 0)
+
+        for (kind, attr, packer, converters) in self.steps:
+            if kind == 'fixed':
+                values = reader.unpack_struct(packer)
+                for (a, convert, val) in zip(attr, converters[1], values):
+                    setattr(obj, a, convert(val) if convert else val)
+            elif kind == 'str':
+                setattr(obj, attr, reader.string())
+            else:
+                inv = getattr(obj, attr)
+                (count,) = reader.unpack("H")
+                for i in range(count):
+                    (qty,) = reader.unpack("H")
+                    inv[decode_entity(reader)] = qty
+
+        return obj
+
+
+# Codec of each archetype, keyed by entity class
+CODECS = dict((cls, EntityCodec(archetype, cls)) for (archetype, cls) in enumerate(ARCHETYPES))
+
+
+def encode_entity(out, obj):
+    """Writes one entity as an archetype id followed by its fields."""
+    try:
+        codec = CODECS[type(obj)]
+    except KeyError:
+        raise SaveFormatError("cannot save {}".format(type(obj).__name__))
+
+    codec.encode(out, obj)
+
+
+def decode_entity(reader):
+    """Reads one entity written by encode_entity()."""
+    (archetype,) = reader.unpack("B")
+
+    try:
+        codec = CODECS[ARCHETYPES[archetype]]
+    except IndexError:
+        raise SaveFormatError("unknown archetype {}".format(archetype))
+
+    return codec.decode(reader)
+
+
+def entity_records(map_objects):
+    """Returns a dictionary of list name to the encoded record of each object."""
+    records = {}
+    for lst in LISTS:
+        records[lst] = []
+        for obj in map_objects.get(lst, []):
+            out = Writer()
+            encode_entity(out, obj)
+            records[lst].append(bytes(out.buf))
+    return records
+
+
+def encode_entities(records):
+    """Encodes every entity record, grouped by list."""
+    out = Writer()
+    for lst in LISTS:
+        out.pack("I", len(records[lst]))
+        for record in records[lst]:
+            out.buf.extend(record)
+    return out.buf
+
+
+def decode_entities(buf):
+    """Returns the map objects stored in an encoded ENTS section."""
+    reader = Reader(buf)
+    map_objects = collections.OrderedDict()
+
+    for lst in LISTS:
+        (count,) = reader.unpack("I")
+        map_objects[lst] = [decode_entity(reader) for i in range(count)]
+
+    return map_objects
+
+
+def encode_entity_changes(records, old_records):
+    """
+    Encodes the entity records that differ from old_records. Each list
+    stores its new length and, per slot, either a flag saying the entity
+    is unchanged or the replacement record.
+    """
+    out = Writer()
+    for lst in LISTS:
+        new = records[lst]
+        old = old_records.get(lst, [])
+        out.pack("I", len(new))
+
+        for i in range(len(new)):
+            if i < len(old) and old[i] == new[i]:
+                out.pack("?", False)
+            else:
+                out.pack("?", True)
+                out.buf.extend(new[i])
+    return out.buf
+
+
+def decode_entity_changes(buf, map_objects):
+    """Applies an encoded EDLT section to map_objects."""
+    reader = Reader(buf)
+
+    for lst in LISTS:
+        old = map_objects.get(lst, [])
+        (count,) = reader.unpack("I")
+        new = []
+
+        for i in range(count):
+            (changed,) = reader.unpack("?")
+            new.append(decode_entity(reader) if changed else old[i])
+
+        map_objects[lst] = new
+
+
+def generated(seed, depth):
+    """
+    Returns the passable and fog planes and the entity records of the
+    floor generated from seed at depth. The last few results are kept,
+    as every save of a floor compares its entities with them.
+    """
+    key = (seed, depth, world.GENERATOR)
+
+    with GENERATED_LOCK:
+        if key in GENERATED:
+            GENERATED[key] = GENERATED.pop(key)
+        else:
+            (game_world, map_objects) = world.generate_floor(seed, depth)
+            GENERATED[key] = (plane_bytes(game_world.passable), plane_bytes(game_world.fog),
+                              entity_records(map_objects))
+
+            if len(GENERATED) > GENERATED_CACHE:
+                GENERATED.popitem(False)
+
+        return GENERATED[key]
+
+
+def verify_floor(game_world):
+    """
+    Generates game_world again from its seed and returns true if the
+    tiles come out the same. config.SAVE_VERIFY runs this on every save.
+    """
+    (fresh, map_objects) = world.generate_floor(game_world.seed, game_world.depth)
+    return (fresh.width == game_world.width and fresh.height == game_world.height and
+            plane_bytes(fresh.passable) == plane_bytes(game_world.passable) and
+            plane_bytes(fresh.fog) == plane_bytes(game_world.fog))
+
+
+def uses_seed(game_world):
+    """Returns true if game_world is saved as its seed and the changes since."""
+    if game_world.seed is None:
+        return False
+    return not config.SAVE_VERIFY or verify_floor(game_world)
+
+
+def encode_generated(game_world, records, seen=None):
+    """
+    Returns the SEED, SEEB and EDLT sections that store game_world and
+    the entity records of its map objects as changes to the floor
+    generated from its seed.
+    """
+    if seen is None:
+        seen = seen_plane(game_world)
+
+    out = Writer()
+    out.pack("IHHHH", game_world.seed, game_world.depth, world.GENERATOR,
+             game_world.width, game_world.height)
+
+    baseline = generated(game_world.seed, game_world.depth)[2]
+    return [
+        (b"SEED", out.buf),
+        (b"SEEB", pack_bits(bytearray(seen))),
+        (b"EDLT", encode_entity_changes(records, baseline))
+    ]
+
+
+def decode_generated(buf):
+    """
+    Returns the (world, map objects) generated from the seed in an
+    encoded SEED section, with no tile seen.
+    """
+    (seed, depth, generator, w, h) = Reader(buf).unpack("IHHHH")
+
+    if generator != world.GENERATOR:
+        raise SaveFormatError("floor was made by level generator {}".format(generator))
+
+    (passable, fog, records) = generated(seed, depth)
+    if len(passable) != w*h:
+        raise SaveFormatError("generated floor does not match the saved size")
+
+    game_world = world.Map(w, h, (bytearray(passable), bytearray(fog), bytearray(w*h)))
+    game_world.seed = seed
+    game_world.depth = depth
+
+    return game_world, decode_entities(encode_entities(records))
+
+
+def decode_seen_bits(buf, game_world):
+    """Marks the tiles seen in an encoded SEEB section as seen."""
+    plane = unpack_bits(buf, game_world.width*game_world.height)
+
+    for i in range(len(plane)):
+        if plane[i]:
+            game_world.seen[i] = 1
+
+
+def encode_messages(messages):
+    """
+    Encodes messages as a string table: the message count, packed colours,
+    the offset of each string within the string data, then the strings.
+    """
+    out = Writer()
+    out.pack("I", len(messages))
+
+    for (msg, colour) in messages:
+        out.pack("BBB", colour.r, colour.g, colour.b)
+
+    strings = bytearray()
+    for (msg, colour) in messages:
+        out.pack("I", len(strings))
+        strings.extend(msg.encode("utf-8") if not isinstance(msg, bytes) else msg)
+    out.pack("I", len(strings))
+
+    out.buf.extend(strings)
+    return out.buf
+
+
+def message_count(buf):
+    """Returns the number of messages in an encoded MSGT or MSGS section."""
+    return Reader(buf).unpack("I")[0]
+
+
+def decode_messages(buf, first=0):
+    """
+    Returns the (message, colour) pairs in an encoded MSGT section,
+    starting from the message with index first.
+    """
+    count = message_count(buf)
+    first = min(max(first, 0), count)
+    colours = 4
+    offsets = colours + 3*count
+    strings = offsets + 4*(count + 1)
+
+    bounds = struct.unpack_from("<{}I".format(count + 1 - first), buf, offsets + 4*first)
+    entries = []
+
+    for i in range(first, count):
+        (start, end) = (bounds[i - first], bounds[i - first + 1])
+        colour = struct.unpack_from("<BBB", buf, colours + 3*i)
+        entries.append((decode_str(buf[strings + start:strings + end]), libt.Color(*colour)))
+
+    return entries
+
+
+def decode_message_list(buf):
+    """Returns the (message, colour) pairs in an encoded MSGS section."""
+    reader = Reader(buf)
+    (count,) = reader.unpack("I")
+    colours = [reader.unpack("BBB") for i in range(count)]
+    return [(reader.string(), libt.Color(*colour)) for colour in colours]
+
+
+# Whole files
+def encode(save_data, compression=config.SAVE_COMPRESSION, records=None, seen=None):
+    """
+    Returns the full snapshot of save_data, which holds the same keys
+    that decode() returns. Entity records built with entity_records()
+    and a plane from seen_plane() can be passed in instead of the
+    live map objects and tiles.
+    """
+    if records is None:
+        records = entity_records(save_data['map_objects'])
+
+    sections = [
+        (b"STAT", encode_state(save_data)),
+        (b"META", encode_meta(save_data))
+    ]
+
+    if 'rng' in save_data:
+        sections.append((b"RNGS", encode_rng(save_data)))
+
+    if uses_seed(save_data['world']):
+        sections.extend(encode_generated(save_data['world'], records, seen))
+    else:
+        sections.append(encode_tile_section(save_data['world'], seen))
+        sections.append((b"ENTS", encode_entities(records)))
+
+    sections.append((b"MSGT", encode_messages(save_data['messages'])))
+
+    if save_data.get('floors'):
+        sections.append((b"FLRS", encode_floors(save_data['floors'])))
+
+    return pack_sections(sections, compression)
+
+
+def encode_delta(save_data, seen, records, old_records,
+                 compression=config.SAVE_COMPRESSION):
+    """
+    Returns a delta record that brings a save up to date with save_data,
+    whose messages are only those added since the previous write.
+
+    seen: (x, y) tiles seen since the previous write
+    records: current entity records, from entity_records()
+    old_records: entity records at the previous write
+    """
+    sections = [
+        (b"STAT", encode_state(save_data)),
+        (b"META", encode_meta(save_data)),
+        (b"SEEN", encode_seen(seen)),
+        (b"EDLT", encode_entity_changes(records, old_records)),
+        (b"MSGT", encode_messages(save_data['messages']))
+    ]
+
+    if 'rng' in save_data:
+        sections.append((b"RNGS", encode_rng(save_data)))
+    return pack_sections(sections, compression)
+
+
+def encode_floor(game_world, map_objects, compression=config.SAVE_COMPRESSION):
+    """Returns a container holding the tiles and map objects of a floor."""
+    records = entity_records(map_objects)
+
+    if uses_seed(game_world):
+        sections = encode_generated(game_world, records)
+    else:
+        sections = [encode_tile_section(game_world), (b"ENTS", encode_entities(records))]
+
+    return pack_sections(sections, compression)
+
+
+def decode_floor(buf):
+    """Returns the (world, map objects) of a floor written by encode_floor()."""
+    directory = read_directory(buf)
+
+    if b"SEED" in directory:
+        (game_world, map_objects) = decode_generated(read_section(buf, 0, directory, b"SEED"))
+        decode_seen_bits(read_section(buf, 0, directory, b"SEEB"), game_world)
+        decode_entity_changes(read_section(buf, 0, directory, b"EDLT"), map_objects)
+        return game_world, map_objects
+
+    if b"PLNS" in directory:
+        game_world = decode_planes(buf, directory[b"PLNS"][1])
+    else:
+        game_world = decode_tiles(read_section(buf, 0, directory, b"TILE"))
+
+    return game_world, decode_entities(read_section(buf, 0, directory, b"ENTS"))
+
+
+def encode_floors(floors):
+    """Encodes (floor id, encoded floor) pairs."""
+    out = Writer()
+    out.pack("I", len(floors))
+    for (floor_id, buf) in floors:
+        out.pack("HI", floor_id, len(buf))
+        out.buf.extend(buf)
+    return out.buf
+
+
+def decode_floors(buf):
+    """Returns the (floor id, encoded floor) pairs in an encoded FLRS section."""
+    reader = Reader(buf)
+    (count,) = reader.unpack("I")
+    floors = []
+
+    for i in range(count):
+        (floor_id, size) = reader.unpack("HI")
+        floors.append((floor_id, bytes(buf[reader.pos:reader.pos + size])))
+        reader.pos += size
+
+    return floors
+
+
+def decode(buf):
+    """
+    Returns the save data dictionary stored in buf, with every delta
+    applied. The number of deltas is stored under 'deltas'.
+    """
+    save_data = LazySave(buf)
+    save_data.restore_seen()
+    save_data['map_objects']
+    save_data['messages']
+    save_data['floors']
+    return dict(save_data)
+
+
+def pack_sections(sections, compression):
+    """
+    Compresses each (tag, data) section and lays out the file. Sections
+    in ALIGNED are stored as they are, starting on a page boundary.
+    """
+    codec = {None: RAW, "zlib": ZLIB, "lzma": LZMA}[compression]
+    if codec == LZMA and not lzma:
+        codec = ZLIB
+
+    stored = []
+    for (tag, raw) in sections:
+        packed = compress(bytes(raw), codec) if tag not in ALIGNED else raw
+        if len(packed) < len(raw):
+            stored.append((tag, codec, packed, len(raw)))
+        else:
+            stored.append((tag, RAW, bytes(raw), len(raw)))
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, len(stored)))
+    offset = HEADER.size + DIRECTORY_ENTRY.size*len(stored)
+    offsets = []
+
+    for (tag, section_codec, packed, raw_size) in stored:
+        if tag in ALIGNED:
+            offset += -offset % PAGE_SIZE
+        offsets.append(offset)
+        out.extend(DIRECTORY_ENTRY.pack(tag, section_codec, offset, len(packed), raw_size))
+        offset += len(packed)
+
+    for (offset, (tag, section_codec, packed, raw_size)) in zip(offsets, stored):
+        out.extend(bytearray(offset - len(out)))
+        out.extend(packed)
+
+    return bytes(out)
+
+
+def read_header(buf, start):
+    """Returns the section count of the container at start."""
+    if len(buf) < start + HEADER.size:
+        raise SaveFormatError("header is truncated")
+
+    (magic, version, count) = HEADER.unpack_from(buf, start)
+    if magic != MAGIC:
+        raise SaveFormatError("not a save file")
+    if version > VERSION:
+        raise SaveFormatError("unsupported save version {}".format(version))
+
+    return count
+
+
+def container_end(buf, start):
+    """
+    Returns the offset just past the container at start. It lies beyond
+    the end of buf if the container is incomplete.
+    """
+    try:
+        count = read_header(buf, start)
+    except SaveFormatError:
+        if len(buf) < start + HEADER.size:
+            return start + HEADER.size
+        raise
+
+    end = start + HEADER.size + DIRECTORY_ENTRY.size*count
+    if end > len(buf):
+        return end
+
+    for i in range(count):
+        (tag, codec, offset, size, raw_size) = DIRECTORY_ENTRY.unpack_from(
+            buf, start + HEADER.size + i*DIRECTORY_ENTRY.size)
+        end = max(end, start + offset + size)
+
+    return end
+
+
+def containers(buf):
+    """
+    Returns (start, end) offsets of the complete containers in buf.
+    A trailing delta cut short by an interrupted write is left out.
+    """
+    bounds = []
+    start = 0
+
+    while start < len(buf):
+        end = container_end(buf, start)
+        if end > len(buf):
+            if not bounds:
+                raise SaveFormatError("snapshot is truncated")
+            break
+
+        bounds.append((start, end))
+        start = end
+
+    return bounds
+
+
+def read_directory(buf, start=0):
+    """
+    Returns a dictionary of tag to (codec, offset, stored size, raw size)
+    for the container at start. Offsets are relative to the container.
+    """
+    count = read_header(buf, start)
+
+    directory = {}
+    for i in range(count):
+        (tag, codec, offset, size, raw_size) = DIRECTORY_ENTRY.unpack_from(
+            buf, start + HEADER.size + i*DIRECTORY_ENTRY.size)
+        directory[tag] = (codec, offset, size, raw_size)
+
+    return directory
+
+
+def read_section(buf, start, directory, tag):
+    """
+    Returns the decompressed section with given tag from the container
+    at start, whose directory has been read with read_directory().
+    """
+    (codec, offset, size, raw_size) = directory[tag]
+    raw = decompress(buf[start + offset:start + offset + size], codec)
+
+    if len(raw) != raw_size:
+        raise SaveFormatError("section {} is truncated".format(tag))
+    return raw
+
+
+def is_save_data(buf):
+    """Returns true if buf starts with the save file magic."""
+    return buf[:len(MAGIC)] == MAGIC
+
+
+class LazySave(dict):
+    """
+    Save data that is decoded as it is needed. Only the headers and the
+    small state sections are read up front. 'world', 'map_objects',
+    'messages' and 'floors' are decoded the first time they are looked up.
+
+    The world comes back without remembered tiles, which restore_seen()
+    marks afterwards, and recent_messages() reads the end of the message
+    history without decoding the rest of it. The planes of a PLNS section
+    are used in place, remembered tiles included, so when buf is a
+    memory-mapped file only the tiles that are looked at are read.
+
+    buf: contents of the save file, or a copy-on-write mmap of it
+    """
+    def __init__(self, buf):
+        dict.__init__(self)
+        self.buf = buf
+        self.bounds = containers(buf)
+        self.directories = [read_directory(buf, start) for (start, end) in self.bounds]
+        self.cache = {}
+        self.seen_restored = False
+        self.generated_objects = None
+
+        for i in range(len(self.bounds)):
+            decode_state(self.section(i, b"STAT"), self)
+            if b"META" in self.directories[i]:
+                decode_meta(self.section(i, b"META"), self)
+            if b"RNGS" in self.directories[i]:
+                decode_rng(self.section(i, b"RNGS"), self)
+
+        self['deltas'] = len(self.bounds) - 1
+
+    def __missing__(self, key):
+        loaders = {
+            'world': self.load_world,
+            'map_objects': self.load_map_objects,
+            'messages': self.load_messages,
+            'floors': self.load_floors
+        }
+
+        if key not in loaders:
+            raise KeyError(key)
+
+        self[key] = loaders[key]()
+        return self[key]
+
+    def section(self, i, tag):
+        """Returns the decompressed section with given tag from container i."""
+        if (i, tag) not in self.cache:
+            self.cache[(i, tag)] = read_section(self.buf, self.bounds[i][0],
+                                                self.directories[i], tag)
+        return self.cache[(i, tag)]
+
+    def load_world(self):
+        """Returns the Map without remembered tiles, unless it has planes."""
+        if b"SEED" in self.directories[0]:
+            (game_world, self.generated_objects) = decode_generated(self.section(0, b"SEED"))
+            return game_world
+
+        if b"PLNS" in self.directories[0]:
+            (codec, offset, size, raw_size) = self.directories[0][b"PLNS"]
+            if codec != RAW or size != raw_size:
+                raise SaveFormatError("tile planes are compressed")
+            return decode_planes(self.buf, self.bounds[0][0] + offset)
+
+        return decode_tiles(self.section(0, b"TILE"), seen=False)
+
+    def restore_seen(self):
+        """Marks every tile the player had seen, including those in deltas."""
+        if self.seen_restored:
+            return
+
+        if b"TILE" in self.directories[0]:
+            decode_seen_plane(self.section(0, b"TILE"), self['world'])
+        elif b"SEEB" in self.directories[0]:
+            decode_seen_bits(self.section(0, b"SEEB"), self['world'])
+        for i in range(1, len(self.bounds)):
+            decode_seen(self.section(i, b"SEEN"), self['world'])
+
+        self.seen_restored = True
+
+    def load_map_objects(self):
+        """Returns the map objects with every delta applied."""
+        if b"SEED" in self.directories[0]:
+            self['world']
+            map_objects = self.generated_objects
+            decode_entity_changes(self.section(0, b"EDLT"), map_objects)
+        else:
+            map_objects = decode_entities(self.section(0, b"ENTS"))
+
+        for i in range(1, len(self.bounds)):
+            decode_entity_changes(self.section(i, b"EDLT"), map_objects)
+        return map_objects
+
+    def load_floors(self):
+        """Returns the (floor id, encoded floor) pairs of the floors the player is not on."""
+        if b"FLRS" not in self.directories[0]:
+            return []
+        return decode_floors(self.section(0, b"FLRS"))
+
+    def message_tables(self):
+        """Returns the encoded message section of each container, oldest first."""
+        tables = []
+        for i in range(len(self.bounds)):
+            if b"MSGT" in self.directories[i]:
+                tables.append((self.section(i, b"MSGT"), True))
+            else:
+                tables.append((self.section(i, b"MSGS"), False))
+        return tables
+
+    def load_messages(self):
+        """Returns every (message, colour) pair in the save."""
+        entries = []
+        for (buf, indexed) in self.message_tables():
+            entries.extend(decode_messages(buf) if indexed else decode_message_list(buf))
+        return entries
+
+    def message_count(self):
+        """Returns the number of messages in the save."""
+        return sum(message_count(buf) for (buf, indexed) in self.message_tables())
+
+    def recent_messages(self, count):
+        """Returns the last count (message, colour) pairs in the save."""
+        if 'messages' in self:
+            return self['messages'][-count:]
+
+        entries = []
+        for (buf, indexed) in reversed(self.message_tables()):
+            if not indexed:
+                return self['messages'][-count:]
+
+            needed = count - len(entries)
+            entries = decode_messages(buf, message_count(buf) - needed) + entries
+            if len(entries) >= count:
+                break
+
+        return entries
+
+
+# Miscellaneous functions
+def compress(raw, codec):
+    """Compresses raw bytes with the given codec."""
+    if codec == ZLIB:
+        return zlib.compress(raw)
+    elif codec == LZMA:
+        return lzma.compress(raw)
+    return raw
+
+
+def decompress(packed, codec):
+    """Reverses compress()."""
+    if codec == ZLIB:
+        return zlib.decompress(bytes(packed))
+    elif codec == LZMA:
+        if not lzma:
+            raise SaveFormatError("save needs lzma, which is not available")
+        return lzma.decompress(bytes(packed))
+    return bytes(packed)
+
+
+def map_file(savefile):
+    """
+    Returns a copy-on-write mmap of the open file savefile, so that
+    changes to views of it stay in memory. The file is read into bytes
+    instead where it is empty or where a mapped file could not be
+    replaced by a later save.
+    """
+    if os.name == "nt" or os.fstat(savefile.fileno()).st_size == 0:
+        return savefile.read()
+    return mmap.mmap(savefile.fileno(), 0, access=mmap.ACCESS_COPY)
+
+
+def plane_view(buf, offset, size):
+    """
+    Returns a writable plane of size bytes of buf at offset. If buf is an
+    mmap, this is a zero-copy NumPy array or memoryview where available,
+    which leaves the operating system to page tiles in as they are used.
+    """
+    if isinstance(buf, mmap.mmap):
+        if numpy is not None:
+            return numpy.frombuffer(buf, numpy.uint8, size, offset)
+        if str is not bytes:
+            return memoryview(buf)[offset:offset + size]
+
+    return bytearray(buf[offset:offset + size])
+
+
+def plane_bytes(plane):
+    """Returns a copy of a tile plane as bytes."""
+    if numpy is not None and isinstance(plane, numpy.ndarray):
+        return plane.tobytes()
+    return bytes(bytearray(plane))
+
+
+def pack_bits(values):
+    """Packs a sequence of booleans into a bytearray, eight per byte."""
+    out = bytearray((len(values) + 7) // 8)
+    for i in range(len(values)):
+        if values[i]:
+            out[i >> 3] |= 1 << (i & 7)
+    return out
+
+
+def unpack_bits(buf, count):
+    """Returns a list of count booleans packed in buf."""
+    buf = bytearray(buf)
+    return [bool(buf[i >> 3] & (1 << (i & 7))) for i in range(count)]
+
+
+def decode_str(raw):
+    """Decodes utf-8 bytes into the native string type."""
+    if str is bytes:
+        return bytes(raw)
+    return bytes(raw).decode("utf-8")
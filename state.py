@@ -3,33 +3,80 @@
 # Handles interactions between game modules
 #
 
-import collections
-import random
+import timeit
 import libtcodpy as libt
+import backends
 import config
 import data
 import entities
+import floors
 import gui
+import journal
+import perf
+import rng
+import save
 import world
 
+# Character codes of map tiles
+WALL_CHAR = ord("#")
+GROUND_CHAR = ord(".")
+
 
 class StateHandler(object):
     """
     Class that takes care of interactions between entities, 
     gui and world modules. It also stores important data
     about the state of the game.
+
+    backend: console backend, a LibtcodBackend by default
+    seed: seed of every new game, or None for a random one
     """
-    def __init__(self):
+    def __init__(self, backend=None, seed=None):
+        # Console drawing and input go through the backend
+        self.backend = backend or backends.LibtcodBackend()
+        self.seed = seed
+
         # Set this class as owner for Entity, Map and GUIElement classes
         entities.Entity.handler = self
         world.Map.handler = self
         gui.GUIElement.handler = self
 
+        # Bumped whenever the FOV is recomputed
+        self.fov_generation = 0
+        self.terrain_generation = 0
+        self.look_cursor = None
+        self.profiler = None
+        self.pending_load = None
+        self.replaying = False
+        self.journal = journal.Journal(config.get_journal_path())
+        self.floors = floors.FloorCache()
+
+        # Kept for the whole session so slots remember their last write
+        self.save_handler = save.SaveHandler()
+
     def keybinds(self):
         """Handles keyboard input from the user."""
         if self.key.vk == libt.KEY_ENTER and self.key.lalt:
-            libt.console_set_fullscreen(not libt.console_is_fullscreen())
+            self.backend.set_fullscreen(not self.backend.is_fullscreen())
+            return data.NO_MOVE
+        elif self.key.vk == libt.KEY_F3:
+            self.toggle_profiler()
+            return data.NO_MOVE
+        elif self.look_cursor:
+            if self.key.vk == libt.KEY_UP:
+                self.move_look_cursor(0, -1)
+            elif self.key.vk == libt.KEY_DOWN:
+                self.move_look_cursor(0, 1)
+            elif self.key.vk == libt.KEY_LEFT:
+                self.move_look_cursor(-1, 0)
+            elif self.key.vk == libt.KEY_RIGHT:
+                self.move_look_cursor(1, 0)
+            elif self.key.vk == libt.KEY_ESCAPE or chr(self.key.c) == "l":
+                self.set_look_cursor(None)
+
+            return data.NO_MOVE
         elif self.key.vk == libt.KEY_ESCAPE:
+            self.capture_frame()
             menu = gui.InGameMenu()
             menu.draw()
             status = menu.select()
@@ -40,76 +87,188 @@ class StateHandler(object):
                 return data.NO_MOVE
         elif self.game_state == data.PLAY:
             if self.key.vk == libt.KEY_UP:
-                self.player.move_or_attack(0, -1)
+                return self.perform(data.CMD_MOVE, 0, -1)
             elif self.key.vk == libt.KEY_DOWN:
-                self.player.move_or_attack(0, 1)
+                return self.perform(data.CMD_MOVE, 0, 1)
             elif self.key.vk == libt.KEY_LEFT:
-                self.player.move_or_attack(-1, 0)
+                return self.perform(data.CMD_MOVE, -1, 0)
             elif self.key.vk == libt.KEY_RIGHT:
-                self.player.move_or_attack(1, 0)
+                return self.perform(data.CMD_MOVE, 1, 0)
             else:
                 char = chr(self.key.c)
 
                 if char == "g":
-                    self.player.player_take()
+                    self.perform(data.CMD_TAKE)
                 elif char == "i":
+                    self.capture_frame()
                     inv_menu = gui.InventoryMenu()
                     inv_menu.draw()
                     inv_menu.select()
-                elif char == ">":
-                    for stairs in self.map_objects['stairs']:
-                        if stairs.x == self.player.x and stairs.y == self.player.y:
-                            self.new_level()
+                elif char == "m":
+                    self.capture_frame()
+                    log = gui.MessageLog()
+                    log.draw()
+                    log.select()
+                elif char == "l":
+                    self.set_look_cursor((self.player.x, self.player.y))
+                elif char == ">" or char == "<":
+                    self.perform(data.CMD_STAIRS)
 
                 return data.NO_MOVE
 
-    def init_program(self):
-        """Setup method that is run when program starts."""
-        libt.console_set_custom_font(config.get_img_path('char_sheet'), 
+    def perform(self, command, arg1=0, arg2=0):
+        """
+        Records a player command in the journal and carries it out.
+        The random streams are started afresh first so that replaying
+        the journal gives the same results.
+        """
+        seed = self.rng.advance()
+        self.journal.record(seed, command, arg1, arg2)
+        return self.run_command(command, arg1, arg2)
+
+    def run_command(self, command, arg1=0, arg2=0):
+        """
+        Carries out a player command. Returns data.NO_MOVE
+        if the mobs do not get to act afterwards.
+        """
+        if command == data.CMD_MOVE:
+            self.player.move_or_attack(arg1, arg2)
+            return None
+        elif command == data.CMD_TAKE:
+            self.player.player_take()
+        elif command == data.CMD_STAIRS:
+            for stairs in self.map_objects['stairs']:
+                if stairs.x == self.player.x and stairs.y == self.player.y:
+                    self.use_stairs(stairs)
+                    break
+        elif command == data.CMD_DROP:
+            self.player.player_drop(list(self.player.inv)[arg1])
+        elif command == data.CMD_USE:
+            item = list(self.player.inv)[arg1]
+
+            if item.usable:
+                used = item.use()
+                if used and used.consumable:
+                    self.player.remove_from_inv(used)
+
+        return data.NO_MOVE
+
+    def end_turn(self):
+        """Lets the mobs act and advances the turn counter."""
+        for mob in self.map_objects['mobs']:
+            mob.action_handler()
+
+        self.turn += 1
+
+    def init_program(self, startup=None):
+        """
+        Setup method that is run when program starts. If startup is a
+        perf.StartupProfile, the time spent in each phase up to the
+        first frame of the main menu is charged to it and reported.
+        """
+        lap = startup.lap if startup else (lambda phase: None)
+
+        self.title_image = None
+
+        self.backend.set_custom_font(config.get_img_path('char_sheet'), 
                                      libt.FONT_TYPE_GREYSCALE 
                                      | libt.FONT_LAYOUT_TCOD)
-        libt.console_init_root(config.SCREEN_WIDTH, config.SCREEN_HEIGHT, 
+        lap('font')
+        self.backend.init_root(config.SCREEN_WIDTH, config.SCREEN_HEIGHT, 
                                "BOGEY", False)
-        libt.console_credits()
-        libt.console_set_keyboard_repeat(50, 100)
-        libt.sys_set_fps(60)
+        lap('window')
+
+        if config.SHOW_CREDITS:
+            self.backend.credits()
+            lap('credits')
+
+        self.backend.set_keyboard_repeat(50, 100)
+        self.backend.set_fps(60)
 
         # Screen consoles
-        self.game_map = libt.console_new(config.MAP_WIDTH, config.MAP_HEIGHT)
-        self.gui = libt.console_new(config.GUI_WIDTH, config.GUI_HEIGHT)
+        self.game_map = self.backend.console_new(config.MAP_WIDTH, config.MAP_HEIGHT)
+        self.gui = self.backend.console_new(config.GUI_WIDTH, config.GUI_HEIGHT)
+        self.frame = self.backend.console_new(config.SCREEN_WIDTH, config.SCREEN_HEIGHT)
 
         # Set up input
         self.key = libt.Key()
         self.mouse = libt.Mouse()
+        lap('consoles')
 
         # Create main menu
         self.main_menu = gui.MainMenu()
         self.main_menu.draw()
+        lap('menu')
+
+        if startup:
+            print("\n".join(startup.report()))
+
         self.main_menu.select()
 
+        # Let background saves finish before the program exits
+        self.journal.close()
+        self.save_handler.close()
+        self.floors.clear()
+
     def new_game(self):
         """Generates a new game."""
         self.game_state = data.PLAY
         self.player_action = None
-        self.init_game_objects()
-        self.world.make_map()
+        self.turn = 0
+        self.depth = 1
+        self.play_time = 0.0
+        self.play_clock = timeit.default_timer()
+        self.look_cursor = None
+        self.floors.clear()
+        self.rng = rng.Streams(self.seed)
+        self.init_game_objects(self.rng.mapgen.getrandbits(32))
         self.init_fov()
         self.init_gui()
 
+    def use_stairs(self, stairs):
+        """
+        Takes the player to the floor that stairs lead to. Floors visited
+        before come back from the floor cache as they were left; the
+        player arrives on the stairs leading back.
+        """
+        depth = self.depth + stairs.direction
+        floor = self.floors.take(depth) if depth in self.floors else None
+
+        # Stored after taking the next floor so it cannot be evicted first
+        self.map_objects['characters'].remove(self.player)
+        self.floors.store(self.depth, self.world, self.map_objects)
+        self.depth = depth
+        self.look_cursor = None
+
+        if floor:
+            (self.world, self.map_objects) = floor
+            self.map_objects['characters'].insert(0, self.player)
+
+            for arrival in self.map_objects['stairs']:
+                if arrival.direction == -stairs.direction:
+                    self.player.x = arrival.x
+                    self.player.y = arrival.y
+
+            self.message_box.add_msg("You return to floor {}.".format(self.depth))
+        else:
+            self.new_level()
+
+        self.init_fov()
+
+        if config.AUTOSAVE and not self.replaying:
+            self.save_game(config.AUTOSAVE_SLOT)
+
+        self.start_journal()
+
     def new_level(self):
-        """Generates a new level after game has started."""
-        # Save old state then load it
-        current_messages = self.message_box.messages
+        """Generates a new floor and puts the player on it."""
         player = self.player
-        self.new_game()
-        self.message_box.messages = current_messages
+        self.init_game_objects(self.rng.mapgen.getrandbits(32))
 
-        # Get new coordinates for player and assign correct references
-        player_x = self.player.x
-        player_y = self.player.y
+        # Move the player to where the new player object was placed
+        player.x = self.player.x
+        player.y = self.player.y
         self.player = player
-        self.player.x = player_x
-        self.player.y = player_y
         self.map_objects['characters'][0] = self.player
 
         # Heal player and add some messages
@@ -117,52 +276,196 @@ class StateHandler(object):
         self.message_box.add_msg("You advance up the stairs to greater adventure.")
         self.message_box.add_msg("You rest up a bit.", data.COLOURS['player_gain_hp_text'])
 
-    def init_game_objects(self):
-        """Creates the object instances."""
-        self.player = entities.Player(0, 0, "Player")
-        self.world = world.Map()
+    def load_game(self, save_data):
+        """
+        Restores a game from a saveformat.LazySave. Only what the first
+        frame needs is decoded here; finish_load() decodes the rest once
+        that frame is on screen.
+        """
+        self.game_state = save_data['game_state']
+        self.player_action = save_data['player_action']
+        self.turn = save_data['turn']
+        self.depth = save_data.get('depth', 1)
+        self.play_time = save_data.get('play_time', 0.0)
+        self.play_clock = timeit.default_timer()
+        self.look_cursor = None
+        self.rng = rng.Streams(*save_data.get('rng', (None,)))
+
+        self.world = save_data['world']
+        self.map_objects = save_data['map_objects']
+        self.player = self.map_objects['characters'][save_data['player_index']]
+        self.init_fov()
+        self.init_gui()
+        self.message_box.restore(save_data.recent_messages(self.message_box.max_messages))
+        self.pending_load = save_data
 
-        # Map objects, OrderedDict ensures proper draw order
-        self.map_objects = collections.OrderedDict([('stairs', []),
-                                                    ('items', []), 
-                                                    ('mobs', []), 
-                                                    ('characters', [self.player])])
+    def finish_load(self):
+        """Restores remembered tiles and the full message history of a loaded game."""
+        save_data = self.pending_load
+        self.pending_load = None
+
+        save_data.restore_seen()
+        self.message_box.restore(save_data['messages'])
+        self.floors.restore(save_data['floors'])
+        self.fov_refresh = True
+        self.start_journal()
+
+    def start_journal(self):
+        """
+        Saves a recovery snapshot in the background and starts an
+        empty journal from it. Does nothing while replaying.
+        """
+        if self.replaying:
+            return
+
+        self.save_handler.save_game_async(self, config.RECOVERY_SLOT)
+        self.journal.start(self.turn, self.depth)
+
+    def recover(self):
+        """
+        Rebuilds the game that was being played when the program last
+        stopped, by loading the recovery snapshot and replaying the
+        journal without drawing anything. Returns false if there is
+        nothing to recover.
+        """
+        try:
+            (turn, depth, records) = journal.read(config.get_journal_path())
+        except (IOError, OSError, journal.JournalError):
+            return False
+
+        if not self.save_handler.is_save(config.RECOVERY_SLOT):
+            return False
+
+        save_data = self.save_handler.get_data(config.RECOVERY_SLOT)
+        if save_data['turn'] != turn or save_data.get('depth', 1) != depth:
+            return False
+
+        self.replaying = True
+        self.load_game(save_data)
+        self.finish_load()
+
+        for (seed, command, arg1, arg2) in records:
+            self.compute_fov()
+            self.rng.advance(seed)
+
+            if self.run_command(command, arg1, arg2) != data.NO_MOVE and self.game_state == data.PLAY:
+                self.end_turn()
+
+        self.replaying = False
+        self.start_journal()
+        return True
+
+    def elapsed_play_time(self):
+        """Returns the number of seconds spent playing the current game."""
+        return self.play_time + timeit.default_timer() - self.play_clock
+
+    def init_game_objects(self, seed):
+        """Generates the floor at the current depth from seed."""
+        (self.world, self.map_objects) = world.generate_floor(seed, self.depth)
+        self.player = self.map_objects['characters'][0]
 
     def init_fov(self):
         """Initializes the FOV map."""
         self.fov_refresh = True
         self.fov_map = libt.map_new(config.MAP_WIDTH, config.MAP_HEIGHT)
-        libt.console_clear(self.game_map)
+        self.fov_cells = bytearray(config.MAP_WIDTH*config.MAP_HEIGHT)
+        self.backend.clear(self.game_map)
 
-        for i in range(config.MAP_WIDTH):
-            for j in range(config.MAP_HEIGHT):
-                libt.map_set_properties(self.fov_map, i, j, 
-                                        not self.world.map[i][j].fog, 
-                                        self.world.map[i][j].passable)
+        # libtcod wants to know which tiles can be seen through, the inverse of fog
+        fog = self.world.rows(self.world.fog)
+        libt.map_set_flags(self.fov_map, libt.MAP_TRANSPARENT, fog.translate(world.INVERTED))
+        libt.map_set_flags(self.fov_map, libt.MAP_WALKABLE, self.world.rows(self.world.passable))
+
+    def in_fov(self, x, y):
+        """Returns true if tile (x, y) was in the player's FOV when it was last computed."""
+        return bool(self.fov_cells[y*config.MAP_WIDTH + x])
 
     def init_gui(self):
         """Instantiates the GUI elements."""
         self.border = gui.Border()
         self.health_bar = gui.HealthBar()
         self.message_box = gui.MessageBox()
+        self.perf_hud = gui.PerfHUD()
 
     def play(self):
         """Runs the game loop after game data has been set."""
-        while not libt.console_is_window_closed():
-            libt.sys_check_for_event(libt.EVENT_KEY_PRESS | libt.EVENT_MOUSE, 
-                                     self.key, self.mouse)
-            self.render_all()
-            libt.console_flush()
+        while not self.backend.is_window_closed():
+            profiler = self.profiler
+            if profiler:
+                profiler.begin_frame()
+
+            self.backend.check_for_event(libt.EVENT_KEY_PRESS | libt.EVENT_MOUSE, 
+                                         self.key, self.mouse)
+            if profiler:
+                profiler.lap('input')
+
+            self.report_saves()
+            self.journal.tick()
+            self.compute_fov()
+            if profiler:
+                profiler.lap('fov')
+
+            self.render_terrain()
+            if profiler:
+                profiler.lap('terrain')
+
+            self.draw_entities()
+            if profiler:
+                profiler.lap('entities')
+
+            self.draw_gui()
+            if profiler:
+                profiler.lap('gui')
+
+            self.blit_consoles()
+            self.backend.flush()
+            if profiler:
+                profiler.lap('blit')
+
+            if self.pending_load:
+                self.finish_load()
 
             for lst in self.map_objects:
                 self.clear_obj(self.map_objects[lst])
+            if profiler:
+                profiler.lap('entities')
 
             player_action = self.keybinds()
+            if profiler:
+                profiler.lap('input')
+
             if player_action == data.EXIT:
                 break
             elif self.game_state == data.PLAY and player_action != data.NO_MOVE:
-                for mob in self.map_objects['mobs']:
-                    mob.action_handler()
+                self.end_turn()
+
+            if profiler:
+                profiler.lap('ai')
+                profiler.end_frame()
+
+        # Leaving to the main menu should not lose buffered commands
+        self.journal.sync()
+
+    def save_game(self, index):
+        """Saves the game to the slot at index in the background."""
+        self.save_handler.save_game_async(self, index)
+        self.message_box.add_msg("Saving to slot {}...".format(index + 1),
+                                 data.COLOURS['save_text'])
+
+    def report_saves(self):
+        """Adds a message for each background save that has finished."""
+        for (index, err) in self.save_handler.poll():
+            if index == config.RECOVERY_SLOT and not err:
+                continue
+            elif index == config.RECOVERY_SLOT:
+                self.message_box.add_msg("Could not write the recovery snapshot: {}".format(err),
+                                         data.COLOURS['save_text'])
+            elif err:
+                self.message_box.add_msg("Could not save to slot {}: {}".format(index + 1, err),
+                                         data.COLOURS['save_text'])
+            else:
+                self.message_box.add_msg("Saved to slot {}.".format(index + 1),
+                                         data.COLOURS['save_text'])
 
     def draw_obj(self, lst):
         """Takes a list of objects and draws them on the map."""
@@ -176,54 +479,157 @@ class StateHandler(object):
 
     def render_all(self):
         """Places objects and tiles on the console display."""
+        self.compute_fov()
+        self.render_terrain()
+        self.draw_entities()
+        self.draw_gui()
+        self.blit_consoles()
+
+    def compute_fov(self):
+        """Recomputes the FOV if the player has moved."""
         if self.fov_refresh:
             self.fov_refresh = False
+            self.fov_generation += 1
             libt.map_compute_fov(self.fov_map, self.player.x, self.player.y, 
                                  config.LIGHT_RANGE, config.FOV_LIT_WALLS, 
                                  config.FOV)
+            libt.map_get_flags(self.fov_map, libt.MAP_FOV, self.fov_cells)
+            self.mark_seen_tiles()
+
+    def mark_seen_tiles(self):
+        """Marks every tile in the player's FOV as seen."""
+        if config.LIGHT_RANGE:
+            x_range = range(max(self.player.x - config.LIGHT_RANGE, 0), 
+                            min(self.player.x + config.LIGHT_RANGE + 1, config.MAP_WIDTH))
+            y_range = range(max(self.player.y - config.LIGHT_RANGE, 0), 
+                            min(self.player.y + config.LIGHT_RANGE + 1, config.MAP_HEIGHT))
+        else:
+            x_range = range(config.MAP_WIDTH)
+            y_range = range(config.MAP_HEIGHT)
+
+        fov = self.fov_cells
+        w = config.MAP_WIDTH
+
+        for j in y_range:
+            for i in x_range:
+                if fov[j*w + i]:
+                    self.world.mark_seen(i, j)
+
+    def render_terrain(self):
+        """Redraws the map tiles if the FOV has changed since they were drawn."""
+        if self.terrain_generation == self.fov_generation:
+            return
+
+        self.terrain_generation = self.fov_generation
+        seen = self.world.seen
+        fov = self.fov_cells
+        h = self.world.height
+        w = config.MAP_WIDTH
+
+        # The fog plane is only read for tiles that get drawn, so the
+        # unexplored part of a memory-mapped map is never paged in
+        put = self.backend.put_code_ex
+        con = self.game_map
+        fog = self.world.fog
+        bg = data.COLOURS['bg']
+        (lit_wall, lit_ground) = (data.COLOURS['lit_wall'], data.COLOURS['lit_ground'])
+        (wall, ground) = (data.COLOURS['wall'], data.COLOURS['ground'])
 
-            for i in range(config.MAP_WIDTH):
-                for j in range(config.MAP_HEIGHT):
-                    fog = self.world.map[i][j].fog
-                    visible = libt.map_is_in_fov(self.fov_map, i, j)
-
-                    if visible:
-                        self.world.map[i][j].seen = True
-
-                        if fog:
-                            libt.console_put_char_ex(self.game_map, i, j, "#",
-                                                     data.COLOURS['lit_wall'], 
-                                                     data.COLOURS['bg'])
-                        else:
-                            libt.console_put_char_ex(self.game_map, i, j, ".",
-                                                     data.COLOURS['lit_ground'], 
-                                                     data.COLOURS['bg'])
-                    elif self.world.map[i][j].seen:
-                        if fog:
-                            libt.console_put_char_ex(self.game_map, i, j, "#", 
-                                                     data.COLOURS['wall'], 
-                                                     data.COLOURS['bg'])
-                        else:
-                            libt.console_put_char_ex(self.game_map, i, j, ".", 
-                                                     data.COLOURS['ground'], 
-                                                     data.COLOURS['bg'])
-
-        # Draw entities
+        for i in range(config.MAP_WIDTH):
+            for j in range(config.MAP_HEIGHT):
+                visible = fov[j*w + i]
+
+                if visible:
+                    if fog[i*h + j]:
+                        put(con, i, j, WALL_CHAR, lit_wall, bg)
+                    else:
+                        put(con, i, j, GROUND_CHAR, lit_ground, bg)
+                elif seen[i*h + j]:
+                    if fog[i*h + j]:
+                        put(con, i, j, WALL_CHAR, wall, bg)
+                    else:
+                        put(con, i, j, GROUND_CHAR, ground, bg)
+
+    def draw_entities(self):
+        """Draws every map object in order."""
         for lst in self.map_objects:
             self.draw_obj(self.map_objects[lst])
 
+    def draw_gui(self):
+        """Rebuilds and draws the GUI elements."""
         # Refresh the status bars
         self.health_bar = gui.HealthBar()
 
-        # Draw GUI
         self.border.draw()
         self.health_bar.draw()
         self.message_box.draw()
 
-        # Blit the consoles
-        libt.console_blit(self.game_map, 0, 0, 
+        if self.profiler:
+            self.perf_hud.draw()
+
+    def blit_consoles(self):
+        """Blits the map and GUI consoles to the root console."""
+        self.backend.blit(self.game_map, 0, 0, 
                           config.MAP_WIDTH, config.MAP_HEIGHT, 0, 
                           0, 0)
-        libt.console_blit(self.gui, 0, 0,
+        self.backend.blit(self.gui, 0, 0,
                           config.GUI_WIDTH, config.GUI_HEIGHT, 0, 
                           0, config.MAP_HEIGHT)
+
+    def toggle_profiler(self):
+        """Turns the performance HUD and its timing on or off."""
+        if self.profiler:
+            self.profiler.counter.uninstall()
+            self.profiler = None
+        else:
+            counter = perf.CallCounter(libt._lib)
+            counter.install()
+            self.profiler = perf.FrameProfiler(counter)
+
+    def capture_frame(self):
+        """
+        Renders the game screen once and keeps a copy of it so
+        menus can reuse it as their background.
+        """
+        self.render_all()
+        self.backend.blit(0, 0, 0, config.SCREEN_WIDTH, config.SCREEN_HEIGHT, 
+                          self.frame, 0, 0)
+
+    def draw_frame(self):
+        """Draws the last captured game screen on the root console."""
+        self.backend.blit(self.frame, 0, 0, 
+                          config.SCREEN_WIDTH, config.SCREEN_HEIGHT, 0, 
+                          0, 0)
+
+    def draw_title(self):
+        """Draws the title image, loading it on first use."""
+        if not self.title_image:
+            self.title_image = self.backend.image_load(config.get_img_path('title'))
+
+        self.backend.image_blit_2x(self.title_image, 0, 0, 0)
+
+    def set_look_cursor(self, pos):
+        """
+        Places the look cursor at pos, or removes it if pos is None.
+        The tile under the cursor is highlighted on the game map.
+        """
+        if self.look_cursor:
+            self.backend.set_char_background(self.game_map, self.look_cursor[0], 
+                                             self.look_cursor[1], self.look_under, 
+                                             libt.BKGND_SET)
+
+        self.look_cursor = pos
+
+        if pos:
+            self.look_under = self.backend.get_char_background(self.game_map, 
+                                                               pos[0], pos[1])
+            self.backend.set_char_background(self.game_map, pos[0], pos[1], 
+                                             data.COLOURS['look_cursor'], 
+                                             libt.BKGND_SET)
+
+    def move_look_cursor(self, dx, dy):
+        """Moves the look cursor, keeping it within the map."""
+        x = min(max(self.look_cursor[0] + dx, 0), config.MAP_WIDTH - 1)
+        y = min(max(self.look_cursor[1] + dy, 0), config.MAP_HEIGHT - 1)
+        self.set_look_cursor((x, y))
+
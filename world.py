@@ -3,13 +3,26 @@
 # Classes for constructing the game map
 #
 
+import collections
 import random
 import config
 import entities
 
+# Version of the level generator. Bump it whenever make_map() changes
+# what a seed generates, so saves that store only seeds are not misread.
+GENERATOR = 1
+
+# Translate tables for planes: NONZERO turns nonzero bytes into 1s and
+# INVERTED turns zero bytes into 1s, every other byte becoming 0
+NONZERO = bytes(bytearray([0] + [1]*255))
+INVERTED = bytes(bytearray([1] + [0]*255))
+
 
 class Tile(object):
-    """A single coordinate on the map."""
+    """
+    A single coordinate on the map. Maps now keep their tiles in planes;
+    this class remains so maps pickled by older versions can be loaded.
+    """
     def __init__(self, passable, fog=False, seen=False):
         self.passable = passable
 
@@ -20,6 +33,85 @@ class Tile(object):
         self.seen = seen
 
 
+class TileView(object):
+    """
+    A single coordinate on the map, read from and written to the
+    map's tile planes.
+
+    game_world: the Map the tile belongs to
+    i: index of the tile within the planes
+    """
+    __slots__ = ('world', 'i')
+
+    def __init__(self, game_world, i):
+        self.world = game_world
+        self.i = i
+
+    def get_passable(self):
+        return bool(self.world.passable[self.i])
+
+    def set_passable(self, value):
+        self.world.passable[self.i] = int(value)
+        self.world.seed = None
+
+    def get_fog(self):
+        return bool(self.world.fog[self.i])
+
+    def set_fog(self, value):
+        self.world.fog[self.i] = int(value)
+        self.world.seed = None
+
+    def get_seen(self):
+        return bool(self.world.seen[self.i])
+
+    def set_seen(self, value):
+        self.world.seen[self.i] = int(value)
+
+    passable = property(get_passable, set_passable)
+    fog = property(get_fog, set_fog)
+    seen = property(get_seen, set_seen)
+
+
+class TileColumn(object):
+    """One column of the map, indexed by y."""
+    def __init__(self, game_world, x):
+        self.world = game_world
+        self.x = x
+
+    def __len__(self):
+        return self.world.height
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.world.height:
+            raise IndexError(y)
+        return TileView(self.world, self.x*self.world.height + y)
+
+    def __iter__(self):
+        for y in range(self.world.height):
+            yield self[y]
+
+
+class TileGrid(object):
+    """
+    Gives the map's tile planes the shape of the old list of columns,
+    so that map[x][y] still returns a tile.
+    """
+    def __init__(self, game_world):
+        self.world = game_world
+
+    def __len__(self):
+        return self.world.width
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.world.width:
+            raise IndexError(x)
+        return TileColumn(self.world, x)
+
+    def __iter__(self):
+        for x in range(self.world.width):
+            yield self[x]
+
+
 class Room(object):
     """A block of passable area in the map."""
     def __init__(self, x, y, w, h):
@@ -40,39 +132,135 @@ class Room(object):
         return (self.x1 <= block.x2 and self.x2 >= block.x1
                 and self.y1 <= block.y2 and self.y2 >= block.y1)
 
-    def rand_point(self):
-        """Returns random point within the room."""
-        rand_x = random.randrange(self.x1 + 1, self.x2)
-        rand_y = random.randrange(self.y1 + 1, self.y2)
+    def rand_point(self, rng):
+        """Returns random point within the room, drawn from the Random rng."""
+        rand_x = rng.randrange(self.x1 + 1, self.x2)
+        rand_y = rng.randrange(self.y1 + 1, self.y2)
         return (rand_x, rand_y)
 
 
 class Map(object):
-    """Class that stores the game's map information."""
-    def __init__(self):
-        self.map = []
+    """
+    Class that stores the game's map information.
+
+    Tiles are stored in three planes of one byte per tile: passable, fog
+    and seen. Tile (x, y) has index x*height + y. A plane can be any
+    writable sequence of small integers, such as a bytearray or an array
+    backed by a memory-mapped save, so loading a large level does not
+    have to read every tile. map[x][y] returns a view of a single tile.
+
+    Maps made by generate_floor() remember the seed and depth they were
+    generated from, which is enough to generate them again. Changing
+    their tiles afterwards forgets the seed, so that the tiles are
+    saved in full.
+
+    width, height: size of the map in tiles
+    planes: (passable, fog, seen) planes; new maps are solid and unseen
+    """
+    def __init__(self, width=config.MAP_WIDTH, height=config.MAP_HEIGHT, planes=None):
+        self.width = width
+        self.height = height
+        self.seed = None
+        self.depth = 1
+
+        if planes is None:
+            planes = (bytearray(width*height), bytearray(b"\x01" * (width*height)),
+                      bytearray(width*height))
+
+        (self.passable, self.fog, self.seen) = planes
+        self.map = TileGrid(self)
         self.rooms = []
+        self.index = None
+        self.index_turn = None
+        self.index_version = 0
+
+        # Tiles in the order they were first seen, for delta saves
+        self.seen_log = []
+
+    def entities_at(self, x, y):
+        """
+        Returns a list of (list name, entity) pairs for the entities on
+        tile (x, y). The underlying index is rebuilt at most once per turn.
+        """
+        if self.index is None or self.index_turn != self.handler.turn:
+            self.index = {}
+            self.index_turn = self.handler.turn
+
+            for lst in self.handler.map_objects:
+                for obj in self.handler.map_objects[lst]:
+                    self.index.setdefault((obj.x, obj.y), []).append((lst, obj))
+
+        return self.index.get((x, y), [])
+
+    def is_seen(self, x, y):
+        """Returns true if the player has seen tile (x, y)."""
+        return bool(self.seen[x*self.height + y])
+
+    def mark_seen(self, x, y):
+        """Marks tile (x, y) as seen by the player."""
+        i = x*self.height + y
+
+        if not self.seen[i]:
+            self.seen[i] = 1
+            self.seen_log.append((x, y))
+
+    def rows(self, plane):
+        """
+        Returns a bytearray copy of plane with the tiles in row order,
+        tile (x, y) at index y*width + x, which is how libtcod orders them.
+        """
+        h = self.height
+        return bytearray().join(bytearray(plane[y::h]) for y in range(h))
+
+    def columns(self, rows):
+        """Returns a bytearray copy of a plane in row order, such as libtcod's, in tile order."""
+        w = self.width
+        return bytearray().join(bytearray(rows[x::w]) for x in range(w))
+
+    def set_floors(self, floors):
+        """
+        Makes every tile whose value in floors is nonzero floor and every
+        other tile wall. floors is a plane in row order, such as a
+        thresholded heightmap, or a numpy array of height rows.
+        """
+        if hasattr(floors, 'reshape'):
+            floors = floors.reshape(-1)
+
+        passable = self.columns(floors).translate(NONZERO)
+        self.passable[:] = passable
+        self.fog[:] = passable.translate(INVERTED)
+        self.seed = None
+
+    def invalidate_index(self):
+        """Marks the tile index as stale after entities change mid-turn."""
+        self.index = None
+        self.index_version += 1
+
+    def make_floor(self, x, y):
+        """Makes tile (x, y) passable floor."""
+        i = x*self.height + y
+        self.passable[i] = 1
+        self.fog[i] = 0
+        self.seed = None
 
     def make_h_tunnel(self, x1, x2, y):
         """Creates passable tiles between x1 and x2 on the y coordinate."""
         for x in range(min(x1, x2), max(x1, x2) + 1):
-            self.map[x][y].passable = True
-            self.map[x][y].fog = False
+            self.make_floor(x, y)
 
     def make_v_tunnel(self, y1, y2, x):
         """Creates passable tiles between y1 and y2 on the x coordinate."""
         for y in range(min(y1, y2), max(y1, y2) + 1):
-            self.map[x][y].passable = True
-            self.map[x][y].fog = False
+            self.make_floor(x, y)
 
-    def connect_rooms(self, room1, room2):
+    def connect_rooms(self, room1, room2, rng):
         """Takes two rooms and connects them with tunnels."""
         (r1_x, r1_y) = room1.centre()
         (r2_x, r2_y) = room2.centre()
 
         # Determine which direction to begin the connection
         # 0 is vertical, 1 is horizontal
-        direction = random.randrange(2)
+        direction = rng.randrange(2)
 
         if direction:
             self.make_h_tunnel(r1_x, r2_x, r1_y)
@@ -85,52 +273,55 @@ class Map(object):
         """Takes an instance of a Room and creates it on the game world."""
         for i in range(room.x1 + 1, room.x2):
             for j in range(room.y1 + 1, room.y2):
-                self.map[i][j].passable = True
-                self.map[i][j].fog = False
+                self.make_floor(i, j)
 
     def is_solid(self, x, y):
         """Determines if tile/entity at (x, y) is solid."""
-        if not self.map[x][y].passable:
+        return self.blocked(x, y, self.handler.map_objects)
+
+    def blocked(self, x, y, map_objects):
+        """Determines if tile (x, y) or a solid entity in map_objects on it blocks movement."""
+        if not self.passable[x*self.height + y]:
             return True
         
-        for lst in self.handler.map_objects:
-            for obj in self.handler.map_objects[lst]:
+        for lst in map_objects:
+            for obj in map_objects[lst]:
                 if obj.solid and obj.x == x and obj.y == y:
                     return True
 
         return False
 
-    def add_entities(self, room):
+    def add_entities(self, room, map_objects, rng):
         """Adds random entities to a room."""
         count = config.MAX_MOBS
 
         while count > 0:
-            entity_pos = room.rand_point()
-            mob = random.randrange(20)
+            entity_pos = room.rand_point(rng)
+            mob = rng.randrange(20)
 
-            if not self.is_solid(entity_pos[0], entity_pos[1]):
+            if not self.blocked(entity_pos[0], entity_pos[1], map_objects):
                 if mob == 0:
-                    self.handler.map_objects['mobs'].append(entities.Spider(entity_pos[0], entity_pos[1]))
+                    map_objects['mobs'].append(entities.Spider(entity_pos[0], entity_pos[1]))
                 elif mob == 1:
-                    self.handler.map_objects['mobs'].append(entities.Skeleton(entity_pos[0], entity_pos[1]))
+                    map_objects['mobs'].append(entities.Skeleton(entity_pos[0], entity_pos[1]))
 
             count -= 1
 
-    def add_items(self, room):
+    def add_items(self, room, map_objects, rng):
         """Adds random items to a room."""
         count = config.MAX_ITEMS
 
         while count > 0:
-            item_pos = room.rand_point()
-            item = random.randrange(5)
+            item_pos = room.rand_point(rng)
+            item = rng.randrange(5)
 
-            if not self.is_solid(item_pos[0], item_pos[1]):
+            if not self.blocked(item_pos[0], item_pos[1], map_objects):
                 if item == 0:
-                    self.handler.map_objects['items'].append(entities.WoodenSword(item_pos[0], item_pos[1]))
+                    map_objects['items'].append(entities.WoodenSword(item_pos[0], item_pos[1]))
                 elif item == 1:
-                    self.handler.map_objects['items'].append(entities.StoneSword(item_pos[0], item_pos[1]))
+                    map_objects['items'].append(entities.StoneSword(item_pos[0], item_pos[1]))
                 elif item == 2:
-                    self.handler.map_objects['items'].append(entities.HealthPotion(item_pos[0], item_pos[1]))
+                    map_objects['items'].append(entities.HealthPotion(item_pos[0], item_pos[1]))
 
             count -= 1
 
@@ -152,25 +343,26 @@ class Map(object):
         item.x = x
         item.y = y
         self.handler.map_objects['items'].append(item)
+        self.invalidate_index()
 
-    def make_map(self):
-        """Initializes the game world."""
-        # Initialize the multi-dimensional array with unpassable tiles
-        for i in range(config.MAP_WIDTH):
-            self.map.append([])
-            for j in range(config.MAP_HEIGHT):
-                self.map[i].append(Tile(False))
-
+    def make_map(self, map_objects, seed):
+        """
+        Generates the floor given by seed into this map and map_objects,
+        and places the first character at the start. The same seed always
+        generates the same floor. Requires that the map is still solid.
+        """
+        rng = random.Random(seed)
+        player = map_objects['characters'][0]
         self.rooms = []
         num_rooms = 0
 
         # Fill array with passable tiles that represent up to MAX_ROOMS
         # number of rooms
         for num in range(config.MAX_ROOMS):
-            w = random.randrange(config.ROOM_MIN_SIZE, config.ROOM_MAX_SIZE)
-            h = random.randrange(config.ROOM_MIN_SIZE, config.ROOM_MAX_SIZE)
-            x = random.randrange(config.MAP_WIDTH - w - 1)
-            y = random.randrange(config.MAP_HEIGHT - h - 1)
+            w = rng.randrange(config.ROOM_MIN_SIZE, config.ROOM_MAX_SIZE)
+            h = rng.randrange(config.ROOM_MIN_SIZE, config.ROOM_MAX_SIZE)
+            x = rng.randrange(self.width - w - 1)
+            y = rng.randrange(self.height - h - 1)
 
             new = Room(x, y, w, h)
             intersected = False
@@ -185,24 +377,84 @@ class Map(object):
             # Otherwise link rooms to each other
             if not intersected and num_rooms == 0:
                 (player_x, player_y) = new.centre()
-                self.handler.player.x = player_x
-                self.handler.player.y = player_y
+                player.x = player_x
+                player.y = player_y
                 num_rooms += 1
 
                 self.rooms.append(new)
                 self.make_room(new)
-                self.add_entities(new)
-                self.add_items(new)
+                self.add_entities(new, map_objects, rng)
+                self.add_items(new, map_objects, rng)
             elif not intersected:
                 num_rooms += 1
                 self.rooms.append(new)
                 self.make_room(new)
-                self.add_entities(new)
-                self.add_items(new)
+                self.add_entities(new, map_objects, rng)
+                self.add_items(new, map_objects, rng)
                 self.connect_rooms(self.rooms[num_rooms - 2], 
-                                   self.rooms[num_rooms - 1])
+                                   self.rooms[num_rooms - 1], rng)
 
         # Add stairs
-        stair_room = random.choice(self.rooms)
-        stair_pos = stair_room.rand_point()
-        self.handler.map_objects['stairs'] = [entities.Stairs(stair_pos[0], stair_pos[1])]
+        stair_room = rng.choice(self.rooms)
+        stair_pos = stair_room.rand_point(rng)
+        map_objects['stairs'] = [entities.Stairs(stair_pos[0], stair_pos[1])]
+
+        # Set last, as making the rooms and tunnels forgets any seed
+        self.seed = seed
+
+    # Methods to facilitate pickling
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['index'] = None
+        del state['map']
+
+        for plane in ('passable', 'fog', 'seen'):
+            state[plane] = bytearray(state[plane])
+
+        return state
+
+    def __setstate__(self, state):
+        tiles = state.pop('map', None)
+
+        # Older maps stored a list of columns of Tile objects
+        if tiles is not None:
+            state['width'] = len(tiles)
+            state['height'] = len(tiles[0]) if tiles else 0
+
+            for plane in ('passable', 'fog', 'seen'):
+                state[plane] = bytearray(int(bool(getattr(tile, plane)))
+                                         for column in tiles for tile in column)
+
+        self.__dict__ = state
+        self.map = TileGrid(self)
+        self.index = None
+        self.index_turn = None
+        self.index_version = state.get('index_version', 0)
+        self.seen_log = state.get('seen_log', [])
+        self.seed = state.get('seed')
+        self.depth = state.get('depth', 1)
+
+
+# Miscellaneous functions
+def generate_floor(seed, depth):
+    """
+    Returns the (world, map objects) of the floor generated from seed
+    at given depth. The first character is a new player standing where
+    the floor starts, which is where floors above the first have their
+    stairs back down.
+    """
+    game_world = Map()
+    game_world.depth = depth
+
+    # Map objects, OrderedDict ensures proper draw order
+    map_objects = collections.OrderedDict([('stairs', []),
+                                           ('items', []),
+                                           ('mobs', []),
+                                           ('characters', [entities.Player(0, 0, "Player")])])
+    game_world.make_map(map_objects, seed)
+
+    if depth > 1:
+        player = map_objects['characters'][0]
+        map_objects['stairs'].append(entities.DownStairs(player.x, player.y))
+
+    return game_world, map_objects